@@ -16,9 +16,13 @@ import pstats
 import cProfile
 import threading
 from db_manager.AugurInterface import AugurInterface
-from job_manager.job_manager import JobManager
+from job_manager.job_manager import JobManager, QUERIES
+from job_manager.aggregates import AGGREGATES
+from job_manager.job_events import job_events_response
 import dash
 from dash import html, dcc
+from dash.dependencies import Input, Output, State, ClientsideFunction
+import flask
 import dash_bootstrap_components as dbc
 from dash_bootstrap_templates import load_figure_template
 import numpy as np
@@ -37,6 +41,14 @@ entries = None
 augur_db = None
 jm = JobManager()
 
+# milliseconds between polls of the page's job statuses while a job is pending.
+# pushed job events trigger a poll right away; this covers missed events.
+POLL_INTERVAL = 5000
+
+# where pages open the stream of job events; the /job-events route below by default,
+# job_manager/event_server.py in deployment.
+JOB_EVENTS_URL = os.getenv("JOB_EVENTS_URL", "/job-events")
+
 
 def _load_config():
     global engine
@@ -90,6 +102,26 @@ app = dash.Dash(
 # expose the server variable so that gunicorn can use it.
 server = app.server
 
+
+@server.route("/job-events")
+def job_events():
+    """
+    Server-sent event stream of job completions, read by assets/job_events.js.
+    Each open page holds one of these connections, so deployments serve it
+    from job_manager/event_server.py on gevent workers instead (see Dockerfile.server).
+    """
+    return job_events_response(jm)
+
+
+@server.route("/metrics")
+def metrics():
+    """
+    The web tier's Prometheus metrics, see job_manager/metrics.py; the
+    workers' are served by the exporter on the worker container.
+    """
+    return flask.Response(jm.metrics(), mimetype="text/plain; version=0.0.4")
+
+
 # side bar code for page navigation
 sidebar = html.Div(
     [
@@ -112,6 +144,18 @@ app.layout = dbc.Container(
     [
         # componets to store data from queries
         dcc.Store(id="repo-choices", storage_type="session", data=[]),
+        # status of each dataset of the selected repos, one store per query or aggregate; the cards
+        # listen to these. a single page poller (see app_callbacks.py) updates them,
+        # re-polling on a timer while a job is pending and whenever the server
+        # pushes a job event (assets/job_events.js clicks the hidden button).
+        *[dcc.Store(id=f"job-status-{func.__name__}") for func in QUERIES],
+        *[dcc.Store(id=f"job-status-{name}") for name in AGGREGATES],
+        dcc.Interval(id="job-status-poller", interval=POLL_INTERVAL, disabled=True),
+        html.Button(id="job-events-trigger", n_clicks=0, style={"display": "none"}),
+        html.Div(id="job-events-url", **{"data-url": JOB_EVENTS_URL}, style={"display": "none"}),
+        dcc.Store(id="job-events"),
+        # id of the browser tab, under which the poller claims the jobs it waits on.
+        dcc.Store(id="session-id", storage_type="session"),
         dcc.Location(id="url"),
         dbc.Row(
             [
@@ -242,6 +286,24 @@ app.layout = dbc.Container(
     style={"padding-top": "1em"},
 )
 
+# pass pushed job events on to the page poller,
+# only when they concern the repos currently selected.
+app.clientside_callback(
+    ClientsideFunction(namespace="job_events", function_name="route"),
+    Output("job-events", "data"),
+    Input("job-events-trigger", "n_clicks"),
+    State("repo-choices", "data"),
+    prevent_initial_call=True,
+)
+
+# give each browser tab an id of its own, once.
+app.clientside_callback(
+    ClientsideFunction(namespace="job_events", function_name="session"),
+    Output("session-id", "data"),
+    Input("url", "pathname"),
+    State("session-id", "data"),
+)
+
 
 def main():
     # shouldn't run server in debug mode if we're in a production setting
@@ -4,7 +4,10 @@ import dash
 import pandas as pd
 import sqlalchemy as salc
 import logging
-from app import engine, augur_db, entries, all_entries
+from app import engine, augur_db, entries, all_entries, jm
+from job_manager.job_manager import QUERIES, PENDING_STATES
+from job_manager.aggregates import AGGREGATES
+from job_manager import tracing
 
 # helper function for repos to get repo_ids
 def _parse_repo_choices(repo_git_set):
@@ -128,35 +131,134 @@ def update_output(n_clicks, value):
     """
     logging.debug("SEARCHBAR_ORG_REPO_PARSING - START")
     if len(value) > 0:
-        repo_git_set = []
-        org_name_set = []
+        # a search starts a trace, see job_manager/tracing.py.
+        with tracing.span("search", new_trace=True, selections=len(value)) as search:
+            repo_git_set = []
+            org_name_set = []
+
+            # split our processing of repos / orgs into two streams
+            for r in value:
+                if r.startswith("http"):
+                    repo_git_set.append(r)
+                else:
+                    org_name_set.append(r)
+
+            # get the repo_ids and the repo_names from our repo set of urls'
+            with tracing.span("parse_repo_choices", repos=len(repo_git_set)):
+                repo_ids, repo_names = _parse_repo_choices(repo_git_set=repo_git_set)
+
+            # get the repo_ids and the repo_names from our org set of names
+            with tracing.span("parse_org_choices", orgs=len(org_name_set)):
+                org_repo_ids, org_repo_names = _parse_org_choices(org_name_set=org_name_set)
+
+            # collect all of the id's and names together
+            total_ids = set(repo_ids + org_repo_ids)
+            total_names = set(repo_names + org_repo_names)
+            total_ids = list(total_ids)
+
+            # count the search so the cache warmer keeps popular selections cached.
+            jm.record_selection(total_ids)
+
+            selections = str(value)
+
+            # the poller, the worker jobs and the cards continue this search's trace.
+            search["repos"] = len(total_ids)
+            if tracing.enabled():
+                dash.callback_context.response.set_cookie(tracing.TRACE_COOKIE, tracing.current(), samesite="Lax")
+
+            # return the string that we want and return the list of the id's that we need for the other callback.
+            logging.debug("SEARCHBAR_ORG_REPO_PARSING - END")
+            logging.debug("=========================================================")
+            return f"Your current selections is: {selections[1:-1]}", list(total_ids)
+    elif len(value) == 0:
+        return dash.exceptions.PreventUpdate, dash.exceptions.PreventUpdate
 
-        # split our processing of repos / orgs into two streams
-        for r in value:
-            if r.startswith("http"):
-                repo_git_set.append(r)
-            else:
-                org_name_set.append(r)
 
-        # get the repo_ids and the repo_names from our repo set of urls'
-        repo_ids, repo_names = _parse_repo_choices(repo_git_set=repo_git_set)
+# every dataset a card can wait on: raw query results and worker-built aggregates.
+DATASETS = [func.__name__ for func in QUERIES] + list(AGGREGATES)
 
-        # get the repo_ids and the repo_names from our org set of names
-        org_repo_ids, org_repo_names = _parse_org_choices(org_name_set=org_name_set)
 
-        # collect all of the id's and names together
-        total_ids = set(repo_ids + org_repo_ids)
-        total_names = set(repo_names + org_repo_names)
-        total_ids = list(total_ids)
+# helper function for the page poller to get the datasets a page's cards need
+def _page_datasets(pathname):
+    for page in dash.page_registry.values():
+        if page["path"] == pathname:
+            return page.get("queries", []), page.get("aggregates", [])
+    return [], []
 
-        selections = str(value)
 
-        # return the string that we want and return the list of the id's that we need for the other callback.
-        logging.debug("SEARCHBAR_ORG_REPO_PARSING - END")
-        logging.debug("=========================================================")
-        return f"Your current selections is: {selections[1:-1]}", list(total_ids)
-    elif len(value) == 0:
-        return dash.exceptions.PreventUpdate, dash.exceptions.PreventUpdate
+# page poller: one batched status check of all of the datasets that the current page needs,
+# fanned out to the job-status-<dataset> stores that the page's cards listen to.
+@callback(
+    [Output(f"job-status-{name}", "data") for name in DATASETS] + [Output("job-status-poller", "disabled")],
+    [
+        Input("url", "pathname"),
+        Input("repo-choices", "data"),
+        Input("job-status-poller", "n_intervals"),
+        Input("job-events", "data"),
+    ],
+    [State("session-id", "data")] + [State(f"job-status-{name}", "data") for name in DATASETS],
+)
+def poll_job_statuses(pathname, repolist, n_intervals, job_events, session, *known):
+    """
+    Cards only care whether their dataset is "pending", "finished" or "failed",
+    and how far along a pending one is, so each store holds
+    {"state": ..., "progress": ...} (see JobManager.get_job_progress) and is
+    only updated when that changes; each card re-renders once per change.
+    The poller keeps polling while any dataset is pending, and starts the
+    jobs of datasets that aren't cached or queued. It claims those jobs for
+    the tab's session, so that the jobs of a selection the tab has moved on
+    from are cancelled unless another tab still wants them.
+    """
+    queries, aggregates = _page_datasets(pathname)
+    funcs = [func for func in QUERIES if func.__name__ in queries]
+
+    if repolist is None or len(repolist) == 0 or len(funcs) + len(aggregates) == 0:
+        return [dash.no_update] * len(DATASETS) + [True]
+
+    with tracing.span("poll", parent=tracing.from_request(), page=pathname):
+        return _poll(funcs, aggregates, repolist, session, known)
+
+
+def _poll(funcs, aggregates, repolist, session, known):
+    # a constant number of round trips to Redis, regardless of the number of cards.
+    statuses = {}
+    # the progress of the jobs of datasets; aggregates report the dataset they're built from.
+    progress = {}
+    if len(funcs) > 0:
+        for func, (status, job_progress) in zip(
+            funcs, jm.get_job_states([(func, repolist) for func in funcs], session)
+        ):
+            if status is None:
+                jm.add_job(func, augur_db.package_config(), repolist)
+            statuses[func.__name__] = status
+            progress[func.__name__] = job_progress
+    if len(aggregates) > 0:
+        requests = [(name, repolist) for name in aggregates]
+        for name, (status, job_progress) in zip(aggregates, jm.get_aggregate_states(requests, session)):
+            if status is None:
+                jm.add_aggregate_job(name, augur_db.package_config(), repolist)
+            statuses[name] = status
+            progress[name] = job_progress
+
+    states = {}
+    for name, status in statuses.items():
+        if status is None or status in PENDING_STATES:
+            states[name] = "pending"
+        elif status == "finished":
+            states[name] = "finished"
+        else:
+            states[name] = "failed"
+
+    updates = []
+    for name, last in zip(DATASETS, known):
+        if name not in states:
+            updates.append(dash.no_update)
+            continue
+
+        value = {"state": states[name], "progress": progress[name] if states[name] == "pending" else None}
+        updates.append(dash.no_update if value == last else value)
+
+    return updates + ["pending" not in states.values()]
 
 
 @callback(Output("help-alert", "is_open"), Input("search-help", "n_clicks"), State("help-alert", "is_open"))
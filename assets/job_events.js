@@ -0,0 +1,64 @@
+/*
+    Receives job completion events pushed by the server (the /job-events
+    route in app.py) and hands them to Dash.
+
+    Dash can't be told about data from outside of a callback, so each event
+    is queued here and the hidden #job-events-trigger button is clicked; the
+    clientside callback below then drains the queue into the job-events
+    store, which makes the page poller check the page's jobs right away.
+*/
+(function () {
+    var pending = [];
+
+    function connect() {
+        // the layout, which names the stream's URL, renders after this script runs.
+        var config = document.getElementById("job-events-url");
+        if (!config) {
+            setTimeout(connect, 500);
+            return;
+        }
+        // EventSource reconnects on its own if the connection drops.
+        var source = new EventSource(config.dataset.url);
+        source.onmessage = function (e) {
+            pending.push(JSON.parse(e.data));
+            var trigger = document.getElementById("job-events-trigger");
+            if (trigger) {
+                trigger.click();
+            }
+        };
+    }
+
+    if (window.EventSource) {
+        connect();
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        job_events: {
+            route: function (n_clicks, repos) {
+                var events = pending;
+                pending = [];
+
+                var selected = new Set(repos || []);
+                var relevant = events.filter(function (event) {
+                    return event.repos.some(function (r) {
+                        return selected.has(r);
+                    });
+                });
+                if (relevant.length === 0) {
+                    return window.dash_clientside.no_update;
+                }
+                // the time stamp makes every update count as a change,
+                // even for a repeated event.
+                return {received: Date.now(), events: relevant};
+            },
+            // id of this tab, generated once and kept in session storage, that
+            // the page poller claims jobs under; see job_manager/cancellation.py.
+            session: function (pathname, session) {
+                if (session) {
+                    return window.dash_clientside.no_update;
+                }
+                return Date.now().toString(36) + "-" + Math.random().toString(36).slice(2);
+            },
+        },
+    });
+})();
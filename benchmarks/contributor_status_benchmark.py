@@ -0,0 +1,86 @@
+"""
+    Benchmark: active/drifting/away contributor counts over time.
+
+    Compares calling get_active_drifting_away_up_to once per date, as the
+    active/drifting contributors card used to, against active_drifting_away
+    in pages/utils/contributor_status.py, on a synthetic contributors-shaped
+    frame, and checks that both give the same counts.
+
+    The per-date function is slow enough that --reference-dates limits it to
+    that many evenly spaced dates of the range; its time is extrapolated to
+    all of them.
+
+    Run from the repository root:
+        python -m benchmarks.contributor_status_benchmark --rows 1000000 --years 10 --interval D
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from pages.utils.contributor_status import active_drifting_away, get_active_drifting_away_up_to
+
+
+def make_contributions_frame(rows, years, contributors, seed=0):
+    """
+    Synthetic frame with the columns of queries/contributors_query that the card uses.
+    Contributors come and go: each is around for a random part of the range.
+    """
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp("2012-01-01", tz="UTC").value
+    span = int(years * 365 * 86400 * 10**9)
+
+    joined = rng.integers(start, start + span, size=contributors)
+    stayed = rng.exponential(span / 8, size=contributors).astype("int64")
+    who = rng.integers(0, contributors, size=rows)
+    when = joined[who] + (rng.random(rows) * stayed[who]).astype("int64")
+
+    return pd.DataFrame(
+        {
+            "cntrb_id": np.array([f"cntrb-{i}" for i in range(contributors)], dtype=object)[who],
+            "created_at": pd.to_datetime(np.minimum(when, start + span), utc=True),
+        }
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--years", type=float, default=10)
+    parser.add_argument("--contributors", type=int, default=20_000)
+    parser.add_argument("--interval", default="D", choices=["D", "M", "Y"])
+    parser.add_argument("--drift", type=int, default=6)
+    parser.add_argument("--away", type=int, default=12)
+    parser.add_argument("--reference-dates", type=int, default=50)
+    args = parser.parse_args()
+
+    df = make_contributions_frame(args.rows, args.years, args.contributors)
+
+    # as the card prepares them.
+    df = df.sort_values("created_at", axis=0, ascending=True)
+    dates = pd.date_range(
+        start=df.iloc[0]["created_at"], end=df.iloc[-1]["created_at"], freq=args.interval, inclusive="both"
+    )
+    print(f"rows: {args.rows:,}  contributors: {args.contributors:,}  dates: {len(dates):,}")
+
+    start = time.perf_counter()
+    status = active_drifting_away(df, dates, args.drift, args.away)
+    t_vectorized = time.perf_counter() - start
+
+    sample = np.unique(np.linspace(0, len(dates) - 1, min(args.reference_dates, len(dates))).astype(int))
+    start = time.perf_counter()
+    reference = [get_active_drifting_away_up_to(df, dates[i], args.drift, args.away) for i in sample]
+    t_reference = (time.perf_counter() - start) * len(dates) / len(sample)
+
+    reference = pd.DataFrame(reference, columns=["Date", "Active", "Drifting", "Away"])
+    pd.testing.assert_frame_equal(status.iloc[sample].reset_index(drop=True), reference, check_dtype=False)
+
+    print(f"{'engine':<16}{'seconds':>12}")
+    print(f"{'per date':<16}{t_reference:>12.3f}  (extrapolated from {len(sample)} dates)")
+    print(f"{'vectorized':<16}{t_vectorized:>12.3f}")
+    print(f"identical counts at the {len(sample)} reference dates")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+    Benchmark: extracting a large query result from PostgreSQL.
+
+    Loads a fixture table shaped like commits_query's result, then reads it
+    back through each of AugurInterface's extraction paths:
+
+        read_sql               run_query: one fetch of every row through the cursor.
+        read_sql, streamed     run_query_chunks: server-side cursor, --chunk rows at a time.
+        COPY                   run_query_copy: COPY ... TO STDOUT as CSV, parsed by pyarrow.
+        COPY, streamed         run_query_copy with chunks, as fill jobs use it.
+
+    COPY is PostgreSQL-only, so this needs a database; a throwaway local one
+    is enough, e.g.:
+
+        docker run --rm -e POSTGRES_PASSWORD=pw -p 5432:5432 postgres:14
+
+    Run from the repository root:
+        python -m benchmarks.copy_extraction_benchmark --rows 2000000 \\
+            --url postgresql+psycopg2://postgres:pw@localhost:5432/postgres
+"""
+import argparse
+import time
+
+import sqlalchemy as salc
+
+from db_manager.AugurInterface import AugurInterface
+
+TABLE = "explorer_copy_benchmark"
+
+FIXTURE = f"""
+    CREATE TABLE {TABLE} AS
+    SELECT
+        (n % 500) + 1 AS repo_id,
+        'repo-' || ((n % 500) + 1) AS repo_name,
+        md5(n::text) AS commits,
+        n::bigint AS file,
+        (n % 97)::int AS lines_added,
+        (n % 31)::int AS lines_removed,
+        timestamptz '2015-01-01' + (n || ' minutes')::interval AS date
+    FROM generate_series(1, :rows) AS n
+"""
+
+QUERY = f"SELECT repo_id, repo_name, commits, file, lines_added, lines_removed, date FROM {TABLE}"
+
+
+def read_sql(dbm, chunk):
+    return len(dbm.run_query(QUERY))
+
+
+def read_sql_streamed(dbm, chunk):
+    return sum(len(df) for df in dbm.run_query_chunks(QUERY, chunk))
+
+
+def copy(dbm, chunk):
+    return len(dbm.run_query_copy(QUERY))
+
+
+def copy_streamed(dbm, chunk):
+    return sum(len(df) for df in dbm.run_query_copy(QUERY, chunk))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", required=True, help="SQLAlchemy URL of a scratch PostgreSQL database.")
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--chunk", type=int, default=100000)
+    parser.add_argument("--keep", action="store_true", help="Leave the fixture table in the database afterwards.")
+    args = parser.parse_args()
+
+    dbm = AugurInterface()
+    dbm.engine = salc.create_engine(args.url, pool_pre_ping=True)
+
+    with dbm.engine.begin() as conn:
+        conn.execute(salc.sql.text(f"DROP TABLE IF EXISTS {TABLE}"))
+        conn.execute(salc.sql.text(FIXTURE), {"rows": args.rows})
+        conn.execute(salc.sql.text(f"ANALYZE {TABLE}"))
+
+    try:
+        print(f"rows: {args.rows}, chunk: {args.chunk}, planner estimate: {dbm.estimate_rows(QUERY)}")
+        print(f"{'extraction':<22}{'seconds':>10}{'rows / s':>14}")
+
+        runs = [
+            ("read_sql", read_sql),
+            ("read_sql, streamed", read_sql_streamed),
+            ("COPY", copy),
+            ("COPY, streamed", copy_streamed),
+        ]
+        for name, bench in runs:
+            start = time.perf_counter()
+            rows = bench(dbm, args.chunk)
+            elapsed = time.perf_counter() - start
+            assert rows == args.rows, f"{name} read {rows} rows"
+            print(f"{name:<22}{elapsed:>10.2f}{rows / elapsed:>14,.0f}")
+    finally:
+        if not args.keep:
+            with dbm.engine.begin() as conn:
+                conn.execute(salc.sql.text(f"DROP TABLE IF EXISTS {TABLE}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+    Benchmark: figure payloads of the histogram cards, binned in the browser
+    vs. on the server.
+
+    Builds the figures of commits_over_time, issues_over_time,
+    first_time_contributions and contrib_drive_repeat the way the cards used
+    to (px.histogram / add_histogram over every row, binned by plotly.js)
+    and the way they do now (bar traces of counts from pages/utils/binning.py),
+    on synthetic data shaped like their datasets, and reports the bytes of
+    figure JSON each sends to the browser, and the time to build and serialize it.
+
+    Run from the repository root:
+        python -m benchmarks.histogram_payload_benchmark --rows 1000000 --years 10
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+import plotly.io as pio
+
+from pages.utils.binning import binned_bar, binned_bars
+
+ACTIONS = ["Commit", "Issue Opened", "PR Opened", "PR Review", "Issue Comment"]
+
+
+def make_contributions_frame(rows, years, seed=0):
+    """
+    Synthetic frame with the columns of queries/contributors_query that the cards use.
+    """
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp("2012-01-01", tz="UTC").value
+    span = int(years * 365 * 86400 * 10**9)
+
+    return pd.DataFrame(
+        {
+            "cntrb_id": rng.integers(0, max(rows // 50, 1), size=rows),
+            "created_at": pd.to_datetime(rng.integers(start, start + span, size=rows), utc=True),
+            "Action": np.array(ACTIONS, dtype=object)[rng.integers(0, len(ACTIONS), size=rows)],
+            "rank": rng.integers(1, 10, size=rows),
+        }
+    )
+
+
+def per_day(df, column="created_at"):
+    # the workers' aggregates are per day, see job_manager/aggregates.py.
+    return pd.to_datetime(df[column], utc=True).dt.floor("D").rename("date")
+
+
+def commits_figures(df, interval):
+    commits = df.groupby(per_day(df)).size().reset_index(name="commits")
+
+    def before():
+        fig = px.histogram(commits, x="date", y="commits", histfunc="sum")
+        fig.update_traces(xbins_size=interval)
+        return fig
+
+    def after():
+        return go.Figure(binned_bar(commits["date"], interval, commits["commits"]))
+
+    return before, after
+
+
+def issues_figures(df, interval):
+    created = per_day(df).value_counts()
+    closed = (per_day(df) + pd.Timedelta(days=30)).value_counts()
+    issues = pd.DataFrame({"created": created, "closed": closed}).fillna(0).astype("int64").sort_index()
+    issues = issues.rename_axis("date").reset_index()
+
+    def before():
+        fig = go.Figure()
+        fig.add_histogram(x=issues["date"], y=issues["closed"], histfunc="sum", name="closed")
+        fig.add_histogram(x=issues["date"], y=issues["created"], histfunc="sum", name="created")
+        fig.update_traces(xbins_size=interval)
+        return fig
+
+    def after():
+        fig = go.Figure()
+        fig.add_trace(binned_bar(issues["date"], interval, issues["closed"], name="closed"))
+        fig.add_trace(binned_bar(issues["date"], interval, issues["created"], name="created"))
+        return fig
+
+    return before, after
+
+
+def first_contributions_figures(df):
+    firsts = df[df["rank"] == 1]
+    counts = firsts.groupby([per_day(firsts), firsts["Action"]]).size().reset_index(name="count")
+
+    def before():
+        fig = px.histogram(counts, x="date", y="count", histfunc="sum", color="Action")
+        fig.update_traces(xbins_size="M3")
+        return fig
+
+    def after():
+        fig = go.Figure(binned_bars(counts, x="date", y="count", size="M3", color="Action"))
+        fig.update_layout(barmode="relative")
+        return fig
+
+    return before, after
+
+
+def drive_repeat_figures(df):
+    def before():
+        fig = px.histogram(df, x="created_at", color="Action")
+        fig.update_traces(xbins_size="M3")
+        return fig
+
+    def after():
+        fig = go.Figure(binned_bars(df, x="created_at", size="M3", color="Action"))
+        fig.update_layout(barmode="relative")
+        return fig
+
+    return before, after
+
+
+def measure(build):
+    start = time.perf_counter()
+    payload = pio.json.to_json_plotly(build())
+    return len(payload), time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--years", type=float, default=10)
+    parser.add_argument("--interval", default="M1", help="xbins size of the overview cards, e.g. 86400000 or M1")
+    args = parser.parse_args()
+
+    interval = int(args.interval) if args.interval.isdigit() else args.interval
+    df = make_contributions_frame(args.rows, args.years)
+    print(f"rows: {args.rows:,}  interval: {args.interval}")
+
+    cards = [
+        ("commits_over_time", commits_figures(df, interval)),
+        ("issues_over_time", issues_figures(df, interval)),
+        ("first_time_contributions", first_contributions_figures(df)),
+        ("contrib_drive_repeat", drive_repeat_figures(df)),
+    ]
+    print(f"{'card':<26}{'before (bytes)':>16}{'after (bytes)':>16}{'before (s)':>12}{'after (s)':>12}")
+    for name, (before, after) in cards:
+        before_bytes, before_seconds = measure(before)
+        after_bytes, after_seconds = measure(after)
+        print(f"{name:<26}{before_bytes:>16,}{after_bytes:>16,}{before_seconds:>12.3f}{after_seconds:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
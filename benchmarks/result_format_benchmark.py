@@ -0,0 +1,91 @@
+"""
+    Benchmark: records vs. Arrow IPC results for worker queries.
+
+    Compares the old worker result path (df.to_dict("records") pickled by RQ,
+    then pd.DataFrame(results) in the card callback) against the Arrow IPC
+    path in job_manager/result_format.py on a synthetic commits-shaped frame.
+
+    Run from the repository root:
+        python -m benchmarks.result_format_benchmark --rows 1000000
+"""
+import argparse
+import pickle
+import time
+
+import numpy as np
+import pandas as pd
+
+from job_manager.result_format import encode_results, decode_results
+
+
+def make_commits_frame(rows, seed=0):
+    """
+    Synthetic frame with the same columns and dtypes as queries/commits_query.
+    """
+    rng = np.random.default_rng(seed)
+    repo_names = np.array([f"repo-{i}" for i in range(200)], dtype=object)
+    hashes = np.array([f"{h:040x}" for h in rng.integers(0, 2**62, size=rows // 4 + 1)], dtype=object)
+    start = pd.Timestamp("2012-01-01", tz="UTC").value
+
+    return pd.DataFrame(
+        {
+            "repo_name": repo_names[rng.integers(0, len(repo_names), size=rows)],
+            "commits": hashes[rng.integers(0, len(hashes), size=rows)],
+            "file": np.arange(rows, dtype="int64"),
+            "lines_added": rng.integers(0, 500, size=rows),
+            "lines_removed": rng.integers(0, 500, size=rows),
+            "date": pd.to_datetime(rng.integers(start, start + 10 * 365 * 86400 * 10**9, size=rows), utc=True),
+        }
+    )
+
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    out = func(*args)
+    return out, time.perf_counter() - start
+
+
+def bench_records(df):
+    # worker: records conversion, then RQ pickles the return value into Redis.
+    records, t_convert = _timed(df.to_dict, "records")
+    blob, t_pickle = _timed(pickle.dumps, records, pickle.HIGHEST_PROTOCOL)
+
+    # web tier: RQ unpickles the result, then the card rebuilds the frame.
+    records, t_unpickle = _timed(pickle.loads, blob)
+    _, t_frame = _timed(pd.DataFrame, records)
+
+    return t_convert + t_pickle, t_unpickle + t_frame, len(blob)
+
+
+def bench_arrow(df, compression):
+    payload, t_encode = _timed(encode_results, df, compression)
+    blob, t_pickle = _timed(pickle.dumps, payload, pickle.HIGHEST_PROTOCOL)
+
+    payload, t_unpickle = _timed(pickle.loads, blob)
+    _, t_decode = _timed(decode_results, payload)
+
+    return t_encode + t_pickle, t_unpickle + t_decode, len(blob)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    df = make_commits_frame(args.rows)
+    print(f"rows: {args.rows:,}")
+    print(f"{'format':<12}{'encode (s)':>14}{'decode (s)':>14}{'redis bytes':>16}")
+
+    runs = [
+        ("records", lambda: bench_records(df)),
+        ("arrow", lambda: bench_arrow(df, "none")),
+        ("arrow+lz4", lambda: bench_arrow(df, "lz4")),
+        ("arrow+zstd", lambda: bench_arrow(df, "zstd")),
+    ]
+    for name, bench in runs:
+        encode, decode, nbytes = bench()
+        print(f"{name:<12}{encode:>14.3f}{decode:>14.3f}{nbytes:>16,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+    Benchmark: new/staling/stale counts of open items over time.
+
+    Compares calling get_new_staling_stale_up_to once per date, as the issue
+    and PR staleness cards used to, against the sweep of
+    pages/utils/staleness.py, on a synthetic issues-shaped frame: building
+    the event arrays, and recounting from them with other thresholds.
+    Checks that both give the same counts.
+
+    The per-date function is slow enough that --reference-dates limits it to
+    that many evenly spaced dates of the range; its time is extrapolated to
+    all of them.
+
+    Run from the repository root:
+        python -m benchmarks.staleness_benchmark --rows 500000 --years 10 --interval D
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from pages.utils.staleness import OpenIntervals, get_new_staling_stale_up_to
+
+
+def make_issues_frame(rows, years, open_share, seed=0):
+    """
+    Synthetic frame with the created and closed columns of queries/issues_query;
+    'open_share' of the items are still open.
+    """
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp("2012-01-01", tz="UTC").value
+    span = int(years * 365 * 86400 * 10**9)
+
+    created = rng.integers(start, start + span, size=rows)
+    closed = pd.to_datetime(created + rng.exponential(30 * 86400 * 10**9, size=rows).astype("int64"), utc=True)
+
+    return pd.DataFrame(
+        {
+            "created": pd.to_datetime(created, utc=True),
+            "closed": closed.where(rng.random(rows) >= open_share),
+        }
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--years", type=float, default=10)
+    parser.add_argument("--open-share", type=float, default=0.1)
+    parser.add_argument("--interval", default="D", choices=["D", "M", "Y"])
+    parser.add_argument("--staling", type=int, default=7)
+    parser.add_argument("--stale", type=int, default=30)
+    parser.add_argument("--reference-dates", type=int, default=50)
+    args = parser.parse_args()
+
+    df = make_issues_frame(args.rows, args.years, args.open_share)
+    dates = pd.date_range(start=df["created"].min(), end=df["created"].max(), freq=args.interval, inclusive="both")
+    print(f"rows: {args.rows:,}  dates: {len(dates):,}")
+
+    start = time.perf_counter()
+    intervals = OpenIntervals(df["created"], df["closed"], dates)
+    t_build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    status = intervals.counts(args.staling, args.stale)
+    t_count = time.perf_counter() - start
+
+    start = time.perf_counter()
+    intervals.counts(args.staling * 2, args.stale * 2)
+    t_recount = time.perf_counter() - start
+
+    sample = np.unique(np.linspace(0, len(dates) - 1, min(args.reference_dates, len(dates))).astype(int))
+    start = time.perf_counter()
+    reference = [get_new_staling_stale_up_to(df, dates[i], args.staling, args.stale) for i in sample]
+    t_reference = (time.perf_counter() - start) * len(dates) / len(sample)
+
+    reference = pd.DataFrame(reference, columns=["Date", "New", "Staling", "Stale"])
+    pd.testing.assert_frame_equal(status.iloc[sample].reset_index(drop=True), reference, check_dtype=False)
+
+    print(f"{'engine':<20}{'seconds':>12}")
+    print(f"{'per date':<20}{t_reference:>12.3f}  (extrapolated from {len(sample)} dates)")
+    print(f"{'sweep: build':<20}{t_build:>12.3f}")
+    print(f"{'sweep: count':<20}{t_count:>12.3f}")
+    print(f"{'sweep: recount':<20}{t_recount:>12.3f}  (other thresholds, same event arrays)")
+    print(f"identical counts at the {len(sample)} reference dates")
+
+
+if __name__ == "__main__":
+    main()
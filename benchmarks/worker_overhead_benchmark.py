@@ -0,0 +1,127 @@
+"""
+    Benchmark: per-job overhead of the RQ worker models.
+
+    Enqueues the same small query as a series of jobs on a queue of its own
+    and drains it with a worker in burst mode, three ways:
+
+        rq.Worker               RQ's default worker: a forked work horse per job,
+                                which builds its own engine and connection.
+        ExplorerWorker, new engine
+                                job_manager/worker.py, but the job drops the
+                                engine that AugurInterface.load_pconfig cached,
+                                as if each job ran in a process of its own.
+        ExplorerWorker          job_manager/worker.py as deployed: no fork, and
+                                one engine per config reused across jobs.
+
+    Jobs connect the way the query functions in queries/ do, through
+    AugurInterface.load_pconfig with the config that AugurInterface.package_config
+    ships, and the query itself is trivial, so the time per job is the overhead.
+
+    Needs what the workers need: Redis (REDIS_SERVICE_HOST, REDIS_SERVICE_PORT,
+    REDIS_PASSWORD, as for JobManager) and an Augur Postgres database (the user,
+    password, host, port, database and schema variables, as for app.py). Only
+    the benchmark's own queue is touched; it's emptied afterwards.
+
+    Run from the repository root:
+        python -m benchmarks.worker_overhead_benchmark --jobs 50
+"""
+import argparse
+import logging
+import time
+
+from rq import Queue, Worker
+from rq.registry import FailedJobRegistry
+
+import db_manager.AugurInterface as augur
+from db_manager.AugurInterface import AugurInterface
+from job_manager.job_manager import JobManager
+from job_manager.worker import ExplorerWorker
+
+QUEUE = "benchmark-worker-overhead"
+QUERY = "SELECT 1 AS repo_id"
+
+
+def select_one(dbmc, repo_ids):
+    """
+    A query function like those in queries/, whose query is trivial.
+    """
+    dbm = AugurInterface()
+    dbm.load_pconfig(dbmc)
+    return dbm.run_query(QUERY)
+
+
+def select_one_new_engine(dbmc, repo_ids):
+    """
+    select_one, after disposing of the engine that an earlier job in this process cached.
+    """
+    engine = augur._engines.pop(tuple(dbmc), None)
+    if engine is not None:
+        engine.dispose()
+    return select_one(dbmc, repo_ids)
+
+
+def overhead_job(query, dbmc, repo_ids):
+    """
+    The job; its arguments are laid out like those of the fill jobs
+    (job_manager/shard_cache.py), which the worker's job stats expect.
+    """
+    return len(query(dbmc, repo_ids))
+
+
+def drain(redis, worker_class, query, pconfig, jobs):
+    """
+    Seconds that a 'worker_class' worker in burst mode takes to run 'jobs'
+    jobs, and how many of them failed.
+    """
+    queue = Queue(QUEUE, connection=redis)
+    queue.empty()
+    for _ in range(jobs):
+        queue.enqueue(overhead_job, query, pconfig, [1], result_ttl=0)
+
+    # no engine is left over from an earlier run.
+    augur._engines.clear()
+
+    worker = worker_class([queue], connection=redis)
+    start = time.perf_counter()
+    worker.work(burst=True, logging_level="WARNING")
+    elapsed = time.perf_counter() - start
+
+    failed = FailedJobRegistry(queue=queue)
+    failures = failed.count
+    for job_id in failed.get_job_ids():
+        failed.remove(job_id, delete_job=True)
+    queue.empty()
+    return elapsed, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=50)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    # the config the web tier ships with every job, see app.py.
+    interface = AugurInterface()
+    if interface.get_engine() is None:
+        raise SystemExit("no database config; set user, password, host, port, database and schema.")
+    pconfig = interface.package_config()
+    interface.engine.dispose()
+
+    redis = JobManager()._redis
+
+    print(f"jobs: {args.jobs}, database: {pconfig[2]}:{pconfig[3]}/{pconfig[4]}")
+    print(f"{'worker model':<32}{'ms / job':>12}{'failed':>8}")
+
+    runs = [
+        ("rq.Worker", Worker, select_one),
+        ("ExplorerWorker, new engine", ExplorerWorker, select_one_new_engine),
+        ("ExplorerWorker", ExplorerWorker, select_one),
+    ]
+    for name, worker_class, query in runs:
+        elapsed, failures = drain(redis, worker_class, query, pconfig, args.jobs)
+        print(f"{name:<32}{1000 * elapsed / args.jobs:>12.2f}{failures:>8}")
+
+
+if __name__ == "__main__":
+    main()
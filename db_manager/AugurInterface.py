@@ -3,11 +3,59 @@
 """
 from re import I
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv
 import sqlalchemy as salc
+import contextlib
+import tempfile
 import json
+import time
 import os
 import logging
 
+# engines by packaged config. a worker process that runs many jobs
+# (see job_manager/worker.py) builds one engine, and its connection pool,
+# per config instead of one per job.
+_engines = {}
+
+# queries that the planner expects to return at least this many rows are
+# extracted with COPY rather than fetched through a cursor, see run_bulk_query.
+COPY_ROW_THRESHOLD = int(os.getenv("COPY_ROW_THRESHOLD", "200000"))
+
+# arrow types of the PostgreSQL types (by OID) that COPY output is parsed into;
+# anything else is read as text. numeric becomes float, as it does with read_sql.
+PG_ARROW_TYPES = {
+    16: pa.bool_(),
+    20: pa.int64(),
+    21: pa.int64(),
+    23: pa.int64(),
+    26: pa.int64(),
+    700: pa.float64(),
+    701: pa.float64(),
+    1700: pa.float64(),
+    1082: pa.date32(),
+    1114: pa.timestamp("us"),
+    1184: pa.timestamp("us", tz="UTC"),
+}
+
+# seconds after which the database cancels any query of ours; 0 never does.
+# bounds queries that nobody is waiting on any more, e.g. those of a job
+# that has timed out (6000 seconds, see JobManager._enqueue).
+QUERY_STATEMENT_TIMEOUT = int(os.getenv("QUERY_STATEMENT_TIMEOUT", "6000"))
+
+# called with the backend pid of the connection every query runs on, e.g. so
+# that a worker can cancel the query of a job nobody wants any more (see
+# job_manager/cancellation.py). costs a round trip per query while not empty.
+backend_listeners = []
+
+# called with (phase, seconds) for the phases of every query, e.g. to break a
+# worker job's time down (see job_manager/job_stats.py):
+#   "connect"   checking a connection out of the pool, or opening one.
+#   "execute"   running statements; psycopg2 receives a whole result here unless
+#               it's streamed, and COPY sends its output here.
+#   "fetch"     turning the rows into DataFrames.
+phase_listeners = []
+
 
 class AugurInterface:
     def __init__(self):
@@ -58,15 +106,22 @@ class AugurInterface:
         )
 
         dbschema = self.schema
+        options = "-csearch_path={}".format(dbschema)
+        if QUERY_STATEMENT_TIMEOUT > 0:
+            options += " -cstatement_timeout={}".format(QUERY_STATEMENT_TIMEOUT * 1000)
         try:
             engine = salc.create_engine(
                 database_connection_string,
-                connect_args={"options": "-csearch_path={}".format(dbschema)},
+                connect_args={"options": options},
                 pool_pre_ping=True,
             )
         except:
             logging.critical("Could not get engine- please check parameters.")
 
+        # time spent executing statements on each connection, see _read_phases.
+        salc.event.listen(engine, "before_cursor_execute", _before_execute)
+        salc.event.listen(engine, "after_cursor_execute", _after_execute)
+
         self.engine = engine
 
         logging.debug("Engine returned")
@@ -81,13 +136,162 @@ class AugurInterface:
 
         pr_query = salc.sql.text(query_string)
 
+        with _timed("connect"):
+            conn = self.engine.connect()
+        with conn:
+            self._announce_backend(conn)
+            with _read_phases(conn):
+                this_df = pd.read_sql(pr_query, con=conn)
+
+        # read_sql already returns a default RangeIndex.
+        return this_df
+
+    def run_query_chunks(self, query_string: str, chunksize: int):
+        """
+        Like run_query, but returns an iterator of DataFrames of at most
+        'chunksize' rows. Rows are fetched through a server-side cursor,
+        so neither the driver nor pandas ever holds the whole result.
+        """
+        if self.engine is None:
+            logging.critical("No engine- please use 'get_engine' method to create engine.")
+            return None
+
+        return self._stream_query(salc.sql.text(query_string), chunksize)
+
+    def _stream_query(self, query, chunksize):
+        # the connection stays open, and the cursor on the server, until the last chunk is read.
+        with _timed("connect"):
+            conn = self.engine.connect()
+        with conn:
+            self._announce_backend(conn)
+            conn = conn.execution_options(stream_results=True)
+            chunks = iter(pd.read_sql(query, con=conn, chunksize=chunksize))
+            while True:
+                # only the time spent reading counts, not the caller's time between chunks.
+                with _read_phases(conn):
+                    chunk = next(chunks, None)
+                if chunk is None:
+                    return
+                yield chunk
+
+    def _announce_backend(self, conn):
+        if len(backend_listeners) > 0:
+            _notify_backend(conn.execute(salc.sql.text("SELECT pg_backend_pid()")).scalar())
+
+    def cancel_backend(self, pid: int) -> bool:
+        """
+        Cancels the query that database backend 'pid' is running, if any.
+        Returns whether the backend was signalled.
+        """
         with self.engine.connect() as conn:
-            this_df = pd.read_sql(pr_query, con=conn)
+            return bool(conn.execute(salc.sql.text("SELECT pg_cancel_backend(:pid)"), {"pid": pid}).scalar())
 
-        this_df = this_df.reset_index()
-        this_df.drop("index", axis=1, inplace=True)
+    def estimate_rows(self, query_string: str) -> int:
+        """
+        Number of rows the query planner expects 'query_string' to return.
+        """
+        with _timed("execute"), self.engine.connect() as conn:
+            plan = conn.execute(salc.sql.text(f"EXPLAIN (FORMAT JSON) {query_string}")).scalar()
 
-        return this_df
+        # psycopg2 hands json back parsed; other drivers may not.
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+    def run_bulk_query(self, query_string: str, chunksize=None):
+        """
+        run_query, or run_query_chunks if 'chunksize' is given, for queries
+        whose results may be large: above COPY_ROW_THRESHOLD estimated rows,
+        the result is extracted with run_query_copy instead.
+        """
+        if self.engine is None:
+            logging.critical("No engine- please use 'get_engine' method to create engine.")
+            return None
+
+        if COPY_ROW_THRESHOLD > 0 and self.estimate_rows(query_string) >= COPY_ROW_THRESHOLD:
+            return self.run_query_copy(query_string, chunksize)
+
+        if chunksize is None:
+            return self.run_query(query_string)
+        return self.run_query_chunks(query_string, chunksize)
+
+    def run_query_copy(self, query_string: str, chunksize=None):
+        """
+        Like run_query, or run_query_chunks if 'chunksize' is given, but
+        extracts the result with COPY (...) TO STDOUT as CSV, which PostgreSQL
+        sends far faster than rows fetched through a cursor, and which pyarrow
+        parses straight into typed columns. Column types are taken from the
+        query's result description (see PG_ARROW_TYPES).
+
+        The CSV is spooled to a temporary file rather than held in memory.
+        """
+        if self.engine is None:
+            logging.critical("No engine- please use 'get_engine' method to create engine.")
+            return None
+
+        spool = tempfile.TemporaryFile()
+        with _timed("connect"):
+            conn = self.engine.raw_connection()
+        try:
+            cursor = conn.cursor()
+            # timestamps with time zones in a form arrow parses; reset when the transaction ends.
+            cursor.execute("SET LOCAL TIME ZONE 'UTC'")
+            if len(backend_listeners) > 0:
+                cursor.execute("SELECT pg_backend_pid()")
+                _notify_backend(cursor.fetchone()[0])
+            with _timed("execute"):
+                cursor.execute(f"SELECT * FROM ({query_string}) AS q LIMIT 0")
+                column_types = {col.name: PG_ARROW_TYPES.get(col.type_code, pa.string()) for col in cursor.description}
+                cursor.copy_expert(f"COPY ({query_string}) TO STDOUT WITH (FORMAT csv, HEADER true)", spool)
+        except Exception:
+            spool.close()
+            raise
+        finally:
+            conn.close()
+        spool.seek(0)
+
+        parse_options = pyarrow.csv.ParseOptions(newlines_in_values=True)
+        # COPY writes NULL as an empty field and the empty string as "".
+        convert_options = pyarrow.csv.ConvertOptions(
+            column_types=column_types,
+            strings_can_be_null=True,
+            quoted_strings_can_be_null=False,
+            true_values=["t"],
+            false_values=["f"],
+        )
+
+        if chunksize is None:
+            with spool, _timed("fetch"):
+                table = pyarrow.csv.read_csv(spool, parse_options=parse_options, convert_options=convert_options)
+                return table.to_pandas()
+
+        return self._read_copy_chunks(spool, parse_options, convert_options, chunksize)
+
+    def _read_copy_chunks(self, spool, parse_options, convert_options, chunksize):
+        # record batches are sized in bytes; regroup them into chunks of about 'chunksize' rows.
+        with spool:
+            reader = pyarrow.csv.open_csv(spool, parse_options=parse_options, convert_options=convert_options)
+            batches = []
+            rows = 0
+            chunks = 0
+            start = time.perf_counter()
+            for batch in reader:
+                batches.append(batch)
+                rows += batch.num_rows
+                if rows >= chunksize:
+                    chunk = pa.Table.from_batches(batches).to_pandas()
+                    _notify_phase("fetch", time.perf_counter() - start)
+                    yield chunk
+                    start = time.perf_counter()
+                    batches = []
+                    rows = 0
+                    chunks += 1
+
+            # an empty result still yields one, empty, chunk with its columns.
+            if len(batches) > 0 or chunks == 0:
+                chunk = pa.Table.from_batches(batches, schema=reader.schema).to_pandas()
+                _notify_phase("fetch", time.perf_counter() - start)
+                yield chunk
 
     def package_config(self):
         """
@@ -110,4 +314,47 @@ class AugurInterface:
         self.database = pconfig[4]
         self.schema = pconfig[5]
         self.config_loaded = False
-        self.get_engine()
+
+        key = tuple(pconfig)
+        self.engine = _engines.get(key)
+        if self.engine is None and self.get_engine() is not None:
+            _engines[key] = self.engine
+
+
+def _notify_backend(pid):
+    for listener in backend_listeners:
+        listener(pid)
+
+
+def _notify_phase(phase, seconds):
+    for listener in phase_listeners:
+        listener(phase, seconds)
+
+
+@contextlib.contextmanager
+def _timed(phase):
+    start = time.perf_counter()
+    yield
+    _notify_phase(phase, time.perf_counter() - start)
+
+
+@contextlib.contextmanager
+def _read_phases(conn):
+    # splits the time spent reading a result from 'conn' into
+    # executing statements, as timed by the cursor events, and the rest.
+    executed = conn.info.get("execute_seconds", 0.0)
+    start = time.perf_counter()
+    yield
+    elapsed = time.perf_counter() - start
+    executed = conn.info.get("execute_seconds", 0.0) - executed
+    _notify_phase("execute", executed)
+    _notify_phase("fetch", elapsed - executed)
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["execute_started"] = time.perf_counter()
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info.pop("execute_started", time.perf_counter())
+    conn.info["execute_seconds"] = conn.info.get("execute_seconds", 0.0) + elapsed
@@ -0,0 +1,197 @@
+"""
+    Figure-ready aggregates of cached datasets.
+
+    A second stage of worker jobs: once a selection's raw shards are cached,
+    build_aggregate turns them into the compact frame a card plots, e.g.
+    one row per day instead of one row per commit, and caches it in Redis.
+    The binning and de-duplication then run on the worker pool, and the web
+    tier only downloads the aggregate and builds the figure.
+
+    Aggregates are per selection of repos, not per repo, since some of them
+    (e.g. new contributors) can't be summed across repos. They're cached
+    under the version of the raw dataset they were built from, see
+    JobManager.get_dataset_version, so a refreshed dataset gets a fresh
+    aggregate.
+"""
+import numpy as np
+import pandas as pd
+from rq import get_current_job
+from job_manager.shard_cache import shard_key, report_progress
+from job_manager.result_format import encode_results, decode_shards
+from job_manager.cache_policy import CachePolicy
+from job_manager.job_events import publish_ready
+from job_manager import job_stats
+from queries.commits_query import commits_query
+from queries.contributors_query import contributors_query
+from queries.issues_query import issues_query
+from queries.prs_query import prs_query
+
+# NaT as an int64, the way NumPy and pandas store it.
+_NAT = np.iinfo("int64").min
+
+
+def commits_per_day(df):
+    """
+    Number of commit rows per day; columns date, commits.
+    """
+    days = pd.to_datetime(df["date"], utc=True).dt.floor("D").rename("date")
+    return df.groupby(days).size().reset_index(name="commits")
+
+
+def issues_per_day(df):
+    """
+    Issues created and closed per day, and the number of issues open at
+    the end of each day; columns date, created, closed, open.
+    """
+    created = pd.to_datetime(df["created"], utc=True).dt.floor("D").value_counts()
+    closed = pd.to_datetime(df["closed"], utc=True).dropna().dt.floor("D").value_counts()
+
+    days = pd.DataFrame({"created": created, "closed": closed}).fillna(0).astype("int64").sort_index()
+    days["open"] = (days["created"] - days["closed"]).cumsum()
+    return days.rename_axis("date").reset_index()
+
+
+def new_contributors_per_day(df):
+    """
+    Number of contributors whose first contribution was on each day; columns date, new.
+    """
+    firsts = df[df["rank"] == 1].sort_values("created_at").drop_duplicates(subset=["cntrb_id"])
+    days = pd.to_datetime(firsts["created_at"], utc=True).dt.floor("D").rename("date")
+    return firsts.groupby(days).size().reset_index(name="new")
+
+
+def first_contributions_per_day(df):
+    """
+    Number of first contributions per day and kind of action; columns date, Action, count.
+    """
+    firsts = df[df["rank"] == 1]
+    days = pd.to_datetime(firsts["created_at"], utc=True).dt.floor("D").rename("date")
+    return firsts.groupby([days, firsts["Action"]]).size().reset_index(name="count")
+
+
+def open_intervals_per_day(df):
+    """
+    Number of issues or pull requests per day they were created and day they
+    were closed, NaT for the ones still open; columns created, closed, count.
+    The staleness cards count the open items from these, see pages/utils/staleness.py.
+    """
+    df = df[df["created"].notna()]
+    days = pd.DataFrame({"created": _day_ns(df["created"]), "closed": _day_ns(df["closed"])})
+    return _counted(days.groupby(["created", "closed"]).size().reset_index(name="count"), ["created", "closed"])
+
+
+def contribution_runs_per_day(df):
+    """
+    Number of contributions per day they were made and day their contributor
+    next contributed, NaT for each contributor's latest; columns created_at,
+    following, count. A contribution is its contributor's latest from the one
+    day to the other, so the active/drifting card counts contributors from
+    these, see pages/utils/contributor_status.py.
+    """
+    df = df[df["created_at"].notna()]
+
+    # each contributor's contributions, in order, and the one after each.
+    contributors, _ = pd.factorize(df["cntrb_id"])
+    created = _day_ns(df["created_at"])
+    order = np.lexsort((created, contributors))
+    contributors = contributors[order]
+    created = created[order]
+    last = np.append(contributors[1:] != contributors[:-1], True)
+    following = np.where(last, _NAT, np.roll(created, -1))
+
+    runs = pd.DataFrame({"created_at": created, "following": following})
+    return _counted(
+        runs.groupby(["created_at", "following"]).size().reset_index(name="count"), ["created_at", "following"]
+    )
+
+
+def contributions_per_quarter(df):
+    """
+    Number of contributions per quarter, kind of action and number of
+    contributions of the contributor who made them (their highest rank);
+    columns date, Action, contributions, count. The drive-by/repeat card
+    splits them by the number of contributions.
+    """
+    df = df[df["created_at"].notna()]
+
+    contributors, _ = pd.factorize(df["cntrb_id"])
+    contributions = df["rank"].groupby(contributors).transform("max").fillna(0).astype("int64")
+    quarters = pd.to_datetime(df["created_at"], utc=True).dt.tz_localize(None).dt.to_period("Q").dt.start_time
+    quarters = quarters.dt.tz_localize("UTC").rename("date")
+
+    counts = df.groupby([quarters, df["Action"], contributions.rename("contributions")]).size()
+    return counts.reset_index(name="count")
+
+
+def _day_ns(column):
+    # the day of each timestamp, as int64 nanoseconds since the epoch so that NaT groups like any other day.
+    return pd.DatetimeIndex(pd.to_datetime(column, utc=True)).floor("D").asi8
+
+
+def _counted(counts, columns):
+    for column in columns:
+        counts[column] = pd.to_datetime(counts[column], utc=True)
+    return counts
+
+
+# aggregate name -> (query whose dataset it's built from, function that builds it)
+AGGREGATES = {
+    "commits_per_day": (commits_query, commits_per_day),
+    "issues_per_day": (issues_query, issues_per_day),
+    "new_contributors_per_day": (contributors_query, new_contributors_per_day),
+    "first_contributions_per_day": (contributors_query, first_contributions_per_day),
+    "issue_intervals_per_day": (issues_query, open_intervals_per_day),
+    "pr_intervals_per_day": (prs_query, open_intervals_per_day),
+    "contribution_runs_per_day": (contributors_query, contribution_runs_per_day),
+    "contributions_per_quarter": (contributors_query, contributions_per_quarter),
+}
+
+
+def aggregate_key(name, version):
+    """
+    Redis key of aggregate 'name' built from dataset 'version'.
+    """
+    return f"explorer:aggregate:{name}:{version}"
+
+
+def build_aggregate(name, version, repo_ids):
+    """
+    Worker job
+
+    Builds aggregate 'name' from the cached shards of 'repo_ids' and caches it
+    for as long as the dataset it's built from.
+
+    Returns the number of rows of the aggregate.
+    """
+    job = get_current_job()
+    redis = job.connection
+    func, build = AGGREGATES[name]
+
+    report_progress(job, "aggregating")
+
+    with job_stats.phase("cache"):
+        payloads = redis.mget([shard_key(func, repo_id) for repo_id in repo_ids])
+    if any(payload is None for payload in payloads):
+        raise LookupError(f"{func.__name__} isn't cached for every repo of the selection")
+
+    with job_stats.phase("serialize"):
+        shards = decode_shards(payloads)
+    with job_stats.phase("transform"):
+        df = build(shards)
+
+    key = aggregate_key(name, version)
+    with job_stats.phase("serialize"):
+        payload = encode_results(df)
+    policy = CachePolicy(redis)
+    job_stats.count(rows=len(df), nbytes=len(payload))
+
+    pipe = redis.pipeline()
+    pipe.set(key, payload, ex=policy.ttl(func))
+    policy.record_write(pipe, key, len(payload))
+    with job_stats.phase("cache"):
+        pipe.execute()
+        policy.enforce(protect=[key])
+
+    publish_ready(redis, name, repo_ids)
+
+    return len(df)
@@ -0,0 +1,211 @@
+"""
+    Lifetime and memory budget of the Redis result cache.
+
+    Configured with environment variables:
+
+        CACHE_TTL                 seconds a cached shard lives, default 500.
+        CACHE_TTL_<QUERY NAME>    per-dataset override, e.g. CACHE_TTL_COMMITS_QUERY=3600.
+        CACHE_MAX_BYTES           budget for all cached shards, 0 (default) for no budget.
+        CACHE_EVICTION            "lru" (default) or "lfu"; which shards go first
+                                  when the budget is exceeded.
+        FIGURE_CACHE_MAX_BYTES    budget for all cached figures, 0 (default) for no budget.
+
+    Every cached shard's size is recorded when it's written, along with a
+    running total of the cache's bytes, and every read bumps its access score,
+    so that a worker that pushes the cache over budget can evict the least
+    recently (or least frequently) used shards. Writes that keep the cache
+    within budget cost one round trip; evictions pop their victims off the
+    access scores in a Lua script, so that concurrent workers never evict
+    the same shards twice. The bytes of shards that expired stay counted
+    until they're popped, or until the warmer's periodic purge_expired.
+
+    Rendered figures are kept to a budget of their own by FigureCachePolicy,
+    so that a burst of new figures never evicts the shards they're built from.
+"""
+import os
+import time
+import logging
+
+
+# KEYS: sizes, total. ARGV: key, bytes.
+# records the size of a written key, and adds the change to the total.
+_RECORD_WRITE = """
+local old = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or '0')
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+return redis.call('INCRBY', KEYS[2], tonumber(ARGV[2]) - old)
+"""
+
+# KEYS: sizes, access, total. ARGV: budget, then the protected keys.
+# pops the lowest-scored keys until the total fits the budget; protected
+# keys go last. returns the evicted keys.
+_EVICT = """
+local budget = tonumber(ARGV[1])
+local total = tonumber(redis.call('GET', KEYS[3]) or '0')
+if total <= budget then
+    return {}
+end
+
+local protected = {}
+for i = 2, #ARGV do
+    protected[ARGV[i]] = true
+end
+
+local evicted = {}
+local held = {}
+local function evict(key)
+    local size = tonumber(redis.call('HGET', KEYS[1], key) or '0')
+    -- a cached key and its metadata hash go together.
+    redis.call('DEL', key, key .. ':meta')
+    redis.call('HDEL', KEYS[1], key)
+    total = redis.call('DECRBY', KEYS[3], size)
+    table.insert(evicted, key)
+end
+
+while total > budget do
+    local popped = redis.call('ZPOPMIN', KEYS[2])
+    if #popped == 0 then
+        break
+    end
+    if protected[popped[1]] then
+        table.insert(held, popped)
+    else
+        evict(popped[1])
+    end
+end
+
+for _, popped in ipairs(held) do
+    if total > budget then
+        evict(popped[1])
+    else
+        redis.call('ZADD', KEYS[2], popped[2], popped[1])
+    end
+end
+
+return evicted
+"""
+
+# KEYS: sizes, access, total.
+# drops the bookkeeping of expired keys and recounts the total. returns the number dropped.
+_PURGE_EXPIRED = """
+local sizes = redis.call('HGETALL', KEYS[1])
+local total = 0
+local expired = 0
+for i = 1, #sizes, 2 do
+    if redis.call('EXISTS', sizes[i]) == 1 then
+        total = total + tonumber(sizes[i + 1])
+    else
+        redis.call('HDEL', KEYS[1], sizes[i])
+        redis.call('ZREM', KEYS[2], sizes[i])
+        expired = expired + 1
+    end
+end
+redis.call('SET', KEYS[3], total)
+return expired
+"""
+
+
+class CachePolicy:
+    # hash of cached key -> bytes
+    SIZES_KEY = "explorer:cache:bytes"
+    # sorted set of cached key -> last access time (lru) or number of accesses (lfu)
+    ACCESS_KEY = "explorer:cache:access"
+    # total bytes of the keys in SIZES_KEY
+    TOTAL_KEY = "explorer:cache:total"
+    # environment variable of the budget of the keys in SIZES_KEY
+    MAX_BYTES_VAR = "CACHE_MAX_BYTES"
+
+    def __init__(self, redis):
+        self._redis = redis
+        self.default_ttl = int(os.getenv("CACHE_TTL", "500"))
+        self.max_bytes = int(os.getenv(self.MAX_BYTES_VAR, "0"))
+        self.eviction = os.getenv("CACHE_EVICTION", "lru").lower()
+
+        if self.eviction not in ["lru", "lfu"]:
+            logging.warning(f"Unknown CACHE_EVICTION '{self.eviction}', using lru.")
+            self.eviction = "lru"
+
+        self._record_write = redis.register_script(_RECORD_WRITE)
+        self._evict = redis.register_script(_EVICT)
+        self._purge_expired = redis.register_script(_PURGE_EXPIRED)
+
+    def ttl(self, func):
+        """
+        Seconds that results of query 'func' stay cached.
+        """
+        return int(os.getenv(f"CACHE_TTL_{func.__name__.upper()}", self.default_ttl))
+
+    def record_write(self, pipe, key, nbytes):
+        """
+        Queues the bookkeeping for a newly written key on 'pipe'.
+        """
+        self._record_write(keys=[self.SIZES_KEY, self.TOTAL_KEY], args=[key, nbytes], client=pipe)
+        if self.eviction == "lru":
+            pipe.zadd(self.ACCESS_KEY, {key: time.time()})
+        else:
+            pipe.zincrby(self.ACCESS_KEY, 1, key)
+
+    def record_access(self, pipe, keys):
+        """
+        Queues an access-score bump of 'keys' on 'pipe'.
+        """
+        if len(keys) == 0:
+            return
+
+        if self.eviction == "lru":
+            now = time.time()
+            pipe.zadd(self.ACCESS_KEY, {key: now for key in keys})
+        else:
+            for key in keys:
+                pipe.zincrby(self.ACCESS_KEY, 1, key)
+
+    def report(self):
+        """
+        Bytes per cached key, for keys that are still in Redis.
+        """
+        sizes = {key: int(size) for key, size in self._redis.hgetall(self.SIZES_KEY).items()}
+
+        pipe = self._redis.pipeline()
+        for key in sizes:
+            pipe.exists(key)
+        alive = pipe.execute()
+
+        return {key.decode("utf-8"): size for (key, size), live in zip(sizes.items(), alive) if live}
+
+    def enforce(self, protect=()):
+        """
+        Evicts the lowest-scored keys until the cache fits in its budget.
+        Keys in 'protect', e.g. the ones just written, are evicted last.
+
+        Returns the list of evicted keys.
+        """
+        if self.max_bytes <= 0:
+            return []
+
+        evicted = self._evict(keys=[self.SIZES_KEY, self.ACCESS_KEY, self.TOTAL_KEY], args=[self.max_bytes, *protect])
+        if len(evicted) > 0:
+            logging.info(f"CACHE EVICTED {len(evicted)} keys")
+
+        return evicted
+
+    def purge_expired(self):
+        """
+        Drops the bookkeeping of keys that expired, so that their bytes stop
+        counting against the budget, and recounts the total. Scans every
+        cached key, so it's run periodically rather than on writes.
+
+        Returns the number of expired keys.
+        """
+        return self._purge_expired(keys=[self.SIZES_KEY, self.ACCESS_KEY, self.TOTAL_KEY])
+
+
+class FigureCachePolicy(CachePolicy):
+    """
+    CachePolicy of the rendered figures: their sizes, access scores and
+    budget are kept apart from the shards', so evicting figures only ever
+    evicts other figures.
+    """
+
+    SIZES_KEY = "explorer:figure-cache:bytes"
+    ACCESS_KEY = "explorer:figure-cache:access"
+    TOTAL_KEY = "explorer:figure-cache:total"
+    MAX_BYTES_VAR = "FIGURE_CACHE_MAX_BYTES"
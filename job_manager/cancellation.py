@@ -0,0 +1,115 @@
+"""
+    Cancellation of jobs that nobody is waiting on any more.
+
+    The page poller of every browser tab (a session) tells JobManager which
+    job it's waiting on for each query, see JobManager.get_job_statuses.
+    When a tab searches for another selection its old jobs are released, and
+    a tab that's closed stops renewing its claim, which lapses after
+    CANCEL_LEASE seconds. Once no session wants a job, JobManager.cancel_job
+    cancels it:
+
+    - a job that hasn't started yet is taken off its queue (RQ's Job.cancel).
+    - a running job is flagged under cancel_key. ExplorerWorker runs a
+      CancelWatchdog next to each job, which notices the flag and cancels the
+      job's database query with pg_cancel_backend; the job then ends without
+      caching anything, and without being retried (see cancellable).
+
+    Jobs that no session asked for, e.g. the cache warmer's, are never
+    cancelled. Queries whose worker is gone altogether are bounded by the
+    database's statement timeout, see QUERY_STATEMENT_TIMEOUT in
+    db_manager/AugurInterface.py.
+"""
+import os
+import logging
+import functools
+import threading
+from rq import get_current_job
+from db_manager.AugurInterface import AugurInterface, backend_listeners
+
+# seconds for which a session's claim on a job holds without being renewed.
+# tabs renew theirs on every poll; browsers poll background tabs about once a minute.
+CANCEL_LEASE = int(os.getenv("CANCEL_LEASE", "300"))
+
+# seconds between a worker's checks for the cancellation of the job it's running.
+CANCEL_POLL = float(os.getenv("CANCEL_POLL", "2"))
+
+# worker jobs that query the database; their arguments start with (func, dbmc, ...).
+QUERY_JOBS = ["job_manager.shard_cache.fill_shards", "job_manager.shard_cache.refresh_shards"]
+
+
+def cancel_key(job_id):
+    """
+    Redis key flagging job 'job_id' as cancelled.
+    """
+    return f"explorer:cancel:{job_id}"
+
+
+def is_cancelled(redis, job_id):
+    return bool(redis.exists(cancel_key(job_id)))
+
+
+def cancellable(task):
+    """
+    Decorator of worker jobs that may be cancelled while they run. Once the
+    job is flagged as cancelled, whatever exception the cancellation causes
+    (typically the cancelled query's) ends the job as finished, having cached
+    nothing, rather than failing it and having it retried; the web tier then
+    treats it as no job at all.
+    """
+
+    @functools.wraps(task)
+    def wrapper(*args, **kwargs):
+        try:
+            return task(*args, **kwargs)
+        except Exception:
+            job = get_current_job()
+            if job is None or not is_cancelled(job.connection, job.id):
+                raise
+            logging.info(f"JOB CANCELLED: {job.id}")
+            return None
+
+    return wrapper
+
+
+class CancelWatchdog(threading.Thread):
+    """
+    Runs next to a job on an ExplorerWorker and, once the job is flagged
+    as cancelled, cancels the queries the job has running on the database.
+    The job's queries report their backend's pid through AugurInterface's
+    backend_listeners while the watchdog is running.
+    """
+
+    def __init__(self, job):
+        super().__init__(name=f"cancel-watchdog-{job.id}", daemon=True)
+        self.job = job
+        self.backends = []
+        self._done = threading.Event()
+
+    def note_backend(self, pid):
+        self.backends.append(pid)
+
+    def start(self):
+        backend_listeners.append(self.note_backend)
+        super().start()
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        backend_listeners.remove(self.note_backend)
+
+    def run(self):
+        if self.job.func_name not in QUERY_JOBS:
+            return
+
+        while not self._done.wait(CANCEL_POLL):
+            if len(self.backends) == 0 or not is_cancelled(self.job.connection, self.job.id):
+                continue
+
+            # a job may go on to run another query on the same backend, so keep at it.
+            dbm = AugurInterface()
+            dbm.load_pconfig(self.job.args[1])
+            for pid in set(self.backends):
+                try:
+                    dbm.cancel_backend(pid)
+                except Exception:
+                    logging.exception(f"Couldn't cancel backend {pid} of job {self.job.id}")
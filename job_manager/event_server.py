@@ -0,0 +1,51 @@
+"""
+    Server of the /job-events stream, see job_manager/job_events.py.
+
+    Each open page holds one of these connections for as long as it's open,
+    which would tie up a thread of the Dash server's sync workers apiece. So
+    in deployment they're served by this small Flask app of their own, on
+    gevent workers, while the Dash server keeps its threaded workers for
+    the pandas and Plotly work of rendering cards. app.py serves the same
+    route for running the app on its own, e.g. in development.
+
+    Run with:
+
+        gunicorn --bind :8051 "job_manager.event_server:create_server()" --worker-class gevent --worker-connections 1000
+
+    or, for development, python -m job_manager.event_server. Route the
+    /job-events path of the app to it, or set JOB_EVENTS_URL (see app.py) to
+    wherever it's reachable and JOB_EVENTS_ALLOW_ORIGIN to the app's origin.
+
+    Configured with environment variables:
+
+        EVENT_SERVER_PORT   port of the development server, default 8051.
+"""
+import os
+import logging
+import flask
+from job_manager.job_events import job_events_response
+from job_manager.job_manager import JobManager
+
+
+def create_server():
+    """
+    The Flask app serving /job-events, with a JobManager of its own.
+    """
+    server = flask.Flask(__name__)
+    jm = JobManager()
+
+    @server.route("/job-events")
+    def job_events():
+        return job_events_response(jm)
+
+    return server
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    port = int(os.getenv("EVENT_SERVER_PORT", "8051"))
+    create_server().run(host="", port=port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
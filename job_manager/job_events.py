@@ -0,0 +1,109 @@
+"""
+    Job completion events.
+
+    Workers publish a message on a Redis pub/sub channel as soon as a job has
+    written its shards or aggregate, or has failed for good, naming the query
+    (or aggregate) and the repos it covered. The web tier relays these
+    messages to the browser as server-sent events (job_events_response,
+    served by app.py and job_manager/event_server.py), so that cards
+    re-render once when their data lands instead of polling for it.
+
+    Messages are JSON objects:
+
+        {"query": "commits_query", "repos": [1, 2], "status": "finished" | "failed"}
+
+    Configured with environment variables:
+
+        JOB_EVENTS_ALLOW_ORIGIN     origin of the pages, for when they're served from
+                                    another origin than the stream (see JOB_EVENTS_URL
+                                    in app.py); unset, the stream is same-origin only.
+"""
+import os
+import json
+import logging
+import flask
+from job_manager.metrics import JOB_FAILURES, record
+
+EVENTS_CHANNEL = "explorer:events"
+
+JOB_EVENTS_ALLOW_ORIGIN = os.getenv("JOB_EVENTS_ALLOW_ORIGIN")
+
+
+def publish_ready(redis, dataset, repo_ids):
+    """
+    Announces that 'dataset', a query function or the name of an aggregate,
+    is cached for 'repo_ids'.
+    """
+    _publish(redis, _name(dataset), repo_ids, "finished")
+
+
+def publish_failed(job, connection, exc_type, exc_value, tb):
+    """
+    RQ failure callback of fill, refresh and aggregate jobs, whose
+    arguments all start with (dataset, ..., repo_ids).
+
+    Attempts that will be retried aren't announced; cards keep waiting
+    on those as they would on any pending job. Every attempt counts
+    towards the failure metrics.
+    """
+    dataset, _, repo_ids = job.args
+    record(connection, JOB_FAILURES, 1, query=_name(dataset), final=str(not job.retries_left).lower())
+
+    if job.retries_left:
+        return
+
+    _publish(connection, _name(dataset), repo_ids, "failed")
+
+
+def listen(redis, keepalive):
+    """
+    Yields every event message as a JSON string, and None whenever no
+    message has arrived for 'keepalive' seconds so that the caller can
+    check that its client is still there.
+    """
+    pubsub = redis.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(EVENTS_CHANNEL)
+    try:
+        while True:
+            message = pubsub.get_message(timeout=keepalive)
+            if message is None:
+                yield None
+            else:
+                yield message["data"].decode("utf-8")
+    finally:
+        pubsub.close()
+
+
+def job_events_response(jm):
+    """
+    Server-sent event stream of the job completions that 'jm' relays,
+    read by assets/job_events.js.
+    """
+
+    def stream():
+        for event in jm.job_events():
+            if event is None:
+                # comment line; lets us notice clients that have gone away.
+                yield ": keepalive\n\n"
+            else:
+                yield f"data: {event}\n\n"
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    if JOB_EVENTS_ALLOW_ORIGIN:
+        headers["Access-Control-Allow-Origin"] = JOB_EVENTS_ALLOW_ORIGIN
+        headers["Vary"] = "Origin"
+
+    return flask.Response(stream(), mimetype="text/event-stream", headers=headers)
+
+
+def _name(dataset):
+    return dataset if isinstance(dataset, str) else dataset.__name__
+
+
+def _publish(redis, query, repo_ids, status):
+    message = json.dumps({"query": query, "repos": [int(r) for r in repo_ids], "status": status})
+    try:
+        redis.publish(EVENTS_CHANNEL, message)
+    except Exception:
+        # the data is cached either way; browsers fall back to polling.
+        logging.exception(f"Couldn't publish {status} event for {query}")
@@ -1,13 +1,67 @@
 from redis import Redis
-from rq import Queue
+from rq import Queue, Retry
+from rq.job import Job, Dependency
+from rq.exceptions import NoSuchJobError, InvalidJobOperation
+from rq.serializers import DefaultSerializer
+from job_manager.shard_cache import (
+    shard_key,
+    shard_meta_key,
+    staged_key,
+    fill_shards,
+    refresh_shards,
+    merge_partitions,
+)
+from job_manager.cache_policy import CachePolicy, FigureCachePolicy
+from job_manager.job_events import publish_failed, listen
+from job_manager.cancellation import CANCEL_LEASE, cancel_key
+from job_manager.metrics import CALLBACK_SECONDS, CACHE_REQUESTS, WEB_METRICS, queue, render
+from job_manager.aggregates import AGGREGATES, aggregate_key, build_aggregate
+from job_manager.job_stats import STATS_KEY, JOB_STATS_KEEP
+from job_manager import tracing
 from queries.commits_query import commits_query
 from queries.contributors_query import contributors_query
 from queries.issues_query import issues_query
+from queries.prs_query import prs_query
 
 import os
+import json
+import threading
+import time
 import hashlib
 import logging
 
+# every query the visualizations use, e.g. for warming the cache.
+QUERIES = [commits_query, contributors_query, issues_query, prs_query]
+
+# named queues, highest priority first. workers drain them in this order.
+# "interactive": a user is waiting on the results.
+# "prefetch": warming the cache ahead of users.
+# "refresh": delta refreshes of data that's already cached.
+QUEUES = ["interactive", "prefetch", "refresh"]
+
+# job states in which a job will still cache its results without our help.
+PENDING_STATES = ["queued", "started", "deferred", "scheduled"]
+
+# sorted sets of selections of repos -> number of searches / time of last search
+POPULARITY_KEY = "explorer:popularity"
+LAST_SEARCHED_KEY = "explorer:popularity:last"
+
+# sorted set of job hashes -> last time a session wanted the job, see JobManager.cancel_abandoned_jobs.
+WANTED_KEY = "explorer:wanted"
+
+# seconds during which only one caller may enqueue a given job; the lock is
+# released once the job is enqueued, this only bounds a caller that dies holding it.
+ENQUEUE_LOCK_TTL = 60
+
+# a failed job is retried this many times, waiting
+# RETRY_BACKOFF, 2 * RETRY_BACKOFF, 4 * RETRY_BACKOFF... seconds in between.
+RETRY_MAX = 3
+RETRY_BACKOFF = 30
+
+# fills of more repos than this are split into partitions of this many repos
+# that run in parallel, see JobManager._fan_out; 0 never splits.
+FANOUT_REPOS = int(os.getenv("FANOUT_REPOS", "100"))
+
 
 class JobManager:
     def __init__(self):
@@ -18,10 +72,23 @@ class JobManager:
             port=os.getenv("REDIS_SERVICE_PORT", "6379"),
             password=os.getenv("REDIS_PASSWORD", ""),
         )
-        # RQ service connected to Redis
-        self._rq = Queue(connection=self._redis)
+        # RQ service connected to Redis, one queue per priority
+        self._queues = {name: Queue(name, connection=self._redis) for name in QUEUES}
+        # lifetime, memory budget and access tracking of cached results
+        self._policy = CachePolicy(self._redis)
+        # the same for rendered figures, within a budget of their own
+        self._figure_policy = FigureCachePolicy(self._redis)
+        # metrics observed since they were last sent to Redis, see _observe
+        self._observations = []
+        self._observations_lock = threading.Lock()
+
+    def _get_aggregate_hash(self, name, version):
+        return hashlib.md5(f"{name}:{version}".encode("utf-8")).hexdigest()
+
+    def _get_partition_hash(self, job_hash, offset):
+        return hashlib.md5(f"{job_hash}:{offset}".encode("utf-8")).hexdigest()
 
-    def _get_job_hash(self, func, arglist):
+    def _get_job_hash(self, func, arglist, refresh=False):
 
         # use md5 instead of sha256 or better because
         # we're only ensuring limited collision avoidance, not
@@ -29,90 +96,809 @@ class JobManager:
         hashfunc = hashlib.md5()
         # use the called function's name
         hashfunc.update(bytes(func.__name__, "utf-8"))
-        # and the repo list we're passing to it
-        hashfunc.update(bytes(str(frozenset(arglist)), "utf-8"))
+        # and the repos we're passing to it, in canonical order: str() of a
+        # frozenset depends on the order its items were added in.
+        hashfunc.update(bytes(str(sorted(set(arglist))), "utf-8"))
+        # refreshes of a selection are separate jobs from filling it in.
+        if refresh:
+            hashfunc.update(b"refresh")
         # grab the hex hash that's been generated.
         h = hashfunc.hexdigest()
 
         return h
 
+    def _missing_repos(self, func, repolist):
+        """
+        Repos in 'repolist' whose shard for 'func' isn't cached.
+        Costs one round trip to Redis regardless of the number of repos.
+        """
+        pipe = self._redis.pipeline()
+        for repo_id in repolist:
+            pipe.exists(shard_key(func, repo_id))
+        self._queue_observations(pipe)
+        cached = pipe.execute()[: len(repolist)]
+
+        return [repo_id for repo_id, hit in zip(repolist, cached) if not hit]
+
+    def expiring_repos(self, func, repolist, within):
+        """
+        Splits 'repolist' into the repos whose shard for 'func' isn't cached,
+        and those whose shard expires in less than 'within' seconds.
+        """
+        pipe = self._redis.pipeline()
+        for repo_id in repolist:
+            pipe.pttl(shard_key(func, repo_id))
+        ttls = pipe.execute()
+
+        # pttl is -2 for a missing key, -1 for one that never expires.
+        missing = [repo_id for repo_id, ttl in zip(repolist, ttls) if ttl == -2]
+        expiring = [repo_id for repo_id, ttl in zip(repolist, ttls) if 0 <= ttl < within * 1000]
+        return missing, expiring
+
+    def record_selection(self, repolist):
+        """
+        Counts a search for this selection of repos, for cache warming.
+        """
+        if len(repolist) == 0:
+            return
+
+        # canonical form: the same repos in any order are the same selection.
+        selection = ",".join(str(repo_id) for repo_id in sorted(repolist))
+
+        pipe = self._redis.pipeline()
+        pipe.zincrby(POPULARITY_KEY, 1, selection)
+        pipe.zadd(LAST_SEARCHED_KEY, {selection: time.time()})
+        pipe.execute()
+
+    def popular_selections(self, k, window):
+        """
+        The 'k' most searched-for selections among those
+        searched for in the last 'window' seconds, as lists of repo ids.
+        """
+        # forget selections nobody has searched for in a while.
+        stale = self._redis.zrangebyscore(LAST_SEARCHED_KEY, "-inf", time.time() - window)
+        if len(stale) > 0:
+            pipe = self._redis.pipeline()
+            pipe.zrem(POPULARITY_KEY, *stale)
+            pipe.zrem(LAST_SEARCHED_KEY, *stale)
+            pipe.execute()
+
+        selections = self._redis.zrevrange(POPULARITY_KEY, 0, k - 1)
+        return [[int(repo_id) for repo_id in s.decode("utf-8").split(",")] for s in selections]
+
     # dbmc is "database manager config"
-    def add_job(self, func, dbmc, repolist):
+    def add_job(self, func, dbmc, repolist, refresh=False, priority="interactive"):
+        """
+        Enqueues a job that caches the repos in 'repolist' that aren't cached yet.
+
+        With refresh=True, the job instead brings every repo in 'repolist' up to
+        date: cached repos only query the rows newer than their shard's watermark,
+        repos that aren't cached are queried in full.
+
+        'priority' names the queue the job goes on, see QUEUES. If the job is
+        already waiting on a lower-priority queue, it's moved up to this one.
+        """
+
+        if refresh:
+            task, repos = refresh_shards, list(repolist)
+        else:
+            # only the repos that aren't cached need to be queried.
+            task, repos = fill_shards, self._missing_repos(func, repolist)
+
+        if len(repos) == 0:
+            return None
+
+        # get a hash of the function used and the repos it'll fill in
+        job_hash = self._get_job_hash(func, repos, refresh=refresh)
+
+        with tracing.span("add_job", query=func.__name__, repos=len(repos), refresh=refresh, priority=priority):
+            if task is fill_shards and FANOUT_REPOS > 0 and len(repos) > FANOUT_REPOS:
+                return self._fan_out(job_hash, priority, self._policy.ttl(func), func, dbmc, repos)
+
+            return self._enqueue(job_hash, priority, self._policy.ttl(func), task, func, dbmc, repos)
+
+    def _fan_out(self, job_hash, priority, ttl, func, dbmc, repos):
+        """
+        Enqueues a large fill as one fill_shards job per partition of
+        FANOUT_REPOS repos, which run in parallel on as many workers, and a
+        merge_partitions job under 'job_hash' that runs once they've all ended
+        and moves their shards into the cache together. Until then the
+        selection's status is the merge job's, "deferred".
+        """
+        # the partitions of a merge that's on its way are too.
+        status, _ = self._probe_job(job_hash)
+        if status in PENDING_STATES:
+            return self._enqueue(job_hash, priority, ttl, merge_partitions, func, dbmc, repos)
+
+        # partitioned in canonical order, so that every caller's partitions of the selection are the same.
+        repos = sorted(set(repos))
+        partitions = []
+        for i in range(0, len(repos), FANOUT_REPOS):
+            partition_hash = self._get_partition_hash(job_hash, i)
+            partitions.append(partition_hash)
+            self._enqueue(
+                partition_hash, priority, ttl, fill_shards, func, dbmc, repos[i : i + FANOUT_REPOS], staging=job_hash
+            )
+
+        # failed partitions don't hold up the merge; it reports their repos.
+        dependency = Dependency(jobs=partitions, allow_failure=True)
+        return self._enqueue(job_hash, priority, ttl, merge_partitions, func, dbmc, repos, depends_on=dependency)
+
+    def add_aggregate_job(self, name, dbmc, repolist, priority="interactive"):
+        """
+        Enqueues a job that builds aggregate 'name' (see job_manager/aggregates.py)
+        for the selection 'repolist'. If the dataset it's built from isn't cached
+        yet, enqueues the job that caches that instead.
+        """
+        func, _ = AGGREGATES[name]
+
+        version = self.get_dataset_version(func, repolist)
+        if version is None:
+            return self.add_job(func, dbmc, repolist, priority=priority)
+
+        job_hash = self._get_aggregate_hash(name, version)
+        return self._enqueue(job_hash, priority, self._policy.ttl(func), build_aggregate, name, version, repolist)
+
+    def _enqueue(self, job_hash, priority, ttl, task, *args, **kwargs):
+
+        # a job that's still on its way doesn't need to be enqueued again,
+        # but a user shouldn't wait behind it in a background queue.
+        status, _ = self._probe_job(job_hash)
+        if status in PENDING_STATES:
+            if status == "queued":
+                self._promote(job_hash, priority)
+            return job_hash
+
+        # single-flight: many callbacks across gunicorn workers and threads can ask
+        # for the same job at once. only the one that takes the lock enqueues it;
+        # the others share its job through the hash.
+        lock = f"explorer:lock:{job_hash}"
+        if not self._redis.set(lock, 1, nx=True, ex=ENQUEUE_LOCK_TTL):
+            return job_hash
+
+        try:
+            # a cancelled earlier run of this job mustn't cancel this one.
+            self._redis.delete(cancel_key(job_hash))
 
-        # get a hash of the function used and the args supplied
-        job_hash = self._get_job_hash(func, repolist)
+            # the worker continues the trace of the search that enqueued the job.
+            if tracing.current() is not None:
+                kwargs["meta"] = {"trace": tracing.current()}
 
-        # add a job to our queue, 10 minute timeout (6000ms), id of it's hash.
-        job = self._rq.enqueue(func, dbmc, repolist, job_id=job_hash, job_timeout=6000)
+            # add a job to our queue, 10 minute timeout (6000ms), id of it's hash.
+            # the job's own record lives as long as the data it caches.
+            # failures are retried with exponential backoff by the workers' scheduler;
+            # browsers hear about the ones that fail for good through publish_failed.
+            job = self._queues[priority].enqueue(
+                task,
+                *args,
+                job_id=job_hash,
+                job_timeout=6000,
+                result_ttl=ttl,
+                failure_ttl=ttl,
+                retry=Retry(max=RETRY_MAX, interval=[RETRY_BACKOFF * 2**i for i in range(RETRY_MAX)]),
+                on_failure=publish_failed,
+                **kwargs,
+            )
+        finally:
+            # from here on the job's status dedupes, see the probe above; holding the lock
+            # any longer would only stop a job that has since finished or failed being run again.
+            self._redis.delete(lock)
 
         return job_hash
 
-    def get_job(self, func, arglist):
+    def _promote(self, job_hash, priority):
+        """
+        Moves a queued job to the queue of 'priority' if that's
+        a higher priority than the queue it's waiting on.
+        """
+        origin = self._redis.hget(Job.key_for(job_hash), "origin")
+        if origin is None:
+            return
+
+        origin = origin.decode("utf-8")
+        if origin not in QUEUES or QUEUES.index(priority) >= QUEUES.index(origin):
+            return
+
+        # if no job was removed a worker just picked it up; nothing to move.
+        if self._queues[origin].remove(job_hash) == 0:
+            return
+
+        job = Job.fetch(job_hash, connection=self._redis)
+        self._queues[priority].enqueue_job(job)
+        logging.debug(f"JOB PROMOTED: {job_hash} {origin} -> {priority}")
+
+    def get_results(self, func, arglist):
+
+        missing = self._missing_repos(func, arglist)
 
-        # get an identifying hash of the function used and the args supplied
-        job_hash = self._get_job_hash(func, arglist)
+        # every repo is cached, assemble the selection from its shards.
+        results = self._fetch_shards(func, arglist) if len(missing) == 0 else None
+        self._count_lookup("shards", func.__name__, results is not None)
 
-        # grab the job from the job queue
-        job = self._rq.fetch_job(job_hash)
+        if len(missing) == 0:
+            # a shard could have expired since we checked.
+            if results is None:
+                return (None, None)
 
-        # check if job was fetched from queue
-        if job is not None:
             logging.debug(f"CACHE HIT: {func.__name__}")
-            return job
-        # if job didn't exist, nothing to return.
-        else:
+            return ("finished", results)
+
+        # cheap status check of the job filling in the missing repos.
+        status, ended = self._probe_job(self._get_job_hash(func, missing))
+
+        # a job that ended without caching those repos is as good as no job.
+        if status == "finished" and ended:
+            return (None, None)
+
+        # no job, or job not finished; no results.
+        return (status, None)
+
+    def get_job_status(self, func, arglist):
+        """
+        Like get_results, but never downloads any shards.
+        """
+        missing = self._missing_repos(func, arglist)
+        if len(missing) == 0:
+            return "finished"
+
+        status, ended = self._probe_job(self._get_job_hash(func, missing))
+        if status == "finished" and ended:
             return None
 
-    def get_results(self, func, arglist):
+        return status
 
-        # check to see if job already exists.
-        job = self.get_job(func, arglist)
+    def get_job_progress(self, func, arglist):
+        """
+        What the job filling in the missing repos of a selection is doing, as
+        its worker reports it (see shard_cache.report_progress): a dict with
+        its "phase" and, while querying, the "rows" fetched so far. For a
+        fanned-out fill, "rows" adds up the partitions' and "partitions" and
+        "partitions_done" count them.
 
-        # does job exist by ID in Queue?
-        if job is not None:
+        Returns None if there's no such job or it hasn't reported anything yet.
+        """
+        missing = self._missing_repos(func, arglist)
+        if len(missing) == 0:
+            return None
 
-            # refresh job object from Redis
-            job = self.job_refreshed(job)
+        fields = self._redis.hmget(Job.key_for(self._get_job_hash(func, missing)), "status", "meta", "dependency_ids")
+        return self._fill_progress([fields])[0]
 
-            # job could now be none if Cache wasn't up to date.
-            if job is None:
-                return (None, None)
+    def _fill_progress(self, jobs):
+        """
+        get_job_progress of several fill jobs, from their ("status", "meta",
+        "dependency_ids") fields. Costs one round trip to Redis if any of them
+        is the merge of a fanned-out fill, for its partitions, none otherwise.
+        """
+        # merges waiting on their partitions; see _fan_out.
+        merges = {}
+        for i, (status, _, partitions) in enumerate(jobs):
+            if status == b"deferred" and partitions is not None:
+                merges[i] = json.loads(partitions)
 
-            # job definitely finished, check if results are available
-            if job.ended_at is not None:
+        replies = iter([])
+        if len(merges) > 0:
+            pipe = self._redis.pipeline()
+            for partitions in merges.values():
+                for partition in partitions:
+                    pipe.hmget(Job.key_for(partition), "status", "meta")
+            replies = iter(pipe.execute())
 
-                # results not available
-                if job.result is not None:
+        progress = []
+        for i, (status, meta, _) in enumerate(jobs):
+            if status is None:
+                progress.append(None)
+            elif i in merges:
+                rows = 0
+                done = 0
+                for _ in merges[i]:
+                    status, meta = next(replies)
+                    rows += (self._progress(meta) or {}).get("rows", 0)
+                    if status in [b"finished", b"failed"]:
+                        done += 1
+                progress.append(
+                    {"phase": "fetching", "rows": rows, "partitions": len(merges[i]), "partitions_done": done}
+                )
+            else:
+                progress.append(self._progress(meta))
 
-                    # is finished, results available
-                    return (job.get_status(), job.result)
+        return progress
 
-            # job not finished, no results.
-            return (job.get_status(), None)
+    def get_partial_results(self, func, arglist):
+        """
+        What's available of a selection while the job filling it in runs:
+        the cached shards, and the shards that the finished partitions of
+        a fanned-out fill have staged.
 
-        else:
-            # job didn't exist in Queue in any state.
-            return (None, None)
+        Returns (repos, payloads) of the repos that are available.
+        """
+        # hashed from the same list as the fill that add_job enqueued.
+        missing = self._missing_repos(func, arglist)
+        staging = self._get_job_hash(func, missing)
 
-    def job_refreshed(self, job):
-        try:
-            # try to grab all of the new object values for a job
-            job.refresh()
-            return job
-        except:
-            # job not cached any more, is None.
-            # don't neet to delete job from _jobs
-            # because add_job will handle that.
+        missing = set(missing)
+        keys = [staged_key(staging, repo_id) if repo_id in missing else shard_key(func, repo_id) for repo_id in arglist]
+        if len(keys) == 0:
+            return [], []
+
+        pipe = self._redis.pipeline()
+        pipe.mget(keys)
+        self._policy.record_access(pipe, [key for key, repo_id in zip(keys, arglist) if repo_id not in missing])
+        payloads = pipe.execute()[0]
+
+        available = [(repo_id, payload) for repo_id, payload in zip(arglist, payloads) if payload is not None]
+        return [repo_id for repo_id, _ in available], [payload for _, payload in available]
+
+    @staticmethod
+    def _progress(meta):
+        # job.meta is pickled by RQ's serializer.
+        if meta is None:
             return None
+        return DefaultSerializer.loads(meta).get("progress")
 
-    def get_job_status(self, func, arglist):
+    def job_stats(self, job_hash):
+        """
+        Where the time of job 'job_hash' went, and its rows, bytes and peak
+        memory, as its worker recorded them once it ended (see job_manager/job_stats.py).
 
-        # check to see if job exists.
-        job = self.get_job(func, arglist)
+        Returns None if there's no such job or it hasn't ended yet.
+        """
+        meta = self._redis.hget(Job.key_for(job_hash), "meta")
+        if meta is None:
+            return None
+        return DefaultSerializer.loads(meta).get("stats")
 
-        # if job exists, return its status
-        if job is not None:
-            return job.get_status(refresh=True)
-        # otherwise None
-        else:
+    def recent_job_stats(self, n=100):
+        """
+        Summaries of the last 'n' jobs the workers ran, newest first: the job's
+        stats plus its id, task, query, repos and when it ended.
+        """
+        return [json.loads(summary) for summary in self._redis.lrange(STATS_KEY, 0, n - 1)]
+
+    def expensive_jobs(self, k=10, by="total"):
+        """
+        The 'k' recent jobs that spent the most seconds in phase 'by' (or
+        "total"); use "rows", "bytes" or "peak_rss" to rank by those instead.
+        """
+
+        def cost(summary):
+            return summary[by] if by in ["rows", "bytes", "peak_rss"] else summary["seconds"][by]
+
+        return sorted(self.recent_job_stats(JOB_STATS_KEEP), key=cost, reverse=True)[:k]
+
+    def expensive_repos(self, k=10, by="total"):
+        """
+        The 'k' repos whose recent jobs spent the most seconds in phase 'by'
+        (or "total"), with each job's time split evenly between its repos.
+
+        Returns [(repo_id, {"seconds": {phase: seconds}, "jobs": jobs, "rows": rows})].
+        """
+        repos = {}
+        for summary in self.recent_job_stats(JOB_STATS_KEEP):
+            if len(summary["repos"]) == 0:
+                continue
+
+            share = 1 / len(summary["repos"])
+            for repo_id in summary["repos"]:
+                repo = repos.setdefault(repo_id, {"seconds": {}, "jobs": 0, "rows": 0})
+                repo["jobs"] += 1
+                repo["rows"] += summary["rows"] * share
+                for phase, seconds in summary["seconds"].items():
+                    repo["seconds"][phase] = repo["seconds"].get(phase, 0.0) + seconds * share
+
+        return sorted(repos.items(), key=lambda repo: repo[1]["seconds"].get(by, 0.0), reverse=True)[:k]
+
+    def get_dataset_version(self, func, arglist):
+        """
+        Identifies what's currently cached for a selection: the selection's job
+        hash plus a digest of its shards' versions, which change whenever a
+        worker rewrites a shard. Counts as a read of the shards for the cache policy.
+
+        Returns None if any repo in the selection isn't cached.
+        """
+        if len(arglist) == 0:
+            return None
+
+        pipe = self._redis.pipeline()
+        for repo_id in arglist:
+            pipe.hget(shard_meta_key(func, repo_id), "version")
+        self._policy.record_access(pipe, [shard_key(func, repo_id) for repo_id in arglist])
+        self._queue_observations(pipe)
+        versions = pipe.execute()[: len(arglist)]
+
+        return self._dataset_version(func, arglist, versions)
+
+    def _dataset_version(self, func, arglist, versions):
+        if any(version is None for version in versions):
+            return None
+
+        # independent of the order of the repos, like the job hash.
+        pairs = sorted(zip(arglist, versions))
+        versions = ",".join(f"{repo_id}={version.decode('utf-8')}" for repo_id, version in pairs)
+        digest = hashlib.md5(versions.encode("utf-8")).hexdigest()
+        return f"{self._get_job_hash(func, arglist)}:{digest}"
+
+    def get_aggregate(self, name, arglist):
+        """
+        Like get_results, for aggregate 'name' of the selection 'arglist'.
+        Returns (status, Arrow IPC payload); while the dataset the aggregate is
+        built from isn't cached, the status is that dataset's.
+        """
+        func, _ = AGGREGATES[name]
+
+        version = self.get_dataset_version(func, arglist)
+        if version is None:
+            self._count_lookup("aggregate", name, False)
+            status = self.get_job_status(func, arglist)
+            return (None if status == "finished" else status, None)
+
+        key = aggregate_key(name, version)
+        pipe = self._redis.pipeline()
+        pipe.get(key)
+        self._policy.record_access(pipe, [key])
+        payload = pipe.execute()[0]
+        self._count_lookup("aggregate", name, payload is not None)
+        if payload is not None:
+            return ("finished", payload)
+
+        status, ended = self._probe_job(self._get_aggregate_hash(name, version))
+        if status == "finished" and ended:
+            return (None, None)
+
+        return (status, None)
+
+    def get_figure(self, card, dataset, arglist, params):
+        """
+        Looks up what 'card' rendered for the selection 'arglist' and control
+        values 'params' from what's currently cached of 'dataset', a query
+        function or the name of an aggregate.
+
+        Returns (key, payload): key is None if the dataset isn't cached for the
+        whole selection, in which case there's nothing to cache the figure under
+        yet, and payload is None on a miss.
+        """
+        func = self._dataset_query(dataset)
+
+        version = self.get_dataset_version(func, arglist)
+        if version is None:
+            return (None, None)
+
+        name = dataset if isinstance(dataset, str) else dataset.__name__
+        # the same repos in any order render the same figure.
+        params = json.dumps({"dataset": name, "repos": sorted(set(arglist)), "params": params}, default=str)
+        key = f"explorer:figure:{card}:{hashlib.md5(f'{version}:{params}'.encode('utf-8')).hexdigest()}"
+
+        pipe = self._redis.pipeline()
+        pipe.get(key)
+        self._figure_policy.record_access(pipe, [key])
+        payload = pipe.execute()[0]
+
+        self._count_lookup("figure", card, payload is not None)
+        return (key, payload)
+
+    def put_figure(self, key, dataset, payload):
+        """
+        Caches a rendered figure under a key from get_figure, for as long
+        as the dataset it was rendered from. Figures have a budget of their
+        own, see FigureCachePolicy; they never evict shards.
+        """
+        pipe = self._redis.pipeline()
+        pipe.set(key, payload, ex=self._policy.ttl(self._dataset_query(dataset)))
+        self._figure_policy.record_write(pipe, key, len(payload))
+        pipe.execute()
+
+        self._figure_policy.enforce(protect=[key])
+
+    @staticmethod
+    def _dataset_query(dataset):
+        # aggregates are cached for as long as the query they're built from.
+        return AGGREGATES[dataset][0] if isinstance(dataset, str) else dataset
+
+    def get_aggregate_statuses(self, requests, session=None):
+        """
+        get_job_statuses for several (aggregate name, arglist) pairs.
+        Costs four round trips to Redis regardless of the number of pairs.
+        """
+        return [status for status, _ in self.get_aggregate_states(requests, session)]
+
+    def get_aggregate_states(self, requests, session=None):
+        """
+        get_aggregate_statuses, along with the progress of the fill job of
+        the dataset each aggregate is built from, as get_job_states reads it.
+
+        Returns (status, progress) pairs in the order of 'requests'.
+        """
+        datasets = [(AGGREGATES[name][0], arglist) for name, arglist in requests]
+        states = self.get_job_states(datasets, session=session)
+        statuses = [status for status, _ in states]
+
+        # versions of the datasets that are cached.
+        cached = [i for i, status in enumerate(statuses) if status == "finished"]
+        pipe = self._redis.pipeline()
+        for i in cached:
+            func, arglist = datasets[i]
+            for repo_id in arglist:
+                pipe.hget(shard_meta_key(func, repo_id), "version")
+        replies = iter(pipe.execute())
+
+        versions = {}
+        for i in cached:
+            func, arglist = datasets[i]
+            version = self._dataset_version(func, arglist, [next(replies) for _ in arglist])
+            if version is None:
+                # a shard expired since we checked.
+                statuses[i] = None
+            else:
+                versions[i] = version
+
+        # the aggregates, and their jobs, for those versions.
+        pipe = self._redis.pipeline()
+        for i, version in versions.items():
+            name, _ = requests[i]
+            pipe.exists(aggregate_key(name, version))
+            pipe.hmget(Job.key_for(self._get_aggregate_hash(name, version)), "status", "ended_at")
+        replies = iter(pipe.execute())
+
+        for i in versions:
+            exists, job = next(replies), next(replies)
+            status, ended = self._job_state(*job)
+
+            if exists:
+                statuses[i] = "finished"
+            else:
+                statuses[i] = None if status == "finished" and ended else status
+
+        return [(status, progress) for status, (_, progress) in zip(statuses, states)]
+
+    def get_job_statuses(self, requests, session=None):
+        """
+        get_job_status for several (func, arglist) pairs at once, e.g. every
+        dataset a page needs. Costs two round trips to Redis regardless of the
+        number of pairs: one for the shards, one for the jobs of missing repos.
+
+        With 'session', the id of the browser tab asking, also records that the
+        session wants the jobs filling in these selections (see want_jobs),
+        for two more round trips.
+
+        Returns the statuses in the order of 'requests'.
+        """
+        return [status for status, _ in self.get_job_states(requests, session)]
+
+    def get_job_states(self, requests, session=None):
+        """
+        get_job_statuses, along with the get_job_progress of each selection's
+        fill job, which is read in the same round trips; plus one if any of
+        the fills is fanned out, see _fill_progress.
+
+        Returns (status, progress) pairs in the order of 'requests'.
+        """
+        pipe = self._redis.pipeline()
+        for func, arglist in requests:
+            for repo_id in arglist:
+                pipe.exists(shard_key(func, repo_id))
+        cached = iter(pipe.execute())
+
+        missing = [[repo_id for repo_id in arglist if not next(cached)] for _, arglist in requests]
+
+        pipe = self._redis.pipeline()
+        for (func, _), repos in zip(requests, missing):
+            if len(repos) > 0:
+                pipe.hmget(Job.key_for(self._get_job_hash(func, repos)), "status", "ended_at", "meta", "dependency_ids")
+        probed = pipe.execute()
+        progress = iter(self._fill_progress([(status, meta, partitions) for status, _, meta, partitions in probed]))
+        probed = iter(probed)
+
+        states = []
+        for repos in missing:
+            if len(repos) == 0:
+                states.append(("finished", None))
+                continue
+
+            status, ended = self._job_state(*next(probed)[:2])
+            job_progress = next(progress)
+            if status is None or (status == "finished" and ended):
+                states.append((None, None))
+            else:
+                states.append((status, job_progress))
+
+        if session is not None:
+            wanted = {}
+            for (func, _), repos in zip(requests, missing):
+                wanted[func.__name__] = self._get_job_hash(func, repos) if len(repos) > 0 else None
+            self.want_jobs(session, wanted)
+
+        return states
+
+    def want_jobs(self, session, wanted):
+        """
+        Records which job browser tab 'session' is waiting on for each query,
+        a dict of query name -> job hash, None once it isn't waiting on any.
+        A job that the session wanted before for one of these queries is
+        released, and cancelled if no other session wants it (see
+        job_manager/cancellation.py). Claims lapse after CANCEL_LEASE seconds
+        unless renewed, as every poll does.
+        """
+        session_key = f"explorer:session:{session}"
+        previous = self._redis.hmget(session_key, list(wanted))
+        now = time.time()
+
+        released = []
+        pipe = self._redis.pipeline()
+        for (name, job_hash), before in zip(wanted.items(), previous):
+            before = before.decode("utf-8") if before is not None else None
+            if before is not None and before != job_hash:
+                pipe.zrem(f"explorer:wanted:{before}", session)
+                released.append(before)
+
+            if job_hash is None:
+                pipe.hdel(session_key, name)
+                continue
+
+            pipe.hset(session_key, name, job_hash)
+            pipe.zadd(f"explorer:wanted:{job_hash}", {session: now})
+            pipe.expire(f"explorer:wanted:{job_hash}", CANCEL_LEASE)
+            pipe.zadd(WANTED_KEY, {job_hash: now})
+            # wanted again before its worker got to cancel it.
+            pipe.delete(cancel_key(job_hash))
+        pipe.expire(session_key, CANCEL_LEASE)
+        pipe.execute()
+
+        for job_hash in released:
+            self._cancel_if_unwanted(job_hash)
+
+    def cancel_abandoned_jobs(self):
+        """
+        Cancels the jobs whose sessions have all stopped claiming them for
+        CANCEL_LEASE seconds, e.g. because their tabs were closed.
+
+        Returns the number of jobs cancelled.
+        """
+        stale = self._redis.zrangebyscore(WANTED_KEY, "-inf", time.time() - CANCEL_LEASE)
+        return sum(self._cancel_if_unwanted(job_hash.decode("utf-8")) for job_hash in stale)
+
+    def purge_expired(self):
+        """
+        Stops counting the cached results and figures that expired against
+        their memory budgets, see CachePolicy.purge_expired.
+
+        Returns the number of expired results.
+        """
+        return self._policy.purge_expired() + self._figure_policy.purge_expired()
+
+    def _cancel_if_unwanted(self, job_hash):
+        wanted_key = f"explorer:wanted:{job_hash}"
+
+        pipe = self._redis.pipeline()
+        pipe.zremrangebyscore(wanted_key, "-inf", time.time() - CANCEL_LEASE)
+        pipe.zcard(wanted_key)
+        if pipe.execute()[1] > 0:
+            return False
+
+        self._redis.zrem(WANTED_KEY, job_hash)
+        return self.cancel_job(job_hash)
+
+    def cancel_job(self, job_hash):
+        """
+        Cancels job 'job_hash' and, if it's the merge of a fanned-out fill, its
+        partitions. Jobs that haven't started are taken off their queues and
+        running ones are flagged, for their worker to cancel their query; see
+        job_manager/cancellation.py. Jobs that have ended are left alone.
+
+        Returns whether there was anything to cancel.
+        """
+        partitions = self._redis.hget(Job.key_for(job_hash), "dependency_ids")
+        hashes = [job_hash] + (json.loads(partitions) if partitions is not None else [])
+
+        pipe = self._redis.pipeline()
+        for h in hashes:
+            pipe.hget(Job.key_for(h), "status")
+        statuses = [status.decode("utf-8") if status is not None else None for status in pipe.execute()]
+
+        pending = [h for h, status in zip(hashes, statuses) if status in PENDING_STATES]
+        if len(pending) == 0:
+            return False
+
+        # flag every one of them: a queued job may be picked up while we cancel it.
+        # and drop their enqueue locks, so that whoever wants them next can enqueue them again.
+        pipe = self._redis.pipeline()
+        for h in pending:
+            # no job runs for longer than its timeout, see _enqueue.
+            pipe.set(cancel_key(h), 1, ex=6000)
+            pipe.delete(f"explorer:lock:{h}")
+        pipe.execute()
+
+        for h, status in zip(hashes, statuses):
+            if status in ["queued", "deferred", "scheduled"]:
+                try:
+                    Job.fetch(h, connection=self._redis).cancel()
+                except (NoSuchJobError, InvalidJobOperation):
+                    pass
+
+        logging.info(f"JOB CANCELLED: {job_hash} ({len(pending)} jobs)")
+        return True
+
+    def _fetch_shards(self, func, arglist):
+
+        keys = [shard_key(func, repo_id) for repo_id in arglist]
+        if len(keys) == 0:
+            return []
+
+        # download the shards and count the access in one round trip.
+        pipe = self._redis.pipeline()
+        pipe.mget(keys)
+        self._policy.record_access(pipe, keys)
+        payloads = pipe.execute()[0]
+
+        if any(p is None for p in payloads):
             return None
+
+        return payloads
+
+    def _count_lookup(self, cache, dataset, hit):
+        self._observe(CACHE_REQUESTS, 1, cache=cache, dataset=dataset, result="hit" if hit else "miss")
+
+    def record_callback(self, card, seconds):
+        """
+        Observes the latency of a card callback, see job_manager/metrics.py.
+        """
+        self._observe(CALLBACK_SECONDS, seconds, card=card)
+
+    def _observe(self, metric, value, **labels):
+        # whether a lookup hit is only known once its pipeline has run, and a callback's latency
+        # once it returns; rather than a round trip of their own, they're sent with the next lookup.
+        with self._observations_lock:
+            self._observations.append((metric, value, labels))
+
+    def _queue_observations(self, pipe):
+        """
+        Queues the metrics observed so far on 'pipe'. The first pipeline of
+        every lookup (_missing_repos, get_dataset_version) runs this.
+        """
+        with self._observations_lock:
+            observations, self._observations = self._observations, []
+        for metric, value, labels in observations:
+            queue(pipe, metric, value, **labels)
+
+    def metrics(self):
+        """
+        The web tier's metrics in the Prometheus text format, including
+        what this process has observed but not yet sent.
+        """
+        pipe = self._redis.pipeline()
+        self._queue_observations(pipe)
+        pipe.execute()
+        return render(self._redis, WEB_METRICS)
+
+    def cache_report(self):
+        """
+        Bytes per cached key, and their total; shards and aggregates,
+        then rendered figures, which have a budget of their own.
+        """
+        sizes = self._policy.report()
+        figures = self._figure_policy.report()
+        return (sizes, sum(sizes.values())), (figures, sum(figures.values()))
+
+    def job_events(self, keepalive=15):
+        """
+        Stream of job completion events, see job_manager/job_events.py.
+        """
+        return listen(self._redis, keepalive)
+
+    def _probe_job(self, job_hash):
+        """
+        Reads only the 'status' and 'ended_at' fields of the job's Redis hash,
+        rather than loading the whole job (and its pickled result) the way
+        Queue.fetch_job and Job.refresh do.
+
+        Returns (status, ended), (None, False) if the job isn't cached.
+        """
+        return self._job_state(*self._redis.hmget(Job.key_for(job_hash), "status", "ended_at"))
+
+    @staticmethod
+    def _job_state(status, ended_at):
+        # a cancelled job is as good as no job; it's enqueued again if anyone wants it.
+        if status is None or status == b"canceled":
+            return (None, False)
+
+        # RQ writes an empty 'ended_at' until the job is done.
+        return (status.decode("utf-8"), bool(ended_at))
@@ -0,0 +1,206 @@
+"""
+    Per-job timing and resource breakdown.
+
+    ExplorerWorker (job_manager/worker.py) keeps a JobStats for each job it
+    runs, and records it in the job's meta, job.meta["stats"], once the job
+    ends, successfully or not:
+
+        seconds     time spent in each phase of the job:
+                        connect     getting a database connection.
+                        execute     running the query on the database.
+                        fetch       turning its rows into DataFrames.
+                        transform   pandas work: the query function's own, splitting
+                                    the result by repo, merging and aggregating.
+                        serialize   encoding frames as Arrow IPC, and decoding them.
+                        cache       reading and writing them in Redis.
+                    plus "total", the job's run time; what the phases don't
+                    add up to is RQ's bookkeeping, progress reports and metrics.
+        dominant    the phase that took longest.
+        rows        rows the job fetched or built.
+        bytes       bytes of encoded results it cached.
+        peak_rss    peak resident memory of the worker while it ran the job, in bytes.
+
+    The database phases are reported by AugurInterface's phase_listeners;
+    the rest by the jobs themselves, with phase() and count(), which do
+    nothing outside of a job.
+
+    Workers also push a summary of every job, with its query and repos, onto
+    the capped list under STATS_KEY, so that JobManager can tell which
+    repos and queries are expensive, and what they spend their time on.
+
+    python -m job_manager.job_stats lists the most expensive recent jobs and
+    repos; JOB_STATS_BY picks the phase they're ranked by, default "total".
+
+    Configured with environment variables:
+
+        JOB_STATS_KEEP    number of jobs' summaries kept, default 500.
+"""
+import os
+import json
+import time
+import logging
+import resource
+import contextlib
+from db_manager.AugurInterface import phase_listeners
+
+JOB_STATS_KEEP = int(os.getenv("JOB_STATS_KEEP", "500"))
+
+STATS_KEY = "explorer:job_stats"
+
+PHASES = ["connect", "execute", "fetch", "transform", "serialize", "cache"]
+
+# the JobStats of the job this worker is running.
+_current = None
+
+
+class JobStats:
+    def __init__(self, job):
+        self.job = job
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.rows = 0
+        self.bytes = 0
+        # time spent in query functions, of which the database phases are part.
+        self._query = 0.0
+        self._started = None
+
+    def add(self, phase, seconds):
+        if phase == "query":
+            self._query += seconds
+        else:
+            self.seconds[phase] += seconds
+
+    def start(self):
+        global _current
+
+        _reset_peak_rss()
+        self._started = time.perf_counter()
+        phase_listeners.append(self.add)
+        _current = self
+
+    def finish(self):
+        """
+        Stops recording and returns the job's stats, see the module's docstring.
+        """
+        global _current
+
+        total = time.perf_counter() - self._started
+        phase_listeners.remove(self.add)
+        _current = None
+
+        seconds = dict(self.seconds)
+        # whatever a query function spent outside the database is its own pandas work.
+        database = seconds["connect"] + seconds["execute"] + seconds["fetch"]
+        seconds["transform"] += max(self._query - database, 0.0)
+
+        stats = {
+            "seconds": {phase: round(value, 6) for phase, value in seconds.items()},
+            "dominant": max(PHASES, key=seconds.get),
+            "rows": self.rows,
+            "bytes": self.bytes,
+            "peak_rss": _peak_rss(),
+        }
+        stats["seconds"]["total"] = round(total, 6)
+        return stats
+
+    def save(self, stats):
+        """
+        Records 'stats' in the job's meta, and a summary of the job in the list under STATS_KEY.
+        Never worth failing the job over.
+        """
+        job = self.job
+        try:
+            job.meta["stats"] = stats
+            job.save_meta()
+
+            summary = {"job": job.id, "task": job.func_name, **describe(job), "ended": time.time(), **stats}
+            pipe = job.connection.pipeline()
+            pipe.lpush(STATS_KEY, json.dumps(summary))
+            pipe.ltrim(STATS_KEY, 0, JOB_STATS_KEEP - 1)
+            pipe.execute()
+        except Exception:
+            logging.exception(f"Couldn't record the stats of job {job.id}")
+
+
+def describe(job):
+    """
+    The query, or aggregate, and the repos of worker job 'job'.
+    Every worker job's arguments start with (func or name, ...) and end with the repo ids.
+    """
+    if len(job.args) == 0:
+        return {"query": None, "repos": []}
+
+    query = job.args[0]
+    return {"query": getattr(query, "__name__", str(query)), "repos": list(job.args[-1])}
+
+
+@contextlib.contextmanager
+def phase(name):
+    """
+    Adds the time spent in the block to phase 'name' of the running job.
+    "query" times a call into a query function, of which everything but
+    the database's phases counts as transform.
+    """
+    stats = _current
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if stats is not None:
+            stats.add(name, time.perf_counter() - start)
+
+
+def count(rows=0, nbytes=0):
+    """
+    Adds to the rows and bytes of the running job.
+    """
+    if _current is not None:
+        _current.rows += rows
+        _current.bytes += nbytes
+
+
+def _reset_peak_rss():
+    # Linux resets the process' VmHWM on writing 5 to clear_refs, so that
+    # the peak is the job's rather than the long-lived worker's.
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _peak_rss():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    # elsewhere, the worker's peak so far; kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def main():
+    # job_manager.job_manager imports this module.
+    from job_manager.job_manager import JobManager
+
+    by = os.getenv("JOB_STATS_BY", "total")
+    jm = JobManager()
+
+    print(f"jobs by {by} seconds:")
+    for summary in jm.expensive_jobs(10, by):
+        seconds = summary["seconds"]
+        print(
+            f"  {seconds[by]:10.2f}s  {summary['query']} ({len(summary['repos'])} repos) "
+            f"rows={summary['rows']} bytes={summary['bytes']} peak_rss={summary['peak_rss']} "
+            f"dominant={summary['dominant']}"
+        )
+
+    print(f"repos by {by} seconds:")
+    for repo_id, repo in jm.expensive_repos(10, by):
+        print(f"  {repo['seconds'].get(by, 0.0):10.2f}s  repo {repo_id} ({repo['jobs']} jobs)")
+
+
+if __name__ == "__main__":
+    main()
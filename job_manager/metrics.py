@@ -0,0 +1,217 @@
+"""
+    Prometheus metrics.
+
+    Observations are kept in Redis rather than in each process: the web tier
+    runs several gunicorn workers and the worker container several RQ
+    workers, which supervisord replaces every 500 jobs, so per-process
+    metrics would only ever show whichever process answered the scrape.
+    Every process adds its observations to the shared counters, and two
+    expositions render them in the Prometheus text format. The web tier
+    keeps its cache lookups and callback latencies until the pipeline of its
+    next lookup, or until it renders /metrics, and queues them on that, so
+    they cost no round trips of their own (see JobManager._observe); the
+    workers observe theirs with record(), in a round trip apiece:
+
+        /metrics on the web server (app.py)
+            explorer_callback_seconds        card callback latency, per card.
+            explorer_cache_requests_total    cache hits and misses of JobManager, per cache and dataset.
+
+        python -m job_manager.metrics, on the worker container (supervisord.conf)
+            explorer_query_seconds           time a fill or refresh job spent in its query, per query.
+            explorer_result_bytes            bytes of encoded shards a job cached, per query.
+            explorer_job_failures_total      failed job attempts, per query and whether they're final.
+            explorer_queue_depth             jobs waiting on each queue.
+            explorer_jobs_running            jobs being run from each queue.
+            explorer_workers                 live RQ workers.
+
+    Counters only ever grow, until Redis is flushed; Prometheus' rate() and
+    histogram_quantile() take care of the rest.
+
+    Configured with environment variables:
+
+        METRICS_PORT      port of the worker exporter, default 9150.
+"""
+import os
+import logging
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from rq import Queue, Worker
+from rq.registry import StartedJobRegistry
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# bucket upper bounds, in seconds and bytes.
+CALLBACK_BUCKETS = [0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+QUERY_BUCKETS = [0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600]
+BYTES_BUCKETS = [10**3, 10**4, 10**5, 10**6, 10**7, 5 * 10**7, 10**8, 5 * 10**8, 10**9]
+
+
+def _labels(labelnames, labels):
+    def escape(value):
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    return ",".join(f'{name}="{escape(labels[name])}"' for name in labelnames)
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.key = f"explorer:metrics:{name}"
+
+    def inc(self, pipe, amount=1, **labels):
+        """
+        Queues an increment of the counter with 'labels' on 'pipe'.
+        """
+        pipe.hincrbyfloat(self.key, _labels(self.labelnames, labels), amount)
+
+    def render(self, redis):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(redis.hgetall(self.key).items()):
+            lines.append(f"{self.name}{{{labels.decode('utf-8')}}} {float(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self.key = f"explorer:metrics:{name}"
+
+    def observe(self, pipe, value, **labels):
+        """
+        Queues an observation of 'value' with 'labels' on 'pipe'.
+        """
+        labels = _labels(self.labelnames, labels)
+        # buckets are cumulative; +Inf is the count.
+        for bound in self.buckets:
+            if value <= bound:
+                pipe.hincrby(self.key, f"{labels}|{bound}", 1)
+        pipe.hincrby(self.key, f"{labels}|count", 1)
+        pipe.hincrbyfloat(self.key, f"{labels}|sum", value)
+
+    def render(self, redis):
+        series = {}
+        for field, value in redis.hgetall(self.key).items():
+            labels, _, part = field.decode("utf-8").rpartition("|")
+            series.setdefault(labels, {})[part] = value
+
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, values in sorted(series.items()):
+            sep = "," if labels else ""
+            for bound in self.buckets:
+                lines.append(f'{self.name}_bucket{{{labels}{sep}le="{bound}"}} {int(values.get(str(bound), 0))}')
+            count = int(values.get("count", 0))
+            lines.append(f'{self.name}_bucket{{{labels}{sep}le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{labels}}} {float(values.get('sum', 0))}")
+            lines.append(f"{self.name}_count{{{labels}}} {count}")
+        return lines
+
+
+# web tier
+CALLBACK_SECONDS = Histogram("explorer_callback_seconds", "Latency of card callbacks.", ["card"], CALLBACK_BUCKETS)
+CACHE_REQUESTS = Counter(
+    "explorer_cache_requests_total",
+    "Lookups of cached shards, aggregates and figures.",
+    ["cache", "dataset", "result"],
+)
+
+# workers
+QUERY_SECONDS = Histogram(
+    "explorer_query_seconds", "Time jobs spent running and fetching their query.", ["query"], QUERY_BUCKETS
+)
+RESULT_BYTES = Histogram("explorer_result_bytes", "Bytes of encoded shards cached per job.", ["query"], BYTES_BUCKETS)
+JOB_FAILURES = Counter(
+    "explorer_job_failures_total", "Failed job attempts; final ones won't be retried.", ["query", "final"]
+)
+
+WEB_METRICS = [CALLBACK_SECONDS, CACHE_REQUESTS]
+WORKER_METRICS = [QUERY_SECONDS, RESULT_BYTES, JOB_FAILURES]
+
+
+def queue(pipe, metric, value, **labels):
+    """
+    Queues an observation of 'value' of a Histogram, or its addition to a Counter, on 'pipe'.
+    """
+    if isinstance(metric, Histogram):
+        metric.observe(pipe, value, **labels)
+    else:
+        metric.inc(pipe, value, **labels)
+
+
+def record(redis, metric, value, **labels):
+    """
+    queue, in a round trip of its own, for callers that have no pipeline to
+    send it with. Metrics are never worth failing the caller over.
+    """
+    try:
+        pipe = redis.pipeline()
+        queue(pipe, metric, value, **labels)
+        pipe.execute()
+    except Exception:
+        logging.exception(f"Couldn't record {metric.name}")
+
+
+def render(redis, metrics):
+    """
+    'metrics' in the Prometheus text exposition format.
+    """
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render(redis))
+    return "\n".join(lines) + "\n"
+
+
+def render_workers(redis, queues):
+    """
+    The workers' metrics, plus the depth of 'queues' and the workers serving them.
+    """
+    lines = [
+        "# HELP explorer_queue_depth Jobs waiting on each queue.",
+        "# TYPE explorer_queue_depth gauge",
+    ]
+    for name in queues:
+        lines.append(f'explorer_queue_depth{{queue="{name}"}} {Queue(name, connection=redis).count}')
+
+    lines += ["# HELP explorer_jobs_running Jobs being run from each queue.", "# TYPE explorer_jobs_running gauge"]
+    for name in queues:
+        lines.append(f'explorer_jobs_running{{queue="{name}"}} {StartedJobRegistry(name, connection=redis).count}')
+
+    lines += ["# HELP explorer_workers Live RQ workers.", "# TYPE explorer_workers gauge"]
+    lines.append(f"explorer_workers {Worker.count(connection=redis)}")
+
+    return render(redis, WORKER_METRICS) + "\n".join(lines) + "\n"
+
+
+def main():
+    # job_manager.job_manager imports this module.
+    from job_manager.job_manager import JobManager, QUEUES
+
+    logging.basicConfig(level=logging.INFO)
+    port = int(os.getenv("METRICS_PORT", "9150"))
+    redis = JobManager()._redis
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = render_workers(redis, QUEUES).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # one line per scrape is noise.
+            pass
+
+    logging.info(f"METRICS: serving worker metrics on :{port}/metrics")
+    HTTPServer(("", port), Handler).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+    Columnar encoding for the results of worker queries.
+
+    Workers used to return df.to_dict("records"), which RQ pickles into Redis
+    one Python dict per row. Here we ship the DataFrame as an Arrow IPC stream
+    instead: one contiguous buffer per column, which is both smaller in Redis
+    and much cheaper to turn back into a DataFrame on the web tier.
+"""
+import os
+import pandas as pd
+import pyarrow as pa
+
+# "zstd" (default), "lz4" or "none".
+# Uncompressed streams are larger in Redis but are read without copying buffers.
+RESULT_COMPRESSION = os.getenv("RESULT_COMPRESSION", "zstd")
+
+
+def encode_results(df: pd.DataFrame, compression=RESULT_COMPRESSION) -> bytes:
+    """
+    Serializes a DataFrame into Arrow IPC stream bytes.
+    The index is dropped; queries always return a default RangeIndex.
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    if compression == "none":
+        compression = None
+    options = pa.ipc.IpcWriteOptions(compression=compression)
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema, options=options) as writer:
+        writer.write_table(table)
+
+    return sink.getvalue().to_pybytes()
+
+
+class ChunkEncoder:
+    """
+    Encodes a DataFrame that arrives in chunks, e.g. from a streamed query,
+    into the same Arrow IPC stream bytes as encode_results. Each chunk is
+    appended as record batches and compressed right away, so that only the
+    encoded stream is kept between chunks.
+
+    Every chunk is cast to one schema, the first chunk's, so that chunks
+    whose pandas types differ, e.g. an integer column that came back as
+    floats in a chunk with NULLs, still make one stream. Columns that are
+    all NULL in the first chunk take their type from a later one; chunks are
+    held back, unencoded, until every column has a type.
+    """
+
+    def __init__(self, compression=RESULT_COMPRESSION):
+        if compression == "none":
+            compression = None
+        self._options = pa.ipc.IpcWriteOptions(compression=compression)
+        self._sink = pa.BufferOutputStream()
+        self._writer = None
+        self._schema = None
+        self._pending = []
+
+    def write(self, df: pd.DataFrame):
+        table = pa.Table.from_pandas(df, preserve_index=False)
+
+        if self._writer is not None:
+            self._writer.write_table(table.cast(self._schema))
+            return
+
+        self._schema = table.schema if self._schema is None else _fill_null_types(self._schema, table.schema)
+        self._pending.append(table)
+        if not any(pa.types.is_null(field.type) for field in self._schema):
+            self._open()
+
+    def finish(self) -> bytes:
+        """
+        Ends the stream and returns its bytes; at least one chunk must have been written.
+        """
+        if self._writer is None:
+            self._open()
+        self._writer.close()
+        return self._sink.getvalue().to_pybytes()
+
+    def _open(self):
+        self._writer = pa.ipc.new_stream(self._sink, self._schema, options=self._options)
+        for table in self._pending:
+            self._writer.write_table(table.cast(self._schema))
+        self._pending = []
+
+
+def _fill_null_types(schema, other):
+    for i, field in enumerate(schema):
+        if pa.types.is_null(field.type) and not pa.types.is_null(other.field(i).type):
+            schema = schema.set(i, other.field(i))
+    return schema
+
+
+def decode_results(payload: bytes) -> pd.DataFrame:
+    """
+    Rebuilds the DataFrame from Arrow IPC stream bytes.
+
+    Arrow reads the record batches straight out of the payload buffer;
+    for uncompressed streams numeric and timestamp columns are handed to
+    pandas without an extra copy where their layout allows it.
+    """
+    with pa.ipc.open_stream(pa.py_buffer(payload)) as reader:
+        table = reader.read_all()
+
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def decode_shards(payloads) -> pd.DataFrame:
+    """
+    Rebuilds one DataFrame from several Arrow IPC payloads,
+    e.g. the per-repo shards of a selection of repos.
+    """
+    tables = []
+    for payload in payloads:
+        with pa.ipc.open_stream(pa.py_buffer(payload)) as reader:
+            tables.append(reader.read_all())
+
+    # empty shards carry no type information for their text columns.
+    tables = [t for t in tables if t.num_rows > 0] or tables[:1]
+
+    if len(tables) == 0:
+        return pd.DataFrame()
+
+    if all(t.schema.equals(tables[0].schema) for t in tables[1:]):
+        table = pa.concat_tables(tables)
+        return table.to_pandas(split_blocks=True, self_destruct=True)
+
+    # shards can still disagree on a column's type, e.g. all-null in one
+    # repo or integers with NULLs in another; let pandas reconcile those.
+    return pd.concat([t.to_pandas() for t in tables], ignore_index=True)
@@ -0,0 +1,392 @@
+"""
+    Per-repository result cache.
+
+    Instead of caching one result per (query, set of repos), a worker
+    splits its query result by repo_id and caches each repo's rows under
+    its own key. Any selection of repos can then be assembled from the
+    cached shards, and only the repos that aren't cached yet need to be
+    queried.
+
+    Each shard carries a watermark, the newest value of its query's
+    watermark column, so that a cached repo can be refreshed by querying
+    only the rows at or after it and merging them into the shard.
+"""
+import os
+import time
+import pandas as pd
+from rq import get_current_job
+from job_manager.result_format import encode_results, decode_results, ChunkEncoder
+from job_manager.cache_policy import CachePolicy
+from job_manager.job_events import publish_ready
+from job_manager.cancellation import cancellable
+from job_manager.metrics import QUERY_SECONDS, RESULT_BYTES, record
+from job_manager import tracing
+from job_manager import job_stats
+
+# per query: the column the watermark is taken from, and the columns that
+# identify a row so a refreshed row replaces its cached version.
+# None means the whole row is the identity (append-only data).
+WATERMARKS = {
+    "commits_query": ("date", ["file"]),
+    "contributors_query": ("created_at", None),
+    "issues_query": ("updated", ["issue"]),
+    "prs_query": ("updated", ["pull_request"]),
+}
+
+# rows that fill jobs read from the database at a time, see _stream_payloads;
+# 0 reads whole results at once.
+QUERY_CHUNK_ROWS = int(os.getenv("QUERY_CHUNK_ROWS", "100000"))
+
+
+def shard_key(func, repo_id):
+    """
+    Redis key of the cached rows of 'repo_id' for query 'func'.
+    """
+    return f"explorer:shard:{func.__name__}:{repo_id}"
+
+
+def shard_meta_key(func, repo_id):
+    """
+    Redis key of the hash describing a shard: its version and watermark.
+    """
+    return f"{shard_key(func, repo_id)}:meta"
+
+
+def staged_key(staging, repo_id):
+    """
+    Redis key of the rows of 'repo_id' that a partition of a large selection
+    has fetched, until merge job 'staging' moves them into the cache.
+    """
+    return f"explorer:staged:{staging}:{repo_id}"
+
+
+def staged_watermarks_key(staging):
+    """
+    Redis key of the hash of repo -> watermark of the shards staged for merge job 'staging'.
+    """
+    return f"explorer:staged:{staging}:watermarks"
+
+
+@cancellable
+def fill_shards(func, dbmc, repo_ids, staging=None):
+    """
+    Worker job
+
+    Runs query 'func' for 'repo_ids' and caches its result as one
+    Arrow IPC shard per repo. Repos without any rows get an empty shard
+    so that they count as cached.
+
+    The partitions of a large selection (see JobManager.add_job) pass
+    'staging', the id of the job that merges them: their shards are
+    staged, unseen by the web tier, until merge_partitions moves them all
+    into the cache at once.
+
+    Returns the number of rows cached.
+    """
+    job = get_current_job()
+    redis = job.connection
+
+    report_progress(job, "querying", rows=0)
+    start = time.perf_counter()
+    if QUERY_CHUNK_ROWS > 0:
+        # the chunks are encoded as they arrive; that counts as query time here.
+        with tracing.span("query", query=func.__name__, repos=len(repo_ids), streamed=True) as span:
+            rows, payloads, watermarks = _stream_payloads(job, func, dbmc, repo_ids, QUERY_CHUNK_ROWS)
+            span["rows"] = rows
+        record(redis, QUERY_SECONDS, time.perf_counter() - start, query=func.__name__)
+    else:
+        with tracing.span("query", query=func.__name__, repos=len(repo_ids), streamed=False) as span:
+            with job_stats.phase("query"):
+                df = func(dbmc, repo_ids)
+            span["rows"] = len(df)
+        record(redis, QUERY_SECONDS, time.perf_counter() - start, query=func.__name__)
+
+        # split the result by the repo that each row belongs to.
+        with job_stats.phase("transform"):
+            groups = dict(list(df.groupby("repo_id", sort=False)))
+            shards = {repo_id: groups.get(repo_id, df.iloc[0:0]) for repo_id in repo_ids}
+
+        rows = len(df)
+        report_progress(job, "encoding", rows=rows)
+        with tracing.span("encode"), job_stats.phase("serialize"):
+            payloads, watermarks = _encode_shards(func, shards)
+
+    report_progress(job, "caching", rows=rows)
+    nbytes = sum(len(payload) for payload in payloads.values())
+    record(redis, RESULT_BYTES, nbytes, query=func.__name__)
+    job_stats.count(rows=rows, nbytes=nbytes)
+    with tracing.span("cache", bytes=nbytes, staged=staging is not None), job_stats.phase("cache"):
+        if staging is None:
+            _write_payloads(redis, func, payloads, watermarks)
+        else:
+            _stage_payloads(redis, func, staging, payloads, watermarks)
+
+    return rows
+
+
+@cancellable
+def merge_partitions(func, dbmc, repo_ids):
+    """
+    Worker job
+
+    Fan-in of a large selection split into partitions (see JobManager.add_job):
+    runs once every partition has ended, and moves the shards they staged into
+    the cache in one go. 'dbmc' isn't used; the arguments are fill_shards', so
+    that failures are announced the same way.
+
+    Repos that no partition staged, e.g. those of a partition that failed, and
+    that aren't cached otherwise fail the job once the rest are merged.
+
+    Returns the number of repos merged.
+    """
+    job = get_current_job()
+    redis = job.connection
+    staging = job.id
+
+    report_progress(job, "merging")
+    pipe = redis.pipeline()
+    for repo_id in repo_ids:
+        pipe.strlen(staged_key(staging, repo_id))
+        pipe.exists(shard_key(func, repo_id))
+    pipe.hgetall(staged_watermarks_key(staging))
+    with job_stats.phase("cache"):
+        replies = pipe.execute()
+
+    sizes = dict(zip(repo_ids, replies[0:-1:2]))
+    cached = dict(zip(repo_ids, replies[1:-1:2]))
+    watermarks = {int(repo_id): watermark.decode("utf-8") for repo_id, watermark in replies[-1].items()}
+
+    staged = [repo_id for repo_id in repo_ids if sizes[repo_id] > 0]
+    lost = [repo_id for repo_id in repo_ids if sizes[repo_id] == 0 and not cached[repo_id]]
+
+    policy = CachePolicy(redis)
+    ttl = policy.ttl(func)
+    version = str(time.time_ns())
+
+    pipe = redis.pipeline()
+    for repo_id in staged:
+        pipe.rename(staged_key(staging, repo_id), shard_key(func, repo_id))
+        pipe.expire(shard_key(func, repo_id), ttl)
+        _record_shard(pipe, policy, func, repo_id, sizes[repo_id], version, watermarks.get(repo_id), ttl)
+    pipe.delete(staged_watermarks_key(staging))
+    with job_stats.phase("cache"):
+        pipe.execute()
+        policy.enforce(protect=[shard_key(func, repo_id) for repo_id in staged])
+
+    publish_ready(redis, func, staged)
+
+    if len(lost) > 0:
+        raise LookupError(f"{func.__name__}: no partition cached repos {lost}")
+
+    return len(staged)
+
+
+def report_progress(job, phase, **counts):
+    """
+    Records what 'job' is doing in its meta, e.g. report_progress(job, "fetching", rows=20000),
+    for the web tier to show while users wait, see JobManager.get_job_progress.
+    """
+    job.meta["progress"] = {"phase": phase, **counts}
+    job.save_meta()
+
+
+def _stream_payloads(job, func, dbmc, repo_ids, chunksize):
+    """
+    Encodes a result streamed from the database 'chunksize' rows at a time:
+    each chunk is split by repo and appended to its repo's encoded shard
+    right away, so the worker holds one chunk's rows and the encoded shards
+    rather than the whole result.
+
+    Returns (rows, payloads, watermarks), see _encode_shards.
+    """
+    column, _ = WATERMARKS[func.__name__]
+    encoders = {}
+    watermarks = {}
+    empty = pd.DataFrame()
+    rows = 0
+
+    with job_stats.phase("query"):
+        chunks = iter(func(dbmc, repo_ids, chunksize=chunksize))
+
+    while True:
+        # the query runs, and its rows arrive, as the chunks are read.
+        with job_stats.phase("query"):
+            chunk = next(chunks, None)
+        if chunk is None:
+            break
+
+        rows += len(chunk)
+        empty = chunk.iloc[0:0]
+
+        with job_stats.phase("transform"):
+            groups = list(chunk.groupby("repo_id", sort=False))
+
+        for repo_id, repo_rows in groups:
+            if repo_id not in encoders:
+                encoders[repo_id] = ChunkEncoder()
+            with job_stats.phase("serialize"):
+                encoders[repo_id].write(repo_rows)
+
+            newest = repo_rows[column].max()
+            if pd.notna(newest):
+                watermarks[repo_id] = max(newest, watermarks.get(repo_id, newest))
+
+        report_progress(job, "fetching", rows=rows)
+
+    payloads = {}
+    with job_stats.phase("serialize"):
+        for repo_id in repo_ids:
+            encoder = encoders.get(repo_id)
+            payloads[repo_id] = encode_results(empty) if encoder is None else encoder.finish()
+
+    return rows, payloads, {repo_id: str(newest) for repo_id, newest in watermarks.items()}
+
+
+@cancellable
+def refresh_shards(func, dbmc, repo_ids):
+    """
+    Worker job
+
+    Brings the cached shards of 'repo_ids' up to date by querying only the
+    rows at or after their watermark and merging them into the shards.
+    Repos that aren't cached, or have no rows yet, are queried in full.
+
+    Returns the number of rows fetched.
+    """
+    redis = get_current_job().connection
+    column, key_columns = WATERMARKS[func.__name__]
+
+    pipe = redis.pipeline()
+    for repo_id in repo_ids:
+        pipe.get(shard_key(func, repo_id))
+        pipe.hget(shard_meta_key(func, repo_id), "watermark")
+    with job_stats.phase("cache"):
+        replies = pipe.execute()
+
+    cached = {}
+    watermarks = {}
+    for repo_id, payload, watermark in zip(repo_ids, replies[0::2], replies[1::2]):
+        if payload is not None and watermark is not None:
+            with job_stats.phase("serialize"):
+                cached[repo_id] = decode_results(payload)
+            watermarks[repo_id] = watermark.decode("utf-8")
+
+    # one delta query from the oldest watermark, one full query for the rest.
+    # rows that come back twice are de-duplicated by the merge below.
+    start = time.perf_counter()
+    deltas = []
+    since = min(watermarks.values()) if len(watermarks) > 0 else None
+    with tracing.span("query", query=func.__name__, repos=len(repo_ids), refresh=True), job_stats.phase("query"):
+        if since is not None:
+            deltas.append(func(dbmc, list(watermarks), since=since))
+        uncached = [repo_id for repo_id in repo_ids if repo_id not in watermarks]
+        if len(uncached) > 0:
+            deltas.append(func(dbmc, uncached))
+
+    record(redis, QUERY_SECONDS, time.perf_counter() - start, query=func.__name__)
+
+    with job_stats.phase("transform"):
+        df = pd.concat(deltas, ignore_index=True)
+        groups = dict(list(df.groupby("repo_id", sort=False)))
+
+        shards = {}
+        for repo_id in repo_ids:
+            delta = groups.get(repo_id, df.iloc[0:0])
+            if repo_id in cached and key_columns is None:
+                # rows without a key can't be told apart from identical ones, so
+                # the delta replaces every cached row it covers rather than being
+                # de-duplicated against the whole shard.
+                older = ~(pd.to_datetime(cached[repo_id][column]) >= pd.Timestamp(since))
+                shards[repo_id] = pd.concat([cached[repo_id][older], delta], ignore_index=True)
+            elif repo_id in cached:
+                merged = pd.concat([cached[repo_id], delta], ignore_index=True)
+                shards[repo_id] = merged.drop_duplicates(subset=key_columns, keep="last")
+            else:
+                shards[repo_id] = delta
+
+    with tracing.span("encode"), job_stats.phase("serialize"):
+        payloads, watermarks = _encode_shards(func, shards)
+    nbytes = sum(len(payload) for payload in payloads.values())
+    record(redis, RESULT_BYTES, nbytes, query=func.__name__)
+    job_stats.count(rows=len(df), nbytes=nbytes)
+    with tracing.span("cache", bytes=nbytes), job_stats.phase("cache"):
+        _write_payloads(redis, func, payloads, watermarks)
+
+    return len(df)
+
+
+def _encode_shards(func, shards):
+    """
+    Encodes each repo's frame in 'shards'.
+
+    Returns (payloads, watermarks), by repo; repos without rows have no watermark.
+    """
+    column, _ = WATERMARKS[func.__name__]
+
+    payloads = {}
+    watermarks = {}
+    for repo_id, shard in shards.items():
+        payloads[repo_id] = encode_results(shard.reset_index(drop=True))
+        # repos without rows have no watermark; they're refreshed in full.
+        if len(shard) > 0 and shard[column].notna().any():
+            watermarks[repo_id] = str(shard[column].max())
+
+    return payloads, watermarks
+
+
+def _write_payloads(redis, func, payloads, watermarks):
+    """
+    Caches each repo's encoded shard in 'payloads' along with its watermark,
+    if it has one, in one round trip, holds the cache to its memory budget
+    and announces that the shards are ready.
+    """
+    policy = CachePolicy(redis)
+    ttl = policy.ttl(func)
+    version = str(time.time_ns())
+
+    keys = []
+    pipe = redis.pipeline()
+    for repo_id, payload in payloads.items():
+        key = shard_key(func, repo_id)
+        keys.append(key)
+
+        pipe.set(key, payload, ex=ttl)
+        _record_shard(pipe, policy, func, repo_id, len(payload), version, watermarks.get(repo_id), ttl)
+    pipe.execute()
+
+    policy.enforce(protect=keys)
+
+    publish_ready(redis, func, list(payloads))
+
+
+def _stage_payloads(redis, func, staging, payloads, watermarks):
+    """
+    Stages each repo's encoded shard in 'payloads' for merge job 'staging',
+    in one round trip.
+    """
+    ttl = CachePolicy(redis).ttl(func)
+
+    pipe = redis.pipeline()
+    for repo_id, payload in payloads.items():
+        pipe.set(staged_key(staging, repo_id), payload, ex=ttl)
+    if len(watermarks) > 0:
+        pipe.hset(staged_watermarks_key(staging), mapping=watermarks)
+        pipe.expire(staged_watermarks_key(staging), ttl)
+    pipe.execute()
+
+
+def _record_shard(pipe, policy, func, repo_id, nbytes, version, watermark, ttl):
+    """
+    Queues the bookkeeping and metadata of a newly cached shard on 'pipe'.
+    """
+    meta_key = shard_meta_key(func, repo_id)
+
+    policy.record_write(pipe, shard_key(func, repo_id), nbytes)
+
+    # the version changes with every write, so the web tier can tell
+    # whether a dataset it has decoded before is still current.
+    pipe.delete(meta_key)
+    pipe.hset(meta_key, "version", version)
+    if watermark is not None:
+        pipe.hset(meta_key, "watermark", watermark)
+    pipe.expire(meta_key, ttl)
@@ -0,0 +1,186 @@
+"""
+    End-to-end latency tracing.
+
+    A search starts a trace (update_output in app_callbacks.py), which
+    follows the selection through the page poller, JobManager.add_job and
+    the worker job it enqueues, and into every card callback that renders
+    the selection, so that one trace shows where the time of a search went:
+    parsing the selection, waiting in the queue, the worker's query, Redis
+    transfers, decoding DataFrames and building and serializing figures.
+
+    Spans are recorded with span(); nested spans pick up their parent from
+    the context. The trace crosses process boundaries as a context string,
+    "<trace id>-<span id>": the browser carries it in the TRACE_COOKIE
+    cookie that update_output sets, and jobs in job.meta["trace"] (see
+    JobManager._enqueue and ExplorerWorker).
+
+    Spans are exported in the OTLP/JSON format, one ExportTraceServiceRequest
+    per request or job, either appended as a line to a file (which an
+    OpenTelemetry collector's otlpjsonfile receiver, or Jaeger, can read) or
+    posted to a collector's OTLP/HTTP endpoint.
+
+    Configured with environment variables:
+
+        TRACE_EXPORT        file path, or URL like http://collector:4318/v1/traces;
+                            unset (default) turns tracing off.
+        TRACE_SERVICE_NAME  service.name of this process's spans, default "explorer".
+"""
+import os
+import json
+import time
+import logging
+import secrets
+import threading
+import contextlib
+import contextvars
+import urllib.request
+
+TRACE_EXPORT = os.getenv("TRACE_EXPORT", "")
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "explorer")
+
+# cookie that carries the context of the latest search to the browser's later callbacks.
+TRACE_COOKIE = "explorer-trace"
+
+# (trace id, span id, spans of this request or job still to be exported) of the current span.
+_current = contextvars.ContextVar("explorer_trace", default=None)
+
+_file_lock = threading.Lock()
+
+
+def enabled():
+    return TRACE_EXPORT != ""
+
+
+def current():
+    """
+    Context string of the current span, None outside of a trace.
+    """
+    span = _current.get()
+    if span is None:
+        return None
+    return f"{span[0]}-{span[1]}"
+
+
+def from_request():
+    """
+    Context string of the search whose trace the current web request continues,
+    carried by the browser in TRACE_COOKIE; None outside of one.
+    """
+    if not enabled():
+        return None
+
+    # only the web tier has requests.
+    import flask
+
+    if not flask.has_request_context():
+        return None
+    return flask.request.cookies.get(TRACE_COOKIE)
+
+
+@contextlib.contextmanager
+def span(name, parent=None, new_trace=False, start=None, **attributes):
+    """
+    Records a span named 'name' around the block, as a child of the current
+    span, of 'parent' (a context string from another process), or as the
+    root of a new trace. Outside of any trace, and with tracing off, does nothing.
+
+    'start' backdates the span, in seconds since the epoch, e.g. to when a job
+    was enqueued. Yields a dict of attributes that the block can add to.
+    """
+    outer = _current.get()
+    if not enabled() or (outer is None and parent is None and not new_trace):
+        yield {}
+        return
+
+    if outer is not None and parent is None:
+        trace_id, parent_id, spans = outer
+    else:
+        trace_id, _, parent_id = (parent or f"{secrets.token_hex(16)}-").partition("-")
+        spans = []
+
+    span_id = secrets.token_hex(8)
+    start_ns = int(start * 1e9) if start is not None else time.time_ns()
+    token = _current.set((trace_id, span_id, spans))
+    error = None
+    try:
+        yield attributes
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _current.reset(token)
+        spans.append(_otlp_span(trace_id, span_id, parent_id, name, start_ns, time.time_ns(), attributes, error))
+        # the outermost span of this request or job exports them all.
+        if outer is None or parent is not None:
+            _export(spans)
+
+
+def record(name, start, end, **attributes):
+    """
+    Records a span that has already ended under the current span, e.g. the
+    time a job waited in its queue, from 'start' to 'end' seconds since the epoch.
+    """
+    outer = _current.get()
+    if not enabled() or outer is None:
+        return
+
+    trace_id, parent_id, spans = outer
+    span_id = secrets.token_hex(8)
+    spans.append(_otlp_span(trace_id, span_id, parent_id, name, int(start * 1e9), int(end * 1e9), attributes, None))
+
+
+def _otlp_span(trace_id, span_id, parent_id, name, start_ns, end_ns, attributes, error):
+    otlp = {
+        "traceId": trace_id,
+        "spanId": span_id,
+        "name": name,
+        "kind": 1,
+        "startTimeUnixNano": str(start_ns),
+        "endTimeUnixNano": str(end_ns),
+        "attributes": [_attribute(key, value) for key, value in attributes.items()],
+    }
+    if parent_id:
+        otlp["parentSpanId"] = parent_id
+    if error is not None:
+        otlp["status"] = {"code": 2, "message": f"{type(error).__name__}: {error}"}
+    return otlp
+
+
+def _attribute(key, value):
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def _export(spans):
+    request = {
+        "resourceSpans": [
+            {
+                "resource": {
+                    "attributes": [
+                        _attribute("service.name", TRACE_SERVICE_NAME),
+                        _attribute("process.pid", os.getpid()),
+                    ]
+                },
+                "scopeSpans": [{"scope": {"name": "explorer"}, "spans": spans}],
+            }
+        ]
+    }
+    body = json.dumps(request, separators=(",", ":"))
+
+    # tracing is never worth failing a request or a job over.
+    try:
+        if TRACE_EXPORT.startswith(("http://", "https://")):
+            post = urllib.request.Request(
+                TRACE_EXPORT, data=body.encode("utf-8"), headers={"Content-Type": "application/json"}
+            )
+            urllib.request.urlopen(post, timeout=2).close()
+        else:
+            with _file_lock, open(TRACE_EXPORT, "a") as f:
+                f.write(body + "\n")
+    except Exception:
+        logging.exception("Couldn't export trace spans")
@@ -0,0 +1,96 @@
+"""
+    Cache warmer.
+
+    The web tier counts every search for a selection of repos in Redis
+    (see JobManager.record_selection). This process periodically takes the
+    most popular recent selections and, for every query the visualizations
+    use, enqueues fills of repos that aren't cached and refreshes of repos
+    whose shards are about to expire, so that the next search for a popular
+    org finds its data already cached. Each pass also cancels the jobs that
+    no browser tab has claimed for a while (JobManager.cancel_abandoned_jobs),
+    and stops counting expired results against the cache's memory budget
+    (JobManager.purge_expired).
+
+    Warming jobs go on the "prefetch" and "refresh" queues, which workers
+    only take from when no user is waiting on the "interactive" queue.
+
+    Run with:
+
+        python -m job_manager.warmer
+
+    Configured with environment variables:
+
+        WARM_TOP_K        number of selections kept warm, default 25.
+        WARM_INTERVAL     seconds between warming passes, default 60.
+        WARM_MARGIN       seconds before expiry at which a shard is refreshed, default 120.
+        WARM_WINDOW       only selections searched for in this many seconds count, default 86400.
+"""
+from db_manager.AugurInterface import AugurInterface
+from job_manager.job_manager import JobManager, QUERIES
+
+import os
+import sys
+import time
+import logging
+
+
+def warm(jm, dbmc, top_k, window, margin):
+    """
+    One warming pass over the 'top_k' most popular selections.
+
+    Returns the number of jobs requested; ones that were already
+    queued are shared rather than enqueued twice.
+    """
+    selections = jm.popular_selections(top_k, window)
+
+    # each selection is warmed with the jobs a search for it would add, so
+    # that searches and later passes find and share them (and promote
+    # them to "interactive") rather than enqueueing the same repos again.
+    enqueued = 0
+    for selection in selections:
+        for func in QUERIES:
+            missing, expiring = jm.expiring_repos(func, selection, margin)
+
+            if len(missing) > 0 and jm.add_job(func, dbmc, selection, priority="prefetch") is not None:
+                enqueued += 1
+            if len(expiring) > 0 and jm.add_job(func, dbmc, expiring, refresh=True, priority="refresh") is not None:
+                enqueued += 1
+
+    logging.info(f"WARMER: {len(selections)} selections, {enqueued} jobs requested")
+    return enqueued
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+
+    top_k = int(os.getenv("WARM_TOP_K", "25"))
+    interval = int(os.getenv("WARM_INTERVAL", "60"))
+    margin = int(os.getenv("WARM_MARGIN", "120"))
+    window = int(os.getenv("WARM_WINDOW", "86400"))
+
+    augur_db = AugurInterface()
+    if augur_db.get_engine() is None:
+        logging.critical("Could not get engine; check config or try later")
+        sys.exit(1)
+    dbmc = augur_db.package_config()
+
+    jm = JobManager()
+    while True:
+        try:
+            warm(jm, dbmc, top_k, window, margin)
+            # jobs whose tabs were closed while they waited.
+            cancelled = jm.cancel_abandoned_jobs()
+            if cancelled > 0:
+                logging.info(f"WARMER: cancelled {cancelled} abandoned jobs")
+            # expired results' bytes, which writes don't check for.
+            expired = jm.purge_expired()
+            if expired > 0:
+                logging.info(f"WARMER: {expired} cached results expired")
+        except Exception:
+            # a Redis hiccup shouldn't take the warmer down for good.
+            logging.exception("WARMER: pass failed")
+        time.sleep(interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+    RQ worker class for our query jobs.
+
+    RQ's default worker forks a fresh work horse for every job, so each job
+    pays for building a SQLAlchemy engine and opening a new database
+    connection, on top of the fork itself; for small selections that's more
+    than the query takes. ExplorerWorker instead runs jobs in its own
+    process, after importing the query modules (and with them pandas,
+    SQLAlchemy and pyarrow) once at start-up, and keeps one engine per
+    database config across jobs (see db_manager/AugurInterface.py).
+
+    Each job runs alongside a CancelWatchdog (job_manager/cancellation.py),
+    which cancels the job's database query if the job is cancelled while it
+    runs; RQ's own stop-job command would kill the worker itself.
+
+    Jobs enqueued during a traced search record their queue wait and run
+    as spans of its trace (see job_manager/tracing.py), and every job records
+    where its time went, and how much memory it took, in job.meta["stats"]
+    (see job_manager/job_stats.py).
+
+    Job timeouts still apply. Since jobs no longer run in a throwaway
+    process, supervisord starts the workers with --max-jobs so that each one
+    is replaced after a while.
+
+    Use with:
+
+        rq worker -c worker_settings -w job_manager.worker.ExplorerWorker
+"""
+from datetime import timezone
+from rq.worker import SimpleWorker
+from job_manager.cancellation import CancelWatchdog
+from job_manager.job_stats import JobStats
+from job_manager import tracing
+import time
+
+# preloaded here, so that no job pays for these imports.
+import job_manager.shard_cache  # noqa: F401
+import job_manager.aggregates  # noqa: F401
+from job_manager.job_manager import QUERIES  # noqa: F401
+
+
+class ExplorerWorker(SimpleWorker):
+    def perform_job(self, job, queue):
+        watchdog = CancelWatchdog(job)
+        watchdog.start()
+        stats = JobStats(job)
+        stats.start()
+        try:
+            # continues the trace of the search that enqueued the job, if any;
+            # the job's span covers its wait in the queue too.
+            now = time.time()
+            enqueued = job.enqueued_at.replace(tzinfo=timezone.utc).timestamp() if job.enqueued_at else now
+            with tracing.span(
+                "job", parent=job.meta.get("trace"), start=enqueued, job=job.id, task=job.func_name
+            ) as span:
+                tracing.record("queue_wait", enqueued, now, queue=queue.name)
+                span["ok"] = super().perform_job(job, queue)
+                return span["ok"]
+        finally:
+            stats.save(stats.finish())
+            watchdog.stop()
@@ -11,8 +11,13 @@ from .visualizations.chaoss.contributors_over_time import gc_contributors_over_t
 
 warnings.filterwarnings("ignore")
 
-# register the page
-dash.register_page(__name__, order=3)
+# register the page, with the datasets its cards need (see the page poller in app_callbacks.py)
+dash.register_page(
+    __name__,
+    order=3,
+    queries=["contributors_query"],
+    aggregates=["first_contributions_per_day", "contributions_per_quarter"],
+)
 
 
 layout = dbc.Container(
@@ -10,8 +10,19 @@ from .visualizations.overview.active_drifting_contributors import gc_active_drif
 from .visualizations.overview.issue_staleness import gc_issue_staleness
 from .visualizations.overview.pr_staleness import gc_pr_staleness
 
-# register the page
-dash.register_page(__name__, order=2)
+# register the page, with the datasets its cards need (see the page poller in app_callbacks.py)
+dash.register_page(
+    __name__,
+    order=2,
+    aggregates=[
+        "commits_per_day",
+        "issues_per_day",
+        "new_contributors_per_day",
+        "issue_intervals_per_day",
+        "pr_intervals_per_day",
+        "contribution_runs_per_day",
+    ],
+)
 
 layout = dbc.Container(
     [
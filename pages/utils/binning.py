@@ -0,0 +1,97 @@
+"""
+    Server-side binning for the cards that plot counts over time.
+
+    Rather than handing plotly every timestamp (or per-day count) to bin in
+    the browser, these cards count per bin with NumPy and plot bar traces of
+    the counts, so a figure carries one point per bin whatever the size of
+    the selection. Bins are the ones plotly's histograms used, named by the
+    same xbins sizes the cards' interval controls use:
+
+        86400000    day
+        604800000   week, starting on Sunday as plotly's weekly bins do
+        "M1"        month
+        "M3"        quarter
+        "M12"       year
+
+    The bars are positioned by period (xperiod), so they span their bin like
+    histogram bars and the axes' ticklabelmode="period" keeps lining up.
+"""
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+DAY = 86400000
+WEEK = 604800000
+
+# numpy's epoch, 1970-01-01, is a Thursday; weeks start on the Sunday after.
+_FIRST_SUNDAY = 3
+
+
+def bin_starts(dates, size):
+    """
+    Start of the bin of 'size' that each of 'dates' falls in, as naive UTC datetime64[ns].
+    """
+    dates = pd.DatetimeIndex(dates)
+    if dates.tz is not None:
+        dates = dates.tz_convert("UTC").tz_localize(None)
+    values = dates.values
+
+    if size == DAY:
+        return values.astype("datetime64[D]").astype("datetime64[ns]")
+    if size == WEEK:
+        days = values.astype("datetime64[D]").astype("int64")
+        return (days - (days - _FIRST_SUNDAY) % 7).astype("datetime64[D]").astype("datetime64[ns]")
+    if size == "M1":
+        return values.astype("datetime64[M]").astype("datetime64[ns]")
+    if size == "M3":
+        months = values.astype("datetime64[M]").astype("int64")
+        return (months - months % 3).astype("datetime64[M]").astype("datetime64[ns]")
+    if size == "M12":
+        return values.astype("datetime64[Y]").astype("datetime64[ns]")
+
+    raise ValueError(f"Unknown bin size {size!r}")
+
+
+def bin_counts(dates, size, weights=None):
+    """
+    Number of 'dates', or the sum of their 'weights', per bin of 'size'.
+    Dates that are missing aren't counted.
+
+    Returns (bins, counts): the starts of the bins that have any dates, in order, and their counts.
+    """
+    dates = pd.DatetimeIndex(dates)
+    present = ~dates.isna()
+    starts = bin_starts(dates[present], size)
+
+    bins, index = np.unique(starts, return_inverse=True)
+    if weights is None:
+        return bins, np.bincount(index, minlength=len(bins))
+
+    weights = np.asarray(weights, dtype="float64")[present]
+    counts = np.bincount(index, weights=weights, minlength=len(bins))
+    # counts of integers stay integers in the figure.
+    if np.all(np.mod(counts, 1) == 0):
+        counts = counts.astype("int64")
+    return bins, counts
+
+
+def binned_bar(dates, size, weights=None, **kwargs):
+    """
+    Bar trace of bin_counts of 'dates', in place of a histogram of them with
+    xbins_size='size' (and histfunc="sum" of 'weights'). 'kwargs' go to go.Bar.
+    """
+    bins, counts = bin_counts(dates, size, weights)
+    return go.Bar(x=bins, y=counts, xperiod=size, xperiodalignment="middle", **kwargs)
+
+
+def binned_bars(df, x, size, color, y=None, **kwargs):
+    """
+    One binned_bar per value of column 'color' of 'df', of its column 'x'
+    (summing column 'y', if given), named after the value; in place of
+    px.histogram(df, x=x, y=y, histfunc="sum", color=color) binned by 'size'.
+    """
+    traces = []
+    for name, group in df.groupby(color, sort=False):
+        weights = None if y is None else group[y]
+        traces.append(binned_bar(group[x], size, weights, name=str(name), legendgroup=str(name), **kwargs))
+    return traces
@@ -0,0 +1,135 @@
+"""
+    Active/drifting/away status of contributors over time.
+
+    At a date, a contributor who has contributed by then is
+        active      if their latest contribution is at most 'drift_interval' months old,
+        drifting    if it's older than that but less than 'away_interval' months old,
+        away        otherwise.
+
+    get_active_drifting_away_up_to counts them for one date by scanning every
+    contribution, which is what the active/drifting contributors card used
+    to call once per date. active_drifting_away counts them for all dates at
+    once: each contribution t is a contributor's latest from t until their
+    next one, so it counts towards the status of a contiguous run of dates,
+    found with searchsorted on the sorted dates and their thresholds; the
+    runs are summed with a difference array. That's O(N log N + N log D + D)
+    for N contributions and D dates, instead of O(N * D).
+
+    The active/drifting card counts from the contribution_runs_per_day
+    aggregate the workers build instead of the raw contributions, with
+    active_drifting_away_runs: the same runs, per day and weighted by the
+    number of contributions that share them.
+"""
+import numpy as np
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+
+# NaT as an int64, the way NumPy and pandas store it.
+NAT = np.iinfo("int64").min
+
+
+def active_drifting_away(df, dates, drift_interval, away_interval):
+    """
+    Counts of active, drifting and away contributors of 'df' (with columns
+    cntrb_id and created_at) at each of 'dates', which must be sorted.
+
+    Returns a frame with columns Date, Active, Drifting, Away; the same
+    counts as get_active_drifting_away_up_to returns for each date.
+    """
+    df = df[df["created_at"].notna()]
+
+    # each contributor's contributions, in order, and the one after each.
+    contributors, _ = pd.factorize(df["cntrb_id"])
+    created = pd.DatetimeIndex(df["created_at"]).asi8
+    order = np.lexsort((created, contributors))
+    contributors = contributors[order]
+    created = created[order]
+    last = np.append(contributors[1:] != contributors[:-1], True)
+    following = np.where(last, NAT, np.roll(created, -1))
+
+    return _count_statuses(created, following, None, dates, drift_interval, away_interval)
+
+
+def active_drifting_away_runs(runs, dates, drift_interval, away_interval):
+    """
+    active_drifting_away from a contribution_runs_per_day aggregate (see
+    job_manager/aggregates.py): the number of contributions, in column
+    count, made on each day created_at that were their contributor's latest
+    until the day following, NaT if they still are.
+    """
+    created = pd.DatetimeIndex(runs["created_at"]).asi8
+    following = pd.DatetimeIndex(runs["following"]).asi8
+    return _count_statuses(created, following, runs["count"].to_numpy(), dates, drift_interval, away_interval)
+
+
+def _count_statuses(created, following, weights, dates, drift_interval, away_interval):
+    # contributions made at 'created' (int64 nanoseconds), each its contributor's
+    # latest until 'following' (NAT if never), 'weights' of them each (or one).
+    dates = pd.DatetimeIndex(dates)
+
+    # a date's thresholds, as the legacy function computes them.
+    drift = pd.DatetimeIndex([date - relativedelta(months=+drift_interval) for date in dates]).asi8
+    away = pd.DatetimeIndex([date - relativedelta(months=+away_interval) for date in dates]).asi8
+
+    # contribution t is its contributor's latest on the dates from 'starts' up to 'ends'.
+    grid = dates.asi8
+    starts = np.searchsorted(grid, created, side="left")
+    ends = np.where(following == NAT, len(grid), np.searchsorted(grid, following, side="left"))
+
+    # active while t >= drift(date); drifting while drift(date) > t > away(date).
+    drifts = np.searchsorted(drift, created, side="right")
+    aways = np.searchsorted(away, created, side="left")
+
+    total = count_runs(starts, ends, len(grid), weights)
+    active = count_runs(starts, np.minimum(ends, drifts), len(grid), weights)
+    drifting = count_runs(np.maximum(starts, drifts), np.minimum(ends, aways), len(grid), weights)
+
+    return pd.DataFrame({"Date": dates, "Active": active, "Drifting": drifting, "Away": total - (active + drifting)})
+
+
+def count_runs(starts, ends, n, weights=None):
+    """
+    Number of the runs of indices [starts[i], ends[i]) that cover each index
+    in range(n), or the sum of the 'weights' of those runs.
+    """
+    runs = starts < ends
+    if weights is None:
+        changes = np.bincount(starts[runs], minlength=n + 1) - np.bincount(ends[runs], minlength=n + 1)
+        return np.cumsum(changes[:n])
+
+    weights = np.asarray(weights, dtype="int64")[runs]
+    changes = np.zeros(n + 1, dtype="int64")
+    np.add.at(changes, starts[runs], weights)
+    np.subtract.at(changes, ends[runs], weights)
+    return np.cumsum(changes[:n])
+
+
+def get_active_drifting_away_up_to(df, date, drift_interval, away_interval):
+    """
+    Reference implementation of active_drifting_away for one date; expects
+    'df' sorted by created_at. Returns [date, active, drifting, away].
+    """
+
+    # drop rows that are more recent than the date limit
+    df_lim = df[df["created_at"] <= date]
+
+    # keep more recent contribution per ID
+    df_lim = df_lim.drop_duplicates(subset="cntrb_id", keep="last")
+
+    # time difference, 6 months before the threshold date
+    drift_mos = date - relativedelta(months=+drift_interval)
+
+    # time difference, 6 months before the threshold date
+    away_mos = date - relativedelta(months=+away_interval)
+
+    # contributions in the last 6 months
+    numTotal = df_lim.shape[0]
+
+    numActive = df_lim[df_lim["created_at"] >= drift_mos].shape[0]
+
+    drifting = df_lim[df_lim["created_at"] > away_mos]
+    numDrifting = drifting[drifting["created_at"] < drift_mos].shape[0]
+
+    numAway = numTotal - (numActive + numDrifting)
+
+    return [date, numActive, numDrifting, numAway]
@@ -0,0 +1,72 @@
+"""
+    Per-process cache of decoded, typed datasets, shared by every card
+    rendered by the process; see handle_job_state in pages/utils/job_utils.py.
+
+    The cached DataFrames are read-only: their values can't be changed in
+    place, and every get hands out a shallow copy of its own, so one card
+    changing its frame can never change what another card, or another
+    user, renders from the same dataset.
+"""
+from collections import OrderedDict
+import numpy as np
+import threading
+
+
+def read_only(df):
+    """
+    Marks the arrays holding the values of 'df' read-only, so that changing
+    them in place, e.g. with df.loc[...] = or fillna(inplace=True), raises
+    ValueError instead. Returns 'df'.
+    """
+    for values in df._mgr.arrays:
+        # datetimes with a time zone, categoricals and strings wrap an ndarray.
+        values = getattr(values, "_ndarray", values)
+        if isinstance(values, np.ndarray):
+            values.flags.writeable = False
+    return df
+
+
+class DatasetCache:
+    """
+    Byte-budgeted LRU of decoded, typed datasets. Entries are keyed by
+    JobManager.get_dataset_version, so a dataset whose shards have been
+    rewritten is decoded afresh.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._frames = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, version):
+        """
+        A shallow copy of the frame cached under 'version', or None. Its
+        columns can be added, replaced or dropped, but its values are read-only.
+        """
+        with self._lock:
+            entry = self._frames.get(version)
+            if entry is None:
+                return None
+            self._frames.move_to_end(version)
+            return entry[0].copy(deep=False)
+
+    def put(self, version, df):
+        """
+        Caches 'df' under 'version', if it fits in the budget. The values
+        of 'df' are made read-only either way, so that cards behave the same
+        whether or not their dataset was cached.
+        """
+        read_only(df)
+        nbytes = int(df.memory_usage(deep=True).sum())
+        if nbytes > self.max_bytes:
+            return
+
+        with self._lock:
+            if version in self._frames:
+                return
+            self._frames[version] = (df.copy(deep=False), nbytes)
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._frames.popitem(last=False)
+                self._bytes -= evicted
@@ -1,8 +1,25 @@
 from tkinter import W
 import dash
 from app import augur_db
+from job_manager.result_format import decode_results, decode_shards
+from job_manager.job_manager import PENDING_STATES
+from job_manager import tracing
+from pages.utils.dataset_cache import DatasetCache
 import plotly.graph_objects as go
+import plotly.io as pio
+import pandas as pd
+import functools
 import logging
+import time
+import json
+import os
+
+# per query: the columns the cards read as timestamps, parsed once per decoded dataset.
+DATETIME_COLUMNS = {
+    "contributors_query": ["created_at"],
+    "issues_query": ["created", "closed"],
+    "prs_query": ["created", "merged", "closed"],
+}
 
 columns = ["1", "2", "3"]
 
@@ -37,15 +54,96 @@ timeout_graph.update_layout(
 )
 
 
-def handle_job_state(jm, func, repolist):
+# how the phases that workers report (see shard_cache.report_progress) read to users.
+PROGRESS_PHASES = {
+    "querying": "Querying the database",
+    "fetching": "Fetching rows",
+    "encoding": "Packing results",
+    "caching": "Caching results",
+    "merging": "Merging results",
+    "aggregating": "Aggregating results",
+}
+
+
+def describe_progress(progress):
+    """
+    One line on a job's progress, e.g. "Fetching rows: 3 of 8 parts done, 1,200,000 rows".
+    """
+    details = []
+    if "partitions" in progress:
+        details.append(f"{progress['partitions_done']} of {progress['partitions']} parts done")
+    if progress.get("rows"):
+        details.append(f"{progress['rows']:,} rows")
+
+    phase = PROGRESS_PHASES.get(progress.get("phase"), "Working")
+    return f"{phase}: {', '.join(details)}" if len(details) > 0 else phase
+
+
+def progress_graph(progress):
+    """
+    temp_graph, captioned with the progress of the job a card waits on, if it has reported any.
+    """
+    if progress is None:
+        return temp_graph
+
+    graph = go.Figure(temp_graph)
+    graph.update_layout(title_text=f"Downloading and Processing Data<br><sup>{describe_progress(progress)}</sup>")
+    return graph
+
+
+def label_partial(fig, df):
+    """
+    Marks the figure of a card that rendered partial data (see handle_job_state) as such.
+    """
+    if "partial" in df.attrs:
+        fig.update_layout(title_text=f"Partial data: {df.attrs['partial']}", title_font_color="gray")
+    return fig
+
+
+# bytes of decoded datasets each server process keeps, default 256MB.
+dataset_cache = DatasetCache(int(os.getenv("DATASET_CACHE_MAX_BYTES", str(256 * 1024 * 1024))))
+
+
+def _typed(func, df):
+    for column in DATETIME_COLUMNS.get(func.__name__, []):
+        if column in df.columns:
+            df[column] = pd.to_datetime(df[column], utc=True)
+    return df
+
+
+def handle_job_state(jm, func, repolist, partial=False):
     """
     All visualizations use this interface
     to handle whether or not the job queue / result cache
     has the data that they need.
+
+    Cards don't poll; they're re-run when the page poller in app_callbacks.py
+    sees the status (or the progress) of their dataset change. While the job
+    runs, the graph returned shows its progress.
+
+    With partial=True, a card whose dataset is still being filled in gets
+    the repos that are already available instead, marked with
+    df.attrs["partial"]; see label_partial.
+
+    The values of the returned DataFrame are shared with other cards and
+    read-only (see pages/utils/dataset_cache.py); copy it to change them.
     """
 
+    # nothing selected, nothing to query.
+    if len(repolist) == 0:
+        return (False, None, nodata_graph)
+
+    # several cards share a dataset; decode it once per process and version.
+    version = jm.get_dataset_version(func, repolist)
+    if version is not None:
+        df = dataset_cache.get(version)
+        if df is not None:
+            return (True, df, None)
+
     # job status, job results.
-    status, results = jm.get_results(func, repolist)
+    with tracing.span("get_results", query=func.__name__) as span:
+        status, results = jm.get_results(func, repolist)
+        span["bytes"] = sum(len(payload) for payload in results or [])
 
     # results aren't ready
     if results is None:
@@ -56,22 +154,126 @@ def handle_job_state(jm, func, repolist):
             # create new job
             jm.add_job(func, augur_db.package_config(), repolist)
 
-            # Job not ready, no results, display temp graph, set timer to run again.
-            return (False, None, temp_graph, 0)
+            # Job not ready, no results, display temp graph.
+            return (False, None, temp_graph)
+
+        # job exists, in one of running states, or waiting to be retried
+        elif status in PENDING_STATES:
 
-        # job exists, in one of running states
-        elif status in ["queued", "started", "finished"]:
+            # a user is waiting on a queued job; make sure it's on the interactive queue.
+            if status == "queued":
+                jm.add_job(func, augur_db.package_config(), repolist)
 
-            # Job not ready, no results, display temp graph, set timer to run again.
-            return (False, None, temp_graph, 0)
+            progress = jm.get_job_progress(func, repolist)
+
+            # render what's there already, if the card wants it.
+            if partial:
+                repos, payloads = jm.get_partial_results(func, repolist)
+                if len(repos) > 0:
+                    df = _typed(func, decode_shards(payloads))
+                    df.attrs["partial"] = f"{len(repos)} of {len(set(repolist))} repos"
+                    if progress is not None:
+                        df.attrs["partial"] += f" ({describe_progress(progress)})"
+                    return (True, df, None)
+
+            # Job not ready, no results, display temp graph with the job's progress.
+            return (False, None, progress_graph(progress))
 
         # job not in healthy state
         else:
 
-            # Job not ready, no results, display timeout graph, don't reset timer.
-            return (False, None, timeout_graph, dash.no_update)
+            # Job not ready, no results, display timeout graph.
+            return (False, None, timeout_graph)
 
     else:
 
-        # Job ready, results included, no graph, don't reset timer.
-        return (True, results, None, dash.no_update)
+        # Job ready, selection assembled from its per-repo shards, no graph.
+        with tracing.span("decode", query=func.__name__) as span:
+            df = _typed(func, decode_shards(results))
+            span["rows"] = len(df)
+        if version is not None:
+            dataset_cache.put(version, df)
+        return (True, df, None)
+
+
+def handle_aggregate_state(jm, name, repolist):
+    """
+    Like handle_job_state, for cards that plot an aggregate built by
+    the workers (see job_manager/aggregates.py) rather than raw rows.
+    """
+
+    # nothing selected, nothing to query.
+    if len(repolist) == 0:
+        return (False, None, nodata_graph)
+
+    with tracing.span("get_aggregate", aggregate=name):
+        status, result = jm.get_aggregate(name, repolist)
+
+    if result is None:
+
+        # no job yet, or a user is waiting on a queued one; (re-)enqueue it interactively.
+        if status is None or status == "queued":
+            jm.add_aggregate_job(name, augur_db.package_config(), repolist)
+
+        if status is None or status in PENDING_STATES:
+            return (False, None, temp_graph)
+
+        return (False, None, timeout_graph)
+
+    with tracing.span("decode", aggregate=name):
+        return (True, decode_results(result), None)
+
+
+def cached_figure(jm, card, dataset):
+    """
+    Caches the output of a card callback in Redis, shared by every server
+    process and every user.
+
+    For card callbacks whose arguments are (repolist, job_status, *control values)
+    and that render from 'dataset', a query function or the name of an aggregate.
+    Outputs are keyed by 'card', the set of repos, the control values and
+    the version of the dataset, so a refreshed dataset renders afresh.
+    Placeholder graphs and outputs with dash.no_update aren't cached.
+
+    Also observes the latency of every call, cached or not, for /metrics.
+    """
+
+    def decorator(callback):
+        @functools.wraps(callback)
+        def wrapper(repolist, job_status, *controls):
+            start = time.perf_counter()
+            # part of the trace of the search that selected the repos, if any.
+            try:
+                with tracing.span("card", parent=tracing.from_request(), card=card):
+                    return render(repolist, job_status, *controls)
+            finally:
+                jm.record_callback(card, time.perf_counter() - start)
+
+        def render(repolist, job_status, *controls):
+            if len(repolist) == 0:
+                return callback(repolist, job_status, *controls)
+
+            with tracing.span("get_figure") as span:
+                key, payload = jm.get_figure(card, dataset, repolist, controls)
+                span["hit"] = payload is not None
+            if payload is not None:
+                cached = json.loads(payload)
+                return tuple(cached["outputs"]) if cached["multi"] else cached["outputs"][0]
+
+            with tracing.span("render"):
+                output = callback(repolist, job_status, *controls)
+
+            multi = isinstance(output, tuple)
+            outputs = list(output) if multi else [output]
+            placeholder = any(o is dash.no_update or o is temp_graph or o is timeout_graph for o in outputs)
+            if key is not None and not placeholder:
+                with tracing.span("serialize") as span:
+                    payload = pio.json.to_json_plotly({"multi": multi, "outputs": outputs})
+                    span["bytes"] = len(payload)
+                jm.put_figure(key, dataset, payload.encode("utf-8"))
+
+            return output
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,142 @@
+"""
+    New/staling/stale counts of open issues and pull requests over time,
+    shared by the issue and PR staleness cards.
+
+    At a date, an item that's open (created by then and not closed yet) is
+        new         if it was created at most 'staling_days' days before,
+        staling     if before that, but less than 'stale_days' days before,
+        stale       otherwise.
+
+    OpenIntervals turns the items' (created, closed) intervals into event
+    arrays on the cards' dates once: the run of dates each item is open on.
+    counts() then splits each run where the item turns staling and stale,
+    found with searchsorted, and sums all the runs in one sweep over a
+    difference array. The thresholds only move those split points, so
+    changing them recounts from the event arrays without touching the rows;
+    open_intervals keeps the arrays of recently rendered frames for that.
+
+    get_new_staling_stale_up_to is the per-date reference implementation
+    that the cards used to call for every date.
+"""
+import threading
+import weakref
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+from pages.utils.contributor_status import count_runs
+
+DAY_NS = 86400 * 10**9
+
+# OpenIntervals of the frames and intervals this process rendered last.
+_intervals = OrderedDict()
+_intervals_lock = threading.Lock()
+MAX_INTERVALS = 16
+
+
+class OpenIntervals:
+    def __init__(self, created, closed, dates, weights=None):
+        """
+        Event arrays of the items opened at 'created' and closed at 'closed'
+        (NaT while open), on the sorted 'dates'; 'weights' of them each, or one.
+        """
+        self.dates = pd.DatetimeIndex(dates)
+        created = pd.DatetimeIndex(created)
+        closed = pd.DatetimeIndex(closed)
+        self._grid = self.dates.asi8
+
+        # an item is open from the first date at or after it was created,
+        # up to the first date at or after it was closed.
+        opens = np.searchsorted(self._grid, created.asi8, side="left")
+        closes = np.where(closed.isna(), len(self._grid), np.searchsorted(self._grid, closed.asi8, side="left"))
+
+        # items that are never open on any of the dates don't count.
+        counted = created.notna() & (opens < closes)
+        self._created = created.asi8[counted]
+        self._opens = opens[counted]
+        self._closes = closes[counted]
+        self._weights = None if weights is None else np.asarray(weights)[counted]
+
+    def counts(self, staling_days, stale_days):
+        """
+        Frame with columns Date, New, Staling, Stale; the same counts
+        as get_new_staling_stale_up_to returns for each date.
+        """
+        n = len(self._grid)
+
+        # new while created >= date - staling_days; staling while that's
+        # no longer so but created > date - stale_days.
+        news = np.searchsorted(self._grid - staling_days * DAY_NS, self._created, side="right")
+        stalings = np.searchsorted(self._grid - stale_days * DAY_NS, self._created, side="left")
+
+        total = count_runs(self._opens, self._closes, n, self._weights)
+        new = count_runs(self._opens, np.minimum(self._closes, news), n, self._weights)
+        staling = count_runs(np.maximum(self._opens, news), np.minimum(self._closes, stalings), n, self._weights)
+
+        return pd.DataFrame({"Date": self.dates, "New": new, "Staling": staling, "Stale": total - (new + staling)})
+
+
+def open_intervals(df, interval):
+    """
+    OpenIntervals of the items of 'df' (with columns created and closed) on
+    the dates from its earliest to its latest created item, every 'interval'.
+    If 'df' has a column count, e.g. an issue_intervals_per_day aggregate
+    (see job_manager/aggregates.py), each row counts as that many items.
+
+    Reuses those of the last frames seen, so that counting the same frame
+    with other thresholds only recounts. Entries hold a weak reference to
+    their frame, so a new frame that gets the id of a collected one is
+    counted afresh.
+    """
+    key = (id(df), interval)
+    with _intervals_lock:
+        entry = _intervals.get(key)
+        if entry is not None and entry[0]() is df:
+            _intervals.move_to_end(key)
+            return entry[1]
+
+    # generating buckets beginning to the end of time by the specified interval
+    dates = pd.date_range(start=df["created"].min(), end=df["created"].max(), freq=interval, inclusive="both")
+    weights = df["count"] if "count" in df.columns else None
+    intervals = OpenIntervals(df["created"], df["closed"], dates, weights)
+
+    with _intervals_lock:
+        _intervals[key] = (weakref.ref(df), intervals)
+        while len(_intervals) > MAX_INTERVALS:
+            _intervals.popitem(last=False)
+    return intervals
+
+
+def get_new_staling_stale_up_to(df, date, staling_interval, stale_interval):
+    """
+    Reference implementation of OpenIntervals.counts for one date.
+    Returns [date, new, staling, stale].
+    """
+
+    # drop rows that are more recent than the date limit
+    df_lim_created = df[df["created"] <= date]
+
+    # drop rows that have been closed before date
+    df_lim = df_lim_created[df_lim_created["closed"] > date]
+
+    # include rows that have a null closed value
+    df_lim = pd.concat([df_lim, df_lim_created[df_lim_created.closed.isnull()]])
+
+    # time difference for the amount of days before the threshold date
+    staling_days = date - relativedelta(days=+staling_interval)
+
+    # time difference for the amount of days before the threshold date
+    stale_days = date - relativedelta(days=+stale_interval)
+
+    # items still open at the specified date
+    numTotal = df_lim.shape[0]
+
+    # num of currently open items that have been create in the last staling_value amount of days
+    numNew = df_lim[df_lim["created"] >= staling_days].shape[0]
+
+    staling = df_lim[df_lim["created"] > stale_days]
+    numStaling = staling[staling["created"] < staling_days].shape[0]
+
+    numStale = numTotal - (numNew + numStaling)
+
+    return [date, numNew, numStaling, numStale]
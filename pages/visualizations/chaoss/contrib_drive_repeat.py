@@ -10,21 +10,14 @@ import logging
 import plotly.express as px
 
 from app import jm
-from pages.utils.job_utils import handle_job_state, nodata_graph
-from queries.contributors_query import contributors_query as ctq
+from pages.utils.binning import binned_bars
+from pages.utils.job_utils import handle_aggregate_state, nodata_graph, cached_figure
 import time
 
 gc_contrib_drive_repeat = dbc.Card(
     [
         dbc.CardBody(
             [
-                dcc.Interval(
-                    id="contrib-drive-repeat-timer",
-                    n_intervals=1,
-                    max_intervals=1,
-                    disabled=False,
-                    interval=800,
-                ),
                 html.H4(id="chaoss-graph-title-1", className="card-title", style={"text-align": "center"}),
                 dbc.Popover(
                     [
@@ -136,51 +129,61 @@ def graph_title(view):
 # call back for drive by vs commits over time graph
 @callback(
     Output("cont-drive-repeat", "figure"),
-    Output("contrib-drive-repeat-timer", "n_intervals"),
     [
         Input("repo-choices", "data"),
-        Input("contrib-drive-repeat-timer", "n_intervals"),
+        Input("job-status-contributions_per_quarter", "data"),
         Input("num_contributions", "value"),
         Input("drive-repeat", "value"),
     ],
 )
-def create_drive_by_graph(repolist, timer_pings, contribs, view):
+@cached_figure(jm, "cont-drive-repeat", "contributions_per_quarter")
+def create_drive_by_graph(repolist, job_status, contribs, view):
     logging.debug("CONTRIB_DRIVE_REPEAT_VIZ - START")
 
-    ready, results, graph_update, interval_update = handle_job_state(jm, ctq, repolist)
+    if contribs is None:
+        return dash.no_update
+
+    # contributions per quarter, counted by the workers along with how many their contributors made.
+    ready, results, graph_update = handle_aggregate_state(jm, "contributions_per_quarter", repolist)
     if not ready:
-        return graph_update, interval_update
+        return graph_update
 
     start = time.perf_counter()
 
-    # graph on contribution subset
-    df_cont = pd.DataFrame(results)
-    contributors = df_cont["cntrb_id"][df_cont["rank"] == contribs].to_list()
-    df_cont_subset = pd.DataFrame(results)
+    # graph on contribution subset; repeat contributors made at least 'contribs' contributions.
+    df_cont_subset = results
 
     # filtering data by view
     if view == "drive":
-        df_cont_subset = df_cont_subset.loc[~df_cont_subset["cntrb_id"].isin(contributors)]
+        df_cont_subset = df_cont_subset.loc[df_cont_subset["contributions"] < contribs]
     else:
-        df_cont_subset = df_cont_subset.loc[df_cont_subset["cntrb_id"].isin(contributors)]
+        df_cont_subset = df_cont_subset.loc[df_cont_subset["contributions"] >= contribs]
 
     # reset index to be ready for plotly
     df_cont_subset = df_cont_subset.reset_index()
 
-    # graph geration
+    # graph geration; binned by quarter here rather than shipping every contribution to the browser.
     if df_cont_subset is not None:
-        fig = px.histogram(df_cont_subset, x="created_at", color="Action", template="minty")
-        fig.update_traces(
-            xbins_size="M3",
-            hovertemplate="Date: %{x}" + "<br>Amount: %{y}<br><extra></extra>",
+        fig = go.Figure(
+            binned_bars(
+                df_cont_subset,
+                x="date",
+                y="count",
+                size="M3",
+                color="Action",
+                hovertemplate="Date: %{x}" + "<br>Amount: %{y}<br><extra></extra>",
+            )
         )
         fig.update_xaxes(showgrid=True, ticklabelmode="period", dtick="M3")
         fig.update_layout(
+            template="minty",
+            barmode="relative",
+            legend_title_text="Action",
             xaxis_title="Quarter",
             yaxis_title="Contributions",
             margin_b=40,
         )
         logging.debug(f"CONTRIB_DRIVE_REPEAT_VIZ - END - {time.perf_counter() - start}")
-        return fig, dash.no_update
+        return fig
     else:
-        return nodata_graph, dash.no_update
+        return nodata_graph
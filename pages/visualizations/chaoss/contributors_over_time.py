@@ -12,7 +12,7 @@ import plotly.express as px
 from pages.utils.graph_utils import get_graph_time_values
 
 from app import jm
-from pages.utils.job_utils import handle_job_state, nodata_graph
+from pages.utils.job_utils import handle_job_state, nodata_graph, cached_figure, label_partial
 from queries.contributors_query import contributors_query as ctq
 import time
 
@@ -20,13 +20,6 @@ gc_contributors_over_time = dbc.Card(
     [
         dbc.CardBody(
             [
-                dcc.Interval(
-                    id="contributors-over-time-timer",
-                    n_intervals=1,
-                    max_intervals=1,
-                    disabled=False,
-                    interval=800,
-                ),
                 html.H4("Contributor Types Over Time", className="card-title", style={"text-align": "center"}),
                 dbc.Popover(
                     [
@@ -126,25 +119,26 @@ def toggle_popover_3(n, is_open):
 
 @callback(
     Output("contributors-over-time", "figure"),
-    Output("contributors-over-time-timer", "n_intervals"),
     [
         Input("repo-choices", "data"),
-        Input("contributors-over-time-timer", "n_intervals"),
+        Input("job-status-contributors_query", "data"),
         Input("num_contribs_req", "value"),
         Input("contrib-time-interval", "value"),
     ],
 )
-def create_graph(repolist, timer_pings, contribs, interval):
+@cached_figure(jm, "contributors-over-time", ctq)
+def create_graph(repolist, job_status, contribs, interval):
     logging.debug("CONTRIBUTIONS_OVER_TIME_VIZ - START")
 
-    ready, results, graph_update, interval_update = handle_job_state(jm, ctq, repolist)
+    # large orgs take a while; show the repos that are there in the meantime.
+    ready, results, graph_update = handle_job_state(jm, ctq, repolist, partial=True)
     if not ready:
-        return graph_update, interval_update
+        return graph_update
 
     start = time.perf_counter()
 
-    df_cont = pd.DataFrame(results)
-    df_cont["created_at"] = pd.to_datetime(df_cont["created_at"], utc=True, format="%Y-%m-%d")
+    # the dataset is shared with other cards; copy before adding columns.
+    df_cont = results.copy()
 
     # create column for identifying Drive by and Repeat Contributors
     contributors = df_cont["cntrb_id"][df_cont["rank"] == contribs].to_list()
@@ -201,6 +195,6 @@ def create_graph(repolist, timer_pings, contribs, interval):
             margin_b=40,
         )
         logging.debug(f"CONTRIBUTIONS_OVER_TIME_VIZ - END - {time.perf_counter() - start}")
-        return fig, dash.no_update
+        return label_partial(fig, results)
     else:
-        return nodata_graph, dash.no_update
+        return nodata_graph
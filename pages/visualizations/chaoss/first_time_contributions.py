@@ -10,8 +10,8 @@ import logging
 import plotly.express as px
 
 from app import jm
-from pages.utils.job_utils import handle_job_state, nodata_graph
-from queries.contributors_query import contributors_query as ctq
+from pages.utils.binning import binned_bars
+from pages.utils.job_utils import handle_aggregate_state, nodata_graph, cached_figure
 
 import time
 
@@ -19,13 +19,6 @@ gc_first_time_contributions = dbc.Card(
     [
         dbc.CardBody(
             [
-                dcc.Interval(
-                    id="first-time-contributors-timer",
-                    n_intervals=1,
-                    max_intervals=1,
-                    disabled=False,
-                    interval=800,
-                ),
                 html.H4("First Time Contributions Per Quarter", className="card-title", style={"text-align": "center"}),
                 dbc.Popover(
                     [
@@ -67,40 +60,46 @@ def toggle_popover_2(n, is_open):
 
 @callback(
     Output("first-time-contributions", "figure"),
-    Output("first-time-contributors-timer", "n_intervals"),
-    [Input("repo-choices", "data"), Input("first-time-contributors-timer", "n_intervals")],
+    [
+        Input("repo-choices", "data"),
+        Input("job-status-first_contributions_per_day", "data"),
+    ],
 )
-def create_first_time_contributors_graph(repolist, timer_pings):
+@cached_figure(jm, "first-time-contributions", "first_contributions_per_day")
+def create_first_time_contributors_graph(repolist, job_status):
     logging.debug("1ST_CONTRIBUTIONS_VIZ - START")
 
-    ready, results, graph_update, interval_update = handle_job_state(jm, ctq, repolist)
+    # 1st contributions per day and action, counted by the workers.
+    ready, results, graph_update = handle_aggregate_state(jm, "first_contributions_per_day", repolist)
     if not ready:
-        return graph_update, interval_update
+        return graph_update
 
     start = time.perf_counter()
 
-    df_cont = pd.DataFrame(results)
-
-    # selection for 1st contribution only
-    df_cont = df_cont[df_cont["rank"] == 1]
-
-    # reset index to be ready for plotly
-    df_cont = df_cont.reset_index()
+    df_cont = results
 
-    # Graph generation
+    # Graph generation; binned by quarter here, so the figure carries one bar per quarter and action.
     if df_cont is not None:
-        fig = px.histogram(df_cont, x="created_at", color="Action", template="minty")
-        fig.update_traces(
-            xbins_size="M3",
-            hovertemplate="Date: %{x}" + "<br>Amount: %{y}<br><extra></extra>",
+        fig = go.Figure(
+            binned_bars(
+                df_cont,
+                x="date",
+                y="count",
+                size="M3",
+                color="Action",
+                hovertemplate="Date: %{x}" + "<br>Amount: %{y}<br><extra></extra>",
+            )
         )
         fig.update_xaxes(showgrid=True, ticklabelmode="period", dtick="M3")
         fig.update_layout(
+            template="minty",
+            barmode="relative",
+            legend_title_text="Action",
             xaxis_title="Quarter",
             yaxis_title="Contributions",
             margin_b=40,
         )
         logging.debug(f"1ST_CONTRIBUTIONS_VIZ - END - {time.perf_counter() - start}")
-        return fig, dash.no_update
+        return fig
     else:
-        return nodata_graph, dash.no_update
+        return nodata_graph
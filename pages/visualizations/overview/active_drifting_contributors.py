@@ -10,10 +10,10 @@ import logging
 from dateutil.relativedelta import *  # type: ignore
 import plotly.express as px
 from pages.utils.graph_utils import get_graph_time_values
+from pages.utils.contributor_status import active_drifting_away_runs
 
 from app import jm
-from pages.utils.job_utils import handle_job_state
-from queries.contributors_query import contributors_query as ctq
+from pages.utils.job_utils import handle_aggregate_state, cached_figure
 
 import time
 
@@ -21,13 +21,6 @@ gc_active_drifting_contributors = dbc.Card(
     [
         dbc.CardBody(
             [
-                dcc.Interval(
-                    id="active-drifting-contributors-timer",
-                    disabled=False,
-                    n_intervals=1,
-                    max_intervals=1,
-                    interval=800,
-                ),
                 html.H4(
                     "Contributor Growth by Engagement",
                     className="card-title",
@@ -165,54 +158,38 @@ def toggle_popover_4(n, is_open):
 @callback(
     Output("active_drifting_contributors", "figure"),
     Output("drifting_away_check_alert", "is_open"),
-    Output("active-drifting-contributors-timer", "n_intervals"),
     [
         Input("repo-choices", "data"),
-        Input("active-drifting-contributors-timer", "n_intervals"),
+        Input("job-status-contribution_runs_per_day", "data"),
         Input("active-drifting-interval", "value"),
         Input("drifting_months", "value"),
         Input("away_months", "value"),
     ],
 )
-def active_drifting_contributors(repolist, timer_pings, interval, drift_interval, away_interval):
+@cached_figure(jm, "active_drifting_contributors", "contribution_runs_per_day")
+def active_drifting_contributors(repolist, job_status, interval, drift_interval, away_interval):
 
     logging.debug("ACTIVE_DRIFTING_CONTRIBUTOR_GROWTH_VIZ - START")
 
     if drift_interval is None or away_interval is None:
-        return dash.no_update, dash.no_update, dash.no_update
+        return dash.no_update, dash.no_update
 
     if drift_interval > away_interval:
-        return dash.no_update, True, dash.no_update
+        return dash.no_update, True
 
-    ready, results, graph_update, interval_update = handle_job_state(jm, ctq, repolist)
+    # contributions per day made and day their contributor next contributed, counted by the workers.
+    ready, results, graph_update = handle_aggregate_state(jm, "contribution_runs_per_day", repolist)
     if not ready:
-        return graph_update, dash.no_update, interval_update
+        return graph_update, dash.no_update
 
     start = time.perf_counter()
 
-    # create dataframe from record data
-    df = pd.DataFrame(results)
-
-    # order from beginning of time to most recent
-    df = df.sort_values("created_at", axis=0, ascending=True)
-
-    # convert to datetime objects
-    df["created_at"] = pd.to_datetime(df["created_at"], utc=True)
-
-    # first and last elements of the dataframe are the
-    # earliest and latest events respectively
-    earliest = df.iloc[0]["created_at"]
-    latest = df.iloc[-1]["created_at"]
+    df = results
 
     # beginning to the end of time by the specified interval
-    dates = pd.date_range(start=earliest, end=latest, freq=interval, inclusive="both")
+    dates = pd.date_range(start=df["created_at"].min(), end=df["created_at"].max(), freq=interval, inclusive="both")
 
-    base = [["Date", "Active", "Drifting", "Away"]]
-    for date in dates:
-        counts = get_active_drifting_away_up_to(df, date, drift_interval, away_interval)
-        base.append(counts)
-
-    df_status = pd.DataFrame(base[1:], columns=base[0])
+    df_status = active_drifting_away_runs(df, dates, drift_interval, away_interval)
 
     # time values for graph
     x_r, x_name, hover, period = get_graph_time_values(interval)
@@ -256,31 +233,4 @@ def active_drifting_contributors(repolist, timer_pings, interval, drift_interval
     fig.update_layout(xaxis_title="Time", yaxis_title="Number of Contributors")
 
     logging.debug(f"ACTIVE_DRIFTING_CONTRIBUTOR_GROWTH_VIZ - END - {time.perf_counter() - start}")
-    return fig, False, dash.no_update
-
-
-def get_active_drifting_away_up_to(df, date, drift_interval, away_interval):
-
-    # drop rows that are more recent than the date limit
-    df_lim = df[df["created_at"] <= date]
-
-    # keep more recent contribution per ID
-    df_lim = df_lim.drop_duplicates(subset="cntrb_id", keep="last")
-
-    # time difference, 6 months before the threshold date
-    drift_mos = date - relativedelta(months=+drift_interval)
-
-    # time difference, 6 months before the threshold date
-    away_mos = date - relativedelta(months=+away_interval)
-
-    # contributions in the last 6 months
-    numTotal = df_lim.shape[0]
-
-    numActive = df_lim[df_lim["created_at"] >= drift_mos].shape[0]
-
-    drifting = df_lim[df_lim["created_at"] > away_mos]
-    numDrifting = drifting[drifting["created_at"] < drift_mos].shape[0]
-
-    numAway = numTotal - (numActive + numDrifting)
-
-    return [date, numActive, numDrifting, numAway]
+    return fig, False
@@ -9,9 +9,9 @@ import datetime as dt
 import logging
 import plotly.express as px
 from pages.utils.graph_utils import get_graph_time_values
+from pages.utils.binning import binned_bar
 
-from pages.utils.job_utils import handle_job_state, nodata_graph
-from queries.commits_query import commits_query as cmq
+from pages.utils.job_utils import handle_aggregate_state, nodata_graph, cached_figure
 from app import jm
 import time
 
@@ -19,13 +19,6 @@ gc_commits_over_time = dbc.Card(
     [
         dbc.CardBody(
             [
-                dcc.Interval(
-                    id="commits-over-time-timer",
-                    disabled=False,
-                    n_intervals=1,
-                    max_intervals=1,
-                    interval=800,
-                ),
                 html.H4(
                     "Commits Over Time",
                     className="card-title",
@@ -117,24 +110,24 @@ def toggle_popover_2(n, is_open):
 # callback for commits over time graph
 @callback(
     Output("commits-over-time", "figure"),
-    Output("commits-over-time-timer", "n_intervals"),
     [
         Input("repo-choices", "data"),
-        Input("commits-over-time-timer", "n_intervals"),
+        Input("job-status-commits_per_day", "data"),
         Input("commits-time-interval", "value"),
     ],
 )
-def create_commits_over_time_graph(repolist, timer_pings, interval):
+@cached_figure(jm, "commits-over-time", "commits_per_day")
+def create_commits_over_time_graph(repolist, job_status, interval):
     logging.debug("COMMITS_OVER_TIME_VIZ - START")
 
-    ready, results, graph_update, interval_update = handle_job_state(jm, cmq, repolist)
+    # commits per day, binned by the workers.
+    ready, results, graph_update = handle_aggregate_state(jm, "commits_per_day", repolist)
     if not ready:
-        # set n_intervals to 0 so it'll fire again.
-        return graph_update, interval_update
+        return graph_update
 
     start = time.perf_counter()
 
-    df_commits = pd.DataFrame(results)
+    df_commits = results
 
     # reset index to be ready for plotly
     df_commits = df_commits.reset_index()
@@ -142,11 +135,15 @@ def create_commits_over_time_graph(repolist, timer_pings, interval):
     # time values for graph
     x_r, x_name, hover, period = get_graph_time_values(interval)
 
-    # graph geration
+    # graph geration; binned here, so the figure carries one bar per interval.
     if df_commits is not None:
-        fig = px.histogram(df_commits, x="date", range_x=x_r, labels={"x": x_name, "y": "Commits"})
-        fig.update_traces(xbins_size=interval, hovertemplate=hover + "<br>Commits: %{y}<br>")
+        fig = go.Figure(
+            binned_bar(
+                df_commits["date"], interval, df_commits["commits"], hovertemplate=hover + "<br>Commits: %{y}<br>"
+            )
+        )
         fig.update_xaxes(
+            range=x_r,
             showgrid=True,
             ticklabelmode="period",
             dtick=interval,
@@ -159,6 +156,6 @@ def create_commits_over_time_graph(repolist, timer_pings, interval):
             margin_r=20,
         )
         logging.debug(f"COMMITS_OVER_TIME_VIZ - END - {time.perf_counter() - start}")
-        return fig, dash.no_update
+        return fig
     else:
-        return nodata_graph, True
+        return nodata_graph
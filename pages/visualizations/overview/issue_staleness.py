@@ -10,9 +10,9 @@ import logging
 from dateutil.relativedelta import *  # type: ignore
 import plotly.express as px
 from pages.utils.graph_utils import get_graph_time_values
+from pages.utils.staleness import open_intervals
 
-from pages.utils.job_utils import handle_job_state, nodata_graph
-from queries.issues_query import issues_query as iq
+from pages.utils.job_utils import handle_aggregate_state, nodata_graph, cached_figure
 from app import jm
 import time
 
@@ -20,13 +20,6 @@ gc_issue_staleness = dbc.Card(
     [
         dbc.CardBody(
             [
-                dcc.Interval(
-                    id="issue-staleness-timer",
-                    disabled=False,
-                    n_intervals=1,
-                    max_intervals=1,
-                    interval=800,
-                ),
                 html.H4(
                     "Issue Activity- Staleness",
                     className="card-title",
@@ -163,51 +156,36 @@ def toggle_popover_issues(n, is_open):
 @callback(
     Output("issue_staleness", "figure"),
     Output("issue_staling_stale_check_alert", "is_open"),
-    Output("issue-staleness-timer", "n_intervals"),
     [
         Input("repo-choices", "data"),
-        Input("issue-staleness-timer", "n_intervals"),
+        Input("job-status-issue_intervals_per_day", "data"),
         Input("issue-staleness-interval", "value"),
         Input("i_staling_days", "value"),
         Input("i_stale_days", "value"),
     ],
 )
-def new_staling_issues(repolist, timer_pings, interval, staling_interval, stale_interval):
+@cached_figure(jm, "issue_staleness", "issue_intervals_per_day")
+def new_staling_issues(repolist, job_status, interval, staling_interval, stale_interval):
     logging.debug("ISSUE STALENESS - START")
 
     if staling_interval > stale_interval:
-        return dash.no_update, True, dash.no_update
+        return dash.no_update, True
 
     if staling_interval is None or stale_interval is None:
-        return dash.no_update, dash.no_update, dash.no_update
+        return dash.no_update, dash.no_update
 
-    ready, results, graph_update, interval_update = handle_job_state(jm, iq, repolist)
+    # items per day created and closed, counted by the workers.
+    ready, results, graph_update = handle_aggregate_state(jm, "issue_intervals_per_day", repolist)
     if not ready:
-        return graph_update, dash.no_update, interval_update
+        return graph_update, dash.no_update
 
     start = time.perf_counter()
 
-    # create dataframe from record data
-    df = pd.DataFrame(results)
-
-    # change all to datetime
-    df["created"] = pd.to_datetime(df["created"], utc=True)
-    df["closed"] = pd.to_datetime(df["closed"], utc=True)
-
-    # first and last elements of the dataframe are the
-    # earliest and latest events respectively
-    earliest = df.iloc[0]["created"]
-    latest = df.iloc[-1]["created"]
-
-    # generating buckets beginning to the end of time by the specified interval
-    dates = pd.date_range(start=earliest, end=latest, freq=interval, inclusive="both")
-
-    base = [["Date", "New", "Staling", "Stale"]]
-    for date in dates:
-        counts = get_new_staling_stale_up_to(df, date, staling_interval, stale_interval)
-        base.append(counts)
+    df = results
 
-    df_status = pd.DataFrame(base[1:], columns=base[0])
+    # buckets from the earliest to the latest created item; only recounted
+    # when just the staling and stale days change.
+    df_status = open_intervals(df, interval).counts(staling_interval, stale_interval)
 
     # time values for graph
     x_r, x_name, hover, period = get_graph_time_values(interval)
@@ -255,35 +233,4 @@ def new_staling_issues(repolist, timer_pings, interval, staling_interval, stale_
     fig.update_layout(xaxis_title="Time", yaxis_title="Issues", legend_title="Type")
 
     logging.debug("ISSUE STALENESS - END")
-    return fig, False, dash.no_update
-
-
-def get_new_staling_stale_up_to(df, date, staling_interval, stale_interval):
-
-    # drop rows that are more recent than the date limit
-    df_lim_created = df[df["created"] <= date]
-
-    # drop rows that have been closed before date
-    df_lim = df_lim_created[df_lim_created["closed"] > date]
-
-    # include rows that have a null closed value
-    df_lim = df_lim.append(df_lim_created[df_lim_created.closed.isnull()])
-
-    # time difference for the amount of days before the threshold date
-    staling_days = date - relativedelta(days=+staling_interval)
-
-    # time difference for the amount of days before the threshold date
-    stale_days = date - relativedelta(days=+stale_interval)
-
-    # issuess still open at the specified date
-    numTotal = df_lim.shape[0]
-
-    # num of currently open issues that have been create in the last staling_value amount of days
-    numNew = df_lim[df_lim["created"] >= staling_days].shape[0]
-
-    staling = df_lim[df_lim["created"] > stale_days]
-    numStaling = staling[staling["created"] < staling_days].shape[0]
-
-    numStale = numTotal - (numNew + numStaling)
-
-    return [date, numNew, numStaling, numStale]
+    return fig, False
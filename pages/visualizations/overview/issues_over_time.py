@@ -9,9 +9,9 @@ import datetime as dt
 import logging
 import plotly.express as px
 from pages.utils.graph_utils import get_graph_time_values
+from pages.utils.binning import binned_bar
 
-from pages.utils.job_utils import handle_job_state, nodata_graph
-from queries.issues_query import issues_query as iq
+from pages.utils.job_utils import handle_aggregate_state, nodata_graph, cached_figure
 from app import jm
 
 import time
@@ -20,13 +20,6 @@ gc_issues_over_time = dbc.Card(
     [
         dbc.CardBody(
             [
-                dcc.Interval(
-                    id="issues-over-time-timer",
-                    disabled=False,
-                    n_intervals=1,
-                    max_intervals=1,
-                    interval=800,
-                ),
                 html.H4(
                     "Issues Over Time",
                     className="card-title",
@@ -114,55 +107,54 @@ def toggle_popover_3(n, is_open):
 # callback for issues over time graph
 @callback(
     Output("issues-over-time", "figure"),
-    Output("issues-over-time-timer", "n_intervals"),
     [
         Input("repo-choices", "data"),
-        Input("issues-over-time-timer", "n_intervals"),
+        Input("job-status-issues_per_day", "data"),
         Input("issue-time-interval", "value"),
     ],
 )
-def issues_over_time_graph(repolist, timer_pings, interval):
+@cached_figure(jm, "issues-over-time", "issues_per_day")
+def issues_over_time_graph(repolist, job_status, interval):
     logging.debug("ISSUES_OVER_TIME_VIZ - START")
 
-    ready, results, graph_update, interval_update = handle_job_state(jm, iq, repolist)
+    # issues created, closed and open per day, counted by the workers.
+    ready, results, graph_update = handle_aggregate_state(jm, "issues_per_day", repolist)
     if not ready:
-        return graph_update, interval_update
+        return graph_update
 
     start = time.perf_counter()
 
-    # create dataframe from record data
-    df_issues = pd.DataFrame(results)
-
-    # df for line chart
-    df_open = make_open_df(df_issues)
-    if df_open is None:
+    df_issues = results
+    if len(df_issues) == 0:
         logging.debug("ISSUES_OVER_TIME_VIZ - NO DATA AVAILABLE")
-        return nodata_graph, dash.no_update
-
-    # reset index to be ready for plotly
-    df_issues = df_issues.reset_index()
+        return nodata_graph
 
     # time values for graph
     x_r, x_name, hover, period = get_graph_time_values(interval)
 
-    # graph generation
+    # graph generation; binned here, so the figure carries one bar per interval.
     if df_issues is not None:
         fig = go.Figure()
-        fig.add_histogram(
-            x=df_issues["closed"].dropna(),
-            histfunc="count",
-            name="closed",
-            opacity=0.75,
-            hovertemplate=hover + "<br>Closed: %{y}<br>" + "<extra></extra>",
+        fig.add_trace(
+            binned_bar(
+                df_issues["date"],
+                interval,
+                df_issues["closed"],
+                name="closed",
+                opacity=0.75,
+                hovertemplate=hover + "<br>Closed: %{y}<br>" + "<extra></extra>",
+            )
         )
-        fig.add_histogram(
-            x=df_issues["created"],
-            histfunc="count",
-            name="created",
-            opacity=0.6,
-            hovertemplate=hover + "<br>Created: %{y}<br>" + "<extra></extra>",
+        fig.add_trace(
+            binned_bar(
+                df_issues["date"],
+                interval,
+                df_issues["created"],
+                name="created",
+                opacity=0.6,
+                hovertemplate=hover + "<br>Created: %{y}<br>" + "<extra></extra>",
+            )
         )
-        fig.update_traces(xbins_size=interval)
         fig.update_xaxes(
             showgrid=True,
             ticklabelmode="period",
@@ -178,8 +170,8 @@ def issues_over_time_graph(repolist, timer_pings, interval):
         )
         fig.add_trace(
             go.Scatter(
-                x=df_open["issue"],
-                y=df_open["total"],
+                x=df_issues["date"],
+                y=df_issues["open"],
                 mode="lines",
                 name="Issues Actively Open",
                 hovertemplate="Issues Open: %{y}" + "<extra></extra>",
@@ -187,37 +179,8 @@ def issues_over_time_graph(repolist, timer_pings, interval):
         )
         logging.debug(f"ISSUES_OVER_TIME_VIZ - END - {time.perf_counter() - start}")
 
-        # return fig, diable timer.
-        return fig, dash.no_update
+        # return fig.
+        return fig
     else:
-        # don't change figure, disable timer.
-        return dash.no_update, dash.no_update
-
-
-def make_open_df(df_issues):
-    # created dataframe
-    # TODO: dataframes don't always have the 'created_at' column for some reason.
-    try:
-        df_created = pd.DataFrame(df_issues["created"])
-    except KeyError:
-        return None
-
-    df_created.rename(columns={"created": "issue"}, inplace=True)
-    df_created["open"] = 1
-
-    # closed dataframe
-    df_closed = pd.DataFrame(df_issues["closed"]).dropna()
-    df_closed.rename(columns={"closed": "issue"}, inplace=True)
-    df_closed["open"] = -1
-
-    # sum created and closed value to get actively open issues dataframe
-
-    df_open = pd.concat([df_created, df_closed])
-    df_open = df_open.sort_values("issue")
-    df_open = df_open.reset_index(drop=True)
-    df_open["total"] = df_open["open"].cumsum()
-    df_open["issue"] = pd.to_datetime(df_open["issue"])
-    df_open["issue"] = df_open["issue"].dt.floor("D")
-    df_open = df_open.drop_duplicates(subset="issue", keep="last")
-    df_open = df_open.drop(columns="open")
-    return df_open
+        # don't change figure.
+        return dash.no_update
@@ -11,8 +11,7 @@ import plotly.express as px
 from pages.utils.graph_utils import get_graph_time_values
 
 from app import jm
-from pages.utils.job_utils import handle_job_state, nodata_graph
-from queries.contributors_query import contributors_query as ctq
+from pages.utils.job_utils import handle_aggregate_state, nodata_graph, cached_figure
 
 import time
 
@@ -20,13 +19,6 @@ gc_total_contributor_growth = dbc.Card(
     [
         dbc.CardBody(
             [
-                dcc.Interval(
-                    id="total-contributor-growth-timer",
-                    disabled=False,
-                    n_intervals=1,
-                    max_intervals=1,
-                    interval=800,
-                ),
                 html.H4(
                     id="overview-graph-title-1",
                     className="card-title",
@@ -131,41 +123,28 @@ def graph_title(view):
 
 @callback(
     Output("total_contributor_growth", "figure"),
-    Output("total-contributor-growth-timer", "n_intervals"),
     [
         Input("repo-choices", "data"),
-        Input("total-contributor-growth-timer", "n_intervals"),
+        Input("job-status-new_contributors_per_day", "data"),
         Input("contributor-growth-time-interval", "value"),
     ],
 )
-def create_total_contributor_growth_graph(repolist, timer_pings, bin_size):
+@cached_figure(jm, "total_contributor_growth", "new_contributors_per_day")
+def create_total_contributor_growth_graph(repolist, job_status, bin_size):
     logging.debug("TOTAL_CONTRIBUTOR_GROWTH_VIZ - START")
-    ready, results, graph_update, interval_update = handle_job_state(jm, ctq, repolist)
-    if not ready:
-        return graph_update, interval_update
-
-    start = time.perf_counter()
-
-    # create dataframe from record data
-    df_contrib = pd.DataFrame(results)
 
     """
         Assume that the cntrb_id values are unique to individual contributors.
-        Find the first rank-1 contribution of the contributors, saving the created_at
-        date.
+        The workers count the contributors whose first rank-1 contribution
+        was on each day.
     """
+    ready, results, graph_update = handle_aggregate_state(jm, "new_contributors_per_day", repolist)
+    if not ready:
+        return graph_update
 
-    # keep only first contributions
-    df_contrib = df_contrib[df_contrib["rank"] == 1]
-
-    # order from beginning of time to most recent
-    df_contrib = df_contrib.sort_values("created_at", axis=0, ascending=True)
-
-    # convert to datetime objects rather than strings, add day column
-    df_contrib["created_at"] = pd.to_datetime(df_contrib["created_at"], utc=True)
+    start = time.perf_counter()
 
-    # get all of the unique entries by contributor ID
-    df_contrib = df_contrib.drop_duplicates(subset=["cntrb_id"])
+    df_contrib = results
 
     if bin_size == -1:
         fig = contributor_growth_line_bar(df_contrib)
@@ -174,22 +153,22 @@ def create_total_contributor_growth_graph(repolist, timer_pings, bin_size):
 
     logging.debug(f"TOTAL_CONTRIBUTOR_GROWTH_VIZ - END - {time.perf_counter() - start}")
     # return the simple line graph
-    return fig, dash.no_update
+    return fig
 
 
 def contributor_growth_bar_graph(df_contrib, bin_size):
 
     """
     Group-by determined by the radio button options.
-    Aggregation is the number of rows per time bin.
+    Aggregation is the number of new contributors per time bin.
     Days, Months, Years are all options.
     """
     if bin_size == "D1":
-        group = df_contrib.groupby(pd.Grouper(key="created_at", axis=0, freq="1D")).size()
+        group = df_contrib.groupby(pd.Grouper(key="date", axis=0, freq="1D"))["new"].sum()
     elif bin_size == "M1":
-        group = df_contrib.groupby(pd.Grouper(key="created_at", axis=0, freq="1M")).size()
+        group = df_contrib.groupby(pd.Grouper(key="date", axis=0, freq="1M"))["new"].sum()
     else:
-        group = df_contrib.groupby(pd.Grouper(key="created_at", axis=0, freq="1Y")).size()
+        group = df_contrib.groupby(pd.Grouper(key="date", axis=0, freq="1Y"))["new"].sum()
 
     # time values for graph
     x_r, x_name, hover, period = get_graph_time_values(bin_size)
@@ -197,7 +176,7 @@ def contributor_growth_bar_graph(df_contrib, bin_size):
     # reset index from group-by aggregation step
     group = group.reset_index()
     # rename the columns for clarity
-    group = group.rename(columns={"created_at": "date", 0: "count"})
+    group = group.rename(columns={"new": "count"})
 
     # correction for year binning -
     # rounded up to next year so this is a simple patch
@@ -244,16 +223,14 @@ def contributor_growth_bar_graph(df_contrib, bin_size):
 
 def contributor_growth_line_bar(df_contrib):
 
-    # reset index to enumerate contributions
-    df_contrib = df_contrib.reset_index()
-    df_contrib = df_contrib.drop(["index"], axis=1)
-    df_contrib = df_contrib.reset_index()
+    # running total of contributors
+    df_contrib = df_contrib.assign(total=df_contrib["new"].cumsum())
 
     # create the figure
     fig = px.line(
         df_contrib,
-        x="created_at",
-        y="index",
+        x="date",
+        y="total",
     )
 
     # edit hover values
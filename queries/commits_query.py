@@ -3,12 +3,20 @@ import pandas as pd
 from db_manager.AugurInterface import AugurInterface
 
 
-def commits_query(dbmc, repo_ids):
+def commits_query(dbmc, repo_ids, since=None, chunksize=None):
     """
     Worker query
 
     From an input list of repos, get relevant data about the
-    commit history of those repos. Cache as dictionary in Redis.
+    commit history of those repos. Cached per repo in Redis
+    by job_manager/shard_cache.py.
+
+    If 'since' is supplied, only rows with c.cmt_author_date at or after it
+    are returned; used to refresh cached repos incrementally.
+
+    If 'chunksize' is supplied, the result is returned as an iterator of
+    DataFrames of about that many rows. Large results are extracted
+    with COPY, see AugurInterface.run_bulk_query.
 
     Expects dbm to be db_manager/AugurInterface.
     """
@@ -17,8 +25,13 @@ def commits_query(dbmc, repo_ids):
     repo_statement = str(repo_ids)
     repo_statement = repo_statement[1:-1]
 
+    since_statement = ""
+    if since is not None:
+        since_statement = f"AND c.cmt_author_date >= '{since}'"
+
     query_string = f"""
                     SELECT
+                        r.repo_id,
                         r.repo_name,
                         c.cmt_commit_hash AS commits,
                         c.cmt_id AS file,
@@ -31,12 +44,17 @@ def commits_query(dbmc, repo_ids):
                     ON r.repo_id = c.repo_id
                     WHERE
                         c.repo_id in({repo_statement})
+                        {since_statement}
                     """
 
     # create database connection, load config, execute query above.
     dbm = AugurInterface()
     dbm.load_pconfig(dbmc)
-    df_commits = dbm.run_query(query_string)
+    if chunksize is not None:
+        logging.debug("COMMITS_DATA_QUERY - STREAMING")
+        return dbm.run_bulk_query(query_string, chunksize)
+
+    df_commits = dbm.run_bulk_query(query_string)
 
     logging.debug("COMMITS_DATA_QUERY - END")
-    return df_commits.to_dict("records")
+    return df_commits
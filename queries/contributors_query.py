@@ -3,12 +3,20 @@ import pandas as pd
 from db_manager.AugurInterface import AugurInterface
 
 
-def contributors_query(dbmc, repo_ids):
+def contributors_query(dbmc, repo_ids, since=None, chunksize=None):
     """
     Worker query
 
     From an input list of repos, get relevant data about the
-    contributions history of those repos. Cache as dictionary in Redis.
+    contributions history of those repos. Cached per repo in Redis
+    by job_manager/shard_cache.py.
+
+    If 'since' is supplied, only rows with created_at at or after it
+    are returned; used to refresh cached repos incrementally.
+
+    If 'chunksize' is supplied, the result is returned as an iterator of
+    DataFrames of about that many rows. Large results are extracted
+    with COPY, see AugurInterface.run_bulk_query.
 
     Expects dbm to be db_manager/AugurInterface.
     """
@@ -16,6 +24,10 @@ def contributors_query(dbmc, repo_ids):
     repo_statement = str(repo_ids)
     repo_statement = repo_statement[1:-1]
 
+    since_statement = ""
+    if since is not None:
+        since_statement = f"AND created_at >= '{since}'"
+
     query_string = f"""
                     SELECT
                         *
@@ -23,13 +35,23 @@ def contributors_query(dbmc, repo_ids):
                         augur_data.explorer_contributor_actions
                     WHERE
                         repo_id in({repo_statement})
+                        {since_statement}
                 """
 
     # create database connection, load config, execute query above.
     dbm = AugurInterface()
     dbm.load_pconfig(dbmc)
-    df_cont = dbm.run_query(query_string)
+    if chunksize is not None:
+        logging.debug("CONTRIBUTIONS_DATA_QUERY - STREAMING")
+        return (_clean(df_cont) for df_cont in dbm.run_bulk_query(query_string, chunksize))
+
+    df_cont = _clean(dbm.run_bulk_query(query_string))
 
+    logging.debug("CONTRIBUTIONS_DATA_QUERY - END")
+    return df_cont
+
+
+def _clean(df_cont):
     # update column values
     df_cont.loc[df_cont["action"] == "open_pull_request", "action"] = "Open PR"
     df_cont.loc[df_cont["action"] == "pull_request_comment", "action"] = "PR Comment"
@@ -38,7 +60,4 @@ def contributors_query(dbmc, repo_ids):
     df_cont.loc[df_cont["action"] == "commit", "action"] = "Commit"
     df_cont.rename(columns={"action": "Action"}, inplace=True)
 
-    df_cont = df_cont.reset_index()
-    df_cont.drop("index", axis=1, inplace=True)
-    logging.debug("CONTRIBUTIONS_DATA_QUERY - END")
-    return df_cont.to_dict("records")
+    return df_cont
@@ -3,12 +3,19 @@ import pandas as pd
 from db_manager.AugurInterface import AugurInterface
 
 
-def issues_query(dbmc, repo_ids):
+def issues_query(dbmc, repo_ids, since=None, chunksize=None):
     """
     Worker query
 
     From an input list of repos, get relevant data about the
-    issues history of those repos. Cache as dictionary in Redis.
+    issues history of those repos. Cached per repo in Redis
+    by job_manager/shard_cache.py.
+
+    If 'since' is supplied, only rows with i.updated_at at or after it
+    are returned; used to refresh cached repos incrementally.
+
+    If 'chunksize' is supplied, the result is returned as an iterator of
+    DataFrames of at most that many rows, see AugurInterface.run_query_chunks.
 
     Expects dbm to be db_manager/AugurInterface.
     """
@@ -18,14 +25,20 @@ def issues_query(dbmc, repo_ids):
     repo_statement = str(repo_ids)
     repo_statement = repo_statement[1:-1]
 
+    since_statement = ""
+    if since is not None:
+        since_statement = f"AND i.updated_at >= '{since}'"
+
     query_string = f"""
                     SELECT
+                        r.repo_id,
                         r.repo_name,
                         i.issue_id AS issue,
                         i.gh_issue_number AS issue_number,
                         i.gh_issue_id AS gh_issue,
                         i.created_at AS created,
                         i.closed_at AS closed,
+                        i.updated_at AS updated,
                         i.pull_request_id
                     FROM
                         repo r,
@@ -33,20 +46,27 @@ def issues_query(dbmc, repo_ids):
                     WHERE
                         r.repo_id = i.repo_id AND
                         i.repo_id in({repo_statement})
+                        {since_statement}
                     """
 
     # create database connection, load config, execute query above.
     dbm = AugurInterface()
     dbm.load_pconfig(dbmc)
-    df_issues = dbm.run_query(query_string)
+    if chunksize is not None:
+        logging.debug("ISSUES_DATA_QUERY - STREAMING")
+        return (_clean(df_issues) for df_issues in dbm.run_query_chunks(query_string, chunksize))
+
+    df_issues = _clean(dbm.run_query(query_string))
+
+    logging.debug("ISSUES_DATA_QUERY - END")
 
+    return df_issues
+
+
+def _clean(df_issues):
     df_issues = df_issues[df_issues["pull_request_id"].isnull()]
     df_issues = df_issues.drop(columns="pull_request_id")
+    # streamed results are only sorted within each chunk.
     df_issues = df_issues.sort_values(by="created")
 
-    df_issues = df_issues.reset_index()
-    df_issues.drop("index", axis=1, inplace=True)
-
-    logging.debug("ISSUES_DATA_QUERY - END")
-
-    return df_issues.to_dict("records")
+    return df_issues.reset_index(drop=True)
@@ -3,12 +3,19 @@ import pandas as pd
 from db_manager.AugurInterface import AugurInterface
 
 
-def prs_query(dbmc, repo_ids):
+def prs_query(dbmc, repo_ids, since=None, chunksize=None):
     """
     Worker query
 
     From an input list of repos, get relevant data about the
-    pull request history of those repos. Cache as dictionary in Redis.
+    pull request history of those repos. Cached per repo in Redis
+    by job_manager/shard_cache.py.
+
+    If 'since' is supplied, only rows with pr.pr_updated_at at or after it
+    are returned; used to refresh cached repos incrementally.
+
+    If 'chunksize' is supplied, the result is returned as an iterator of
+    DataFrames of at most that many rows, see AugurInterface.run_query_chunks.
 
     Expects dbm to be db_manager/AugurInterface.
     """
@@ -17,36 +24,49 @@ def prs_query(dbmc, repo_ids):
     repo_statement = str(repo_ids)
     repo_statement = repo_statement[1:-1]
 
+    since_statement = ""
+    if since is not None:
+        since_statement = f"AND pr.pr_updated_at >= '{since}'"
+
     query_string = f"""
                     SELECT
+                        r.repo_id,
                         r.repo_name,
                         pr.pull_request_id AS pull_request,
                         pr.pr_src_number,
                         pr.pr_created_at AS created,
                         pr.pr_closed_at AS closed,
-                        pr.pr_merged_at  AS merged
+                        pr.pr_merged_at  AS merged,
+                        pr.pr_updated_at AS updated
                     FROM
                         repo r,
                         pull_requests pr
                     WHERE
                         r.repo_id = pr.repo_id AND
                         r.repo_id in({repo_statement})
+                        {since_statement}
                     """
 
     # create database connection, load config, execute query above.
     dbm = AugurInterface()
     dbm.load_pconfig(dbmc)
-    df_pr = dbm.run_query(query_string)
+    if chunksize is not None:
+        logging.debug("PR_DATA_QUERY - STREAMING")
+        return (_clean(df_pr) for df_pr in dbm.run_query_chunks(query_string, chunksize))
+
+    df_pr = _clean(dbm.run_query(query_string))
 
-    # sort by the date created
+    logging.debug("PR_DATA_QUERY - END")
+    return df_pr
+
+
+def _clean(df_pr):
+    # sort by the date created; streamed results are only sorted within each chunk.
     df_pr = df_pr.sort_values(by="created")
 
     # convert to datetime objects
     df_pr["created"] = pd.to_datetime(df_pr["created"], utc=True)
     df_pr["merged"] = pd.to_datetime(df_pr["merged"], utc=True)
     df_pr["closed"] = pd.to_datetime(df_pr["merged"], utc=True)
-    df_pr = df_pr.reset_index()
-    df_pr.drop("index", axis=1, inplace=True)
 
-    logging.debug("PR_DATA_QUERY - END")
-    return df_pr.to_dict("records")
+    return df_pr.reset_index(drop=True)
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from job_manager.aggregates import open_intervals_per_day, contribution_runs_per_day, contributions_per_quarter
+from pages.utils.contributor_status import active_drifting_away, active_drifting_away_runs
+from pages.utils.staleness import OpenIntervals, open_intervals
+
+
+def random_times(rng, n, nat=0.0):
+    times = pd.Series(pd.Timestamp("2019-01-01", tz="UTC") + pd.to_timedelta(rng.integers(0, 3 * 365 * 86400, n), "s"))
+    times[rng.random(n) < nat] = pd.NaT
+    return times
+
+
+@pytest.fixture
+def items():
+    rng = np.random.default_rng(5)
+    created = random_times(rng, 500, nat=0.02)
+    closed = created + pd.to_timedelta(rng.integers(0, 200 * 86400, len(created)), "s")
+    closed[rng.random(len(created)) < 0.3] = pd.NaT
+    return pd.DataFrame({"created": created, "closed": closed})
+
+
+@pytest.fixture
+def contributions():
+    rng = np.random.default_rng(7)
+    df = pd.DataFrame(
+        {
+            "cntrb_id": rng.integers(0, 60, 800),
+            "created_at": random_times(rng, 800, nat=0.01),
+            "Action": rng.choice(["Commit", "Issue Opened", "PR Opened"], 800),
+        }
+    )
+    df["rank"] = df.groupby("cntrb_id")["created_at"].rank(method="first")
+    return df
+
+
+def floored(column):
+    return pd.to_datetime(column, utc=True).dt.floor("D")
+
+
+@pytest.mark.parametrize("interval", ["D", "M", "Y"])
+def test_open_intervals_per_day_counts_the_floored_items(items, interval):
+    per_day = open_intervals_per_day(items)
+    assert per_day["count"].sum() == items["created"].notna().sum()
+
+    days = pd.DataFrame({"created": floored(items["created"]), "closed": floored(items["closed"])})
+    dates = pd.date_range(start=days["created"].min(), end=days["created"].max(), freq=interval, inclusive="both")
+
+    expected = OpenIntervals(days["created"], days["closed"], dates).counts(7, 30)
+    pd.testing.assert_frame_equal(open_intervals(per_day, interval).counts(7, 30), expected)
+
+
+@pytest.mark.parametrize("interval", ["D", "M", "Y"])
+def test_contribution_runs_per_day_count_the_floored_contributions(contributions, interval):
+    runs = contribution_runs_per_day(contributions)
+    assert runs["count"].sum() == contributions["created_at"].notna().sum()
+
+    days = contributions.assign(created_at=floored(contributions["created_at"]))
+    dates = pd.date_range(start=runs["created_at"].min(), end=runs["created_at"].max(), freq=interval)
+
+    expected = active_drifting_away(days, dates, 1, 6)
+    pd.testing.assert_frame_equal(active_drifting_away_runs(runs, dates, 1, 6), expected)
+
+
+@pytest.mark.parametrize("contribs", [1, 2, 4, 20])
+def test_contributions_per_quarter_split_like_the_ranks(contributions, contribs):
+    per_quarter = contributions_per_quarter(contributions)
+    assert per_quarter["date"].dt.tz is not None
+
+    # the card's split of the raw rows: repeat contributors have a contribution of rank 'contribs'.
+    dated = contributions[contributions["created_at"].notna()]
+    repeat = dated["cntrb_id"].isin(dated["cntrb_id"][dated["rank"] == contribs])
+    quarters = dated["created_at"].dt.tz_localize(None).dt.to_period("Q").dt.start_time.dt.tz_localize("UTC")
+
+    for view, rows, subset in [
+        ("drive", ~repeat, per_quarter["contributions"] < contribs),
+        ("repeat", repeat, per_quarter["contributions"] >= contribs),
+    ]:
+        expected = dated[rows].groupby([quarters[rows].rename("date"), "Action"]).size()
+        counted = per_quarter[subset].groupby(["date", "Action"])["count"].sum()
+        pd.testing.assert_series_equal(counted, expected, check_names=False, check_dtype=False)
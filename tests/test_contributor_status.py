@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import pytest
+from dateutil.relativedelta import relativedelta
+
+from pages.utils.contributor_status import active_drifting_away, count_runs, get_active_drifting_away_up_to
+
+DRIFT = 1
+AWAY = 6
+
+
+def reference(df, dates, drift_interval, away_interval):
+    df = df.sort_values("created_at")
+    rows = [get_active_drifting_away_up_to(df, date, drift_interval, away_interval) for date in dates]
+    return pd.DataFrame(rows, columns=["Date", "Active", "Drifting", "Away"])
+
+
+def date_grid(df, interval):
+    return pd.date_range(start=df["created_at"].min(), end=df["created_at"].max(), freq=interval, inclusive="both")
+
+
+@pytest.fixture
+def contributions():
+    """
+    Contributions on the boundaries the counts turn on, for dates at the
+    month ends from 2020-01-31 at noon: on a date, on its drift and away
+    thresholds, a second either side of them, and without a date at all.
+    """
+    date = pd.Timestamp("2020-03-31 12:00", tz="UTC")
+    drift = date - relativedelta(months=+DRIFT)
+    away = date - relativedelta(months=+AWAY)
+    second = pd.Timedelta(seconds=1)
+
+    created = [
+        pd.Timestamp("2020-01-31 12:00", tz="UTC"),
+        date,
+        date - second,
+        date + second,
+        drift,
+        drift - second,
+        drift + second,
+        away,
+        away - second,
+        away + second,
+        pd.NaT,
+        pd.Timestamp("2021-06-30 12:00", tz="UTC"),
+    ]
+    return pd.DataFrame(
+        {
+            # contributors 0-5 contribute twice, the rest once.
+            "cntrb_id": [0, 0, 1, 1, 2, 2, 3, 4, 5, 5, 6, 7],
+            "created_at": pd.to_datetime(created, utc=True),
+        }
+    )
+
+
+@pytest.mark.parametrize("interval", ["D", "M", "Y"])
+def test_matches_the_reference_on_boundaries(contributions, interval):
+    dates = date_grid(contributions, interval)
+    expected = reference(contributions, dates, DRIFT, AWAY)
+    pd.testing.assert_frame_equal(active_drifting_away(contributions, dates, DRIFT, AWAY), expected, check_dtype=False)
+
+
+@pytest.mark.parametrize("interval", ["D", "M", "Y"])
+def test_matches_the_reference_on_random_contributions(interval):
+    rng = np.random.default_rng(3)
+    start = pd.Timestamp("2018-01-01", tz="UTC").value
+    df = pd.DataFrame(
+        {
+            "cntrb_id": rng.integers(0, 40, 400),
+            "created_at": pd.to_datetime(rng.integers(start, start + 3 * 365 * 86400 * 10**9, 400), utc=True),
+        }
+    )
+    dates = date_grid(df, interval)
+    expected = reference(df, dates, 2, 5)
+    pd.testing.assert_frame_equal(active_drifting_away(df, dates, 2, 5), expected, check_dtype=False)
+
+
+def test_counts_each_contributor_once_per_date(contributions):
+    dates = date_grid(contributions, "M")
+    counts = active_drifting_away(contributions, dates, DRIFT, AWAY)
+    totals = [contributions.loc[contributions["created_at"] <= date, "cntrb_id"].nunique() for date in dates]
+    assert (counts["Active"] + counts["Drifting"] + counts["Away"]).tolist() == totals
+
+
+def test_count_runs_weights():
+    starts = np.array([0, 1, 3, 2])
+    ends = np.array([2, 4, 3, 5])
+    assert count_runs(starts, ends, 5).tolist() == [1, 2, 2, 2, 1]
+    assert count_runs(starts, ends, 5, [1, 10, 100, 1000]).tolist() == [1, 11, 1010, 1010, 1000]
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pages.utils.dataset_cache import DatasetCache
+
+
+def make_frame():
+    return pd.DataFrame(
+        {
+            "repo_id": [1, 1, 2],
+            "rank": [1.0, 2.0, np.nan],
+            "Action": ["Commit", "Issue Opened", "Commit"],
+            "created_at": pd.to_datetime(["2020-01-01", "2020-02-01", "2020-03-01"], utc=True),
+        }
+    )
+
+
+@pytest.fixture
+def cached():
+    cache = DatasetCache(1024 * 1024)
+    cache.put("v1", make_frame())
+    return cache
+
+
+@pytest.mark.parametrize(
+    "mutate",
+    [
+        lambda df: df.loc.__setitem__((0, "repo_id"), 99),
+        lambda df: df.iloc.__setitem__((1, 1), 0.0),
+        lambda df: df["rank"].fillna(0, inplace=True),
+        lambda df: df["Action"].values.__setitem__(0, "PR Opened"),
+        lambda df: df["created_at"].values.__setitem__(0, np.datetime64("1999-01-01")),
+    ],
+)
+def test_values_of_a_cached_frame_are_read_only(cached, mutate):
+    with pytest.raises(ValueError):
+        mutate(cached.get("v1"))
+
+    pd.testing.assert_frame_equal(cached.get("v1"), make_frame())
+
+
+def test_changing_the_columns_of_a_cached_frame_doesnt_change_the_cache(cached):
+    df = cached.get("v1")
+    df["repo_id"] = df["repo_id"] * 2
+    df["new"] = 1
+    df.drop(columns="Action", inplace=True)
+    df.sort_values("created_at", ascending=False, inplace=True)
+
+    pd.testing.assert_frame_equal(cached.get("v1"), make_frame())
+
+
+def test_the_frame_that_was_put_is_read_only_too():
+    cache = DatasetCache(1024 * 1024)
+    df = make_frame()
+    cache.put("v1", df)
+
+    with pytest.raises(ValueError):
+        df.loc[0, "repo_id"] = 99
+    df["new"] = 1
+
+    pd.testing.assert_frame_equal(cache.get("v1"), make_frame())
+
+
+def test_frames_over_budget_are_evicted_oldest_first():
+    df = make_frame()
+    nbytes = int(df.memory_usage(deep=True).sum())
+    cache = DatasetCache(2 * nbytes)
+
+    cache.put("v1", make_frame())
+    cache.put("v2", make_frame())
+    cache.get("v1")
+    cache.put("v3", make_frame())
+
+    assert cache.get("v1") is not None
+    assert cache.get("v2") is None
+    assert cache.get("v3") is not None
@@ -0,0 +1,114 @@
+import gc
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pages.utils import staleness
+from pages.utils.staleness import OpenIntervals, get_new_staling_stale_up_to, open_intervals
+
+STALING = 7
+STALE = 30
+
+
+def reference(df, dates, staling_days, stale_days):
+    rows = [get_new_staling_stale_up_to(df, date, staling_days, stale_days) for date in dates]
+    return pd.DataFrame(rows, columns=["Date", "New", "Staling", "Stale"])
+
+
+def date_grid(df, interval):
+    return pd.date_range(start=df["created"].min(), end=df["created"].max(), freq=interval, inclusive="both")
+
+
+def timestamps(values):
+    return pd.to_datetime(values, utc=True)
+
+
+@pytest.fixture
+def items():
+    """
+    Items on the boundaries the counts turn on, for dates at the month ends
+    from 2020-01-31 at noon: created or closed on a date, a second either
+    side of it, opened and closed on the same day, or at once, created on the
+    staling and stale thresholds, still open, and without a created date.
+    """
+    date = pd.Timestamp("2020-03-31 12:00", tz="UTC")
+    second = pd.Timedelta(seconds=1)
+    staling = date - pd.Timedelta(days=STALING)
+    stale = date - pd.Timedelta(days=STALE)
+
+    rows = [
+        (pd.Timestamp("2020-01-31 12:00", tz="UTC"), pd.NaT),
+        (date, pd.NaT),
+        (date - second, date),
+        (date + second, pd.NaT),
+        (date - pd.Timedelta(hours=1), date + pd.Timedelta(hours=1)),
+        (date - second, date - second),
+        (date - pd.Timedelta(days=3), date + second),
+        (date - pd.Timedelta(days=3), date - second),
+        (staling, pd.NaT),
+        (staling - second, pd.NaT),
+        (staling + second, pd.NaT),
+        (stale, pd.NaT),
+        (stale - second, date + pd.Timedelta(days=40)),
+        (stale + second, pd.NaT),
+        (pd.NaT, pd.NaT),
+        (pd.NaT, date),
+        (pd.Timestamp("2021-06-30 12:00", tz="UTC"), pd.NaT),
+    ]
+    created, closed = zip(*rows)
+    return pd.DataFrame({"created": timestamps(list(created)), "closed": timestamps(list(closed))})
+
+
+def random_items(seed, rows=300):
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp("2018-01-01", tz="UTC").value
+    created = rng.integers(start, start + 3 * 365 * 86400 * 10**9, rows)
+    closed = timestamps(created + rng.exponential(40 * 86400 * 10**9, rows).astype("int64"))
+    return pd.DataFrame({"created": timestamps(created), "closed": closed.where(rng.random(rows) > 0.2)})
+
+
+@pytest.mark.parametrize("interval", ["D", "M", "Y"])
+def test_matches_the_reference_on_boundaries(items, interval):
+    dates = date_grid(items, interval)
+    counts = OpenIntervals(items["created"], items["closed"], dates).counts(STALING, STALE)
+    pd.testing.assert_frame_equal(counts, reference(items, dates, STALING, STALE), check_dtype=False)
+
+
+@pytest.mark.parametrize("interval", ["D", "M", "Y"])
+def test_matches_the_reference_on_random_items(interval):
+    df = random_items(11)
+    dates = date_grid(df, interval)
+    intervals = OpenIntervals(df["created"], df["closed"], dates)
+
+    # the same event arrays, recounted with other thresholds.
+    for staling_days, stale_days in [(STALING, STALE), (1, 2), (30, 120)]:
+        expected = reference(df, dates, staling_days, stale_days)
+        pd.testing.assert_frame_equal(intervals.counts(staling_days, stale_days), expected, check_dtype=False)
+
+
+def test_open_intervals_of_a_new_frame_with_a_reused_id():
+    first = random_items(1)
+    open_intervals(first, "M")
+    key = (id(first), "M")
+    entry = staleness._intervals[key]
+    del first
+    gc.collect()
+
+    # the next frame gets the id of the first, collected, one; its entry must not be reused.
+    second = random_items(2)
+    staleness._intervals[(id(second), "M")] = entry
+
+    dates = date_grid(second, "M")
+    expected = OpenIntervals(second["created"], second["closed"], dates).counts(STALING, STALE)
+    pd.testing.assert_frame_equal(open_intervals(second, "M").counts(STALING, STALE), expected)
+
+
+def test_open_intervals_of_frames_rendered_in_turn():
+    # frames that are dropped as soon as they're counted, so that CPython reuses their ids.
+    for seed in range(20):
+        df = random_items(seed, rows=50)
+        dates = date_grid(df, "M")
+        expected = OpenIntervals(df["created"], df["closed"], dates).counts(STALING, STALE)
+        pd.testing.assert_frame_equal(open_intervals(df, "M").counts(STALING, STALE), expected)
+        del df
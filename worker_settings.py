@@ -6,4 +6,11 @@ redis_password = "{}@".format(os.getenv("REDIS_PASSWORD", ""))
 
 REDIS_URL = f"redis://:{redis_password}{redis_host}:{redis_port}"
 
+# queues drained by default, highest priority first.
+# keep in sync with job_manager.job_manager.QUEUES
+QUEUES = ["interactive", "prefetch", "refresh"]
+
+# the worker class can't be set here; workers are started with
+# -w job_manager.worker.ExplorerWorker (see supervisord.conf).
+
 print(REDIS_URL)